@@ -0,0 +1,197 @@
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic_data import generate_dataset, model_bodies
+from point_dict_creator import create_point_dict, clear_point_tables
+from full_body_kinematics import create_kinematics_dataframe, calculate_mech_energies
+from distance_covered import calculate_distance_covered
+from player_load import calculate_player_load
+from external_mechanical_work import calculate_external_mechanical_work
+from write_results import write_metric_to_csv
+from visualise_data import generate_plots_in_loop
+from heart_rate import process_files
+from trial_cache import clear_trial_cache
+from config import keypoint, rows_to_skip, participant_mass
+from kinematics import cold_start_target_seconds
+
+
+def time_scenario(function, repeats, setup=None):
+    """ Times a function, clearing the trial cache (and running the setup function) before each run so every run starts cold.
+    ----------
+    Parameters
+    function: function with no arguments to time
+    repeats: int of the number of times to run it
+    setup: function with no arguments run before each run, which is not timed (default is None)
+    ----------
+    Returns
+    A dictionary of the "min", "median" and "mean" time in seconds and the time of each of the "runs"
+    """
+    runs = []
+    for _ in range(repeats):
+        # every run starts from the files, not from the sheets and trials read by the run before
+        clear_trial_cache()
+        clear_point_tables()
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    return {"min": min(runs), "median": statistics.median(runs), "mean": statistics.mean(runs), "runs": runs}
+
+
+def cold_start_scenario(arguments):
+    """ Returns a function that starts a new interpreter in the package folder, as a user does, to time the imports at start up.
+    arguments is the list of arguments of the interpreter, e.g. ["kinematics.py", "--help"] or ["-c", "import write_results"].
+    """
+    package_folder = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    def run():
+        subprocess.run([sys.executable] + arguments, check=True, stdout=subprocess.DEVNULL, cwd=package_folder)
+    return run
+
+
+def metric_scenario(metric_function, dataset, trial_dict):
+    """ Returns a function that calculates one metric for every point, as the metric modules are used one point at a time. """
+    def run():
+        for trial, point_dict in trial_dict.items():
+            for start, end in point_dict.values():
+                metric_function(dataset["kinematics_folder"], trial[len("trial_"):], start, end)
+    return run
+
+
+def run_benchmarks(folder, repeats=3, trials=5, frames=10000, bodies=len(model_bodies), points_per_trial=10, dpi=100):
+    """ Generates a synthetic dataset and times each scenario on it.
+    ----------
+    Parameters
+    folder: string of the folder to write the synthetic dataset and the outputs of the scenarios to
+    repeats: int of the number of times each scenario is run (default is 3)
+    trials: int of the number of trials in the dataset (default is 5)
+    frames: int of the number of frames in each trial (default is 10000)
+    bodies: int of the number of bodies in the .sto files (default is every body of the full body model)
+    points_per_trial: int of the number of points in each trial (default is 10)
+    dpi: int of the resolution of the plots in the plotting scenario (default is 100)
+    ----------
+    Returns
+    A dictionary of the "metadata" of the run and the timing "results" of each scenario
+    """
+    body_names = model_bodies[:bodies]
+    # the keypoint in the config file has to be in the data
+    if keypoint not in body_names:
+        body_names = [keypoint] + body_names[:-1]
+    dataset = generate_dataset(folder, trials, frames, body_names, points_per_trial)
+    trial_dict = create_point_dict(dataset["csv_file"])
+    first_trial = dataset["trials"][0]
+    results_folder = os.path.join(folder, "results")
+    plots_folder = os.path.join(folder, "plots")
+    discipline = sorted(os.listdir(dataset["heart_rate_folder"]))[0]
+
+    scenarios = {
+        "create_kinematics_dataframe": lambda: create_kinematics_dataframe(dataset["kinematics_folder"], first_trial, keypoint, rows_to_skip),
+        "calculate_mech_energies": lambda: calculate_mech_energies(dataset["kinematics_folder"], first_trial, keypoint, participant_mass, rows_to_skip),
+        "calculate_distance_covered": metric_scenario(calculate_distance_covered, dataset, trial_dict),
+        "calculate_player_load": metric_scenario(calculate_player_load, dataset, trial_dict),
+        "calculate_external_mechanical_work": metric_scenario(calculate_external_mechanical_work, dataset, trial_dict),
+        "create_point_dict": lambda: create_point_dict(dataset["csv_file"]),
+        "write_metric_to_csv": lambda: write_metric_to_csv(dataset["kinematics_folder"], trial_dict, "Work Done", data_path=results_folder),
+        "generate_plots_in_loop": lambda: generate_plots_in_loop(dataset["kinematics_folder"], {trial: trial_dict[trial] for trial in list(trial_dict)[:1]}, "Energy", plots_folder, workers=1, dpi=dpi, resume=False),
+        "heart_rate.process_files": lambda: process_files(dataset["heart_rate_folder"], discipline, 60, 2800),
+        "kinematics --help (cold start)": cold_start_scenario(["kinematics.py", "--help"]),
+        "kinematics run --help (cold start)": cold_start_scenario(["kinematics.py", "run", "--help"]),
+        # the modules every command that calculates metrics imports before it reads any data
+        "import write_results (cold start)": cold_start_scenario(["-c", "import write_results"]),
+        "import metrics_engine (cold start)": cold_start_scenario(["-c", "import metrics_engine"]),
+    }
+
+    results = {}
+    for name, scenario in scenarios.items():
+        results[name] = time_scenario(scenario, repeats)
+        print(f"{name}: {results[name]['median']:.4f} s (median of {repeats})")
+    # starting the command line has a fixed target as well as the comparison with the baseline
+    for name in [name for name in results if name.endswith("(cold start)")]:
+        results[name]["target"] = cold_start_target_seconds
+        if results[name]["median"] > cold_start_target_seconds:
+            print(f"{name[:-len(' (cold start)')]} took longer than the target of {cold_start_target_seconds} s.")
+
+    metadata = {
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "platform": platform.platform(),
+        "repeats": repeats,
+        "trials": trials,
+        "frames": frames,
+        "bodies": len(body_names),
+        "points_per_trial": points_per_trial,
+    }
+    return {"metadata": metadata, "results": results}
+
+
+def compare_to_baseline(results, baseline, threshold=0.1):
+    """ Compares the median time of each scenario with a saved baseline.
+    ----------
+    Parameters
+    results: dictionary returned by run_benchmarks
+    baseline: dictionary returned by run_benchmarks on an earlier run
+    threshold: float of the fraction a scenario has to be slower (or faster) by to count as a regression (or speedup) (default is 0.1)
+    ----------
+    Returns
+    A dictionary of the baseline and current median, their ratio and the "status" (regression, speedup, unchanged or new) of each scenario
+    """
+    comparison = {}
+    for name, timing in results["results"].items():
+        if name not in baseline["results"]:
+            comparison[name] = {"median": timing["median"], "status": "new"}
+            continue
+        baseline_median = baseline["results"][name]["median"]
+        ratio = timing["median"] / baseline_median if baseline_median > 0 else float("inf")
+        if ratio > 1 + threshold:
+            status = "regression"
+        elif ratio < 1 - threshold:
+            status = "speedup"
+        else:
+            status = "unchanged"
+        comparison[name] = {"baseline_median": baseline_median, "median": timing["median"], "ratio": ratio, "status": status}
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the package on a synthetic dataset and compare the times with a baseline.")
+    parser.add_argument("--output", default="benchmark_results.json", help="JSON file to write the results to")
+    parser.add_argument("--baseline", default=None, help="JSON file of an earlier run to compare the results with")
+    parser.add_argument("--threshold", type=float, default=0.1, help="fraction a scenario has to be slower by to count as a regression")
+    parser.add_argument("--folder", default=None, help="folder for the synthetic dataset (default is a temporary folder)")
+    parser.add_argument("--repeats", type=int, default=3, help="number of times each scenario is run")
+    parser.add_argument("--trials", type=int, default=5, help="number of trials in the dataset")
+    parser.add_argument("--frames", type=int, default=10000, help="number of frames in each trial")
+    parser.add_argument("--bodies", type=int, default=len(model_bodies), help="number of bodies in the .sto files")
+    parser.add_argument("--points", type=int, default=10, help="number of points in each trial")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as temp_folder:
+        results = run_benchmarks(args.folder or temp_folder, args.repeats, args.trials, args.frames, args.bodies, args.points)
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, "r") as file:
+            baseline = json.load(file)
+        results["comparison"] = compare_to_baseline(results, baseline, args.threshold)
+        for name, comparison in results["comparison"].items():
+            if comparison["status"] == "new":
+                print(f"{name}: new scenario")
+            else:
+                print(f"{name}: {comparison['baseline_median']:.4f} s -> {comparison['median']:.4f} s ({comparison['ratio']:.2f}x, {comparison['status']})")
+        regressions = [name for name, comparison in results["comparison"].items() if comparison["status"] == "regression"]
+
+    with open(args.output, "w") as file:
+        json.dump(results, file, indent=1)
+    print(f"Results written to {args.output}.")
+    # a non-zero exit code lets a CI job fail on a regression
+    sys.exit(1 if regressions else 0)
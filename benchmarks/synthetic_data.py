@@ -0,0 +1,138 @@
+import os
+import argparse
+import numpy as np
+
+# Bodies of the OpenSim full body models, used for the synthetic BodyKinematics files
+model_bodies = ["center_of_mass", "pelvis", "femur_r", "tibia_r", "talus_r", "calcn_r", "toes_r", "femur_l", "tibia_l", "talus_l",
+                "calcn_l", "toes_l", "torso", "head", "humerus_r", "ulna_r", "radius_r", "hand_r", "humerus_l", "ulna_l", "radius_l", "hand_l"]
+
+
+def write_sto(filename, time, values, labels):
+    """ Writes a table of values to a file in the format of an OpenSim .sto file.
+    ----------
+    Parameters
+    filename: string of the path to write the file to
+    time: numpy array of the time of each frame
+    values: numpy array of the values of each column (frames x columns, not including time)
+    labels: list of the labels of the columns, starting with "time"
+    """
+    header = "\n".join([
+        "Results",
+        "version=1",
+        f"nRows={len(time)}",
+        f"nColumns={len(labels)}",
+        "inDegrees=no",
+        "",
+        "Units are S.I. units (second, meters, Newtons, ...)",
+        "Angles are in degrees.",
+        "",
+        "endheader",
+        "\t".join(labels),
+    ])
+    np.savetxt(filename, np.column_stack([time, values]), fmt="%16.8f", delimiter="\t", header=header, comments="")
+
+
+def generate_trial(kinematics_folder, trial_number, frames=10000, bodies=model_bodies, sample_rate=100, seed=0):
+    """ Writes synthetic BodyKinematics_pos_global and BodyKinematics_vel_global .sto files for a trial.
+    Each body moves in a random walk around standing height, and its velocity is the derivative of its position plus noise.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder to write the files to
+    trial_number: string of the trial number, e.g. "01"
+    frames: int of the number of frames in the trial (default is 10000)
+    bodies: list of the names of the bodies (default is the bodies of the full body model)
+    sample_rate: int of the number of frames per second (default is 100)
+    seed: int of the seed of the random numbers, so the same data is generated every time (default is 0)
+    ----------
+    Returns
+    A list of the paths of the files written
+    """
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames) / sample_rate
+    labels = ["time"] + [f"{body}_{axis}" for body in bodies for axis in ["X", "Y", "Z", "Ox", "Oy", "Oz"]]
+    # a random walk on every column, with the Y (vertical) position of each body around 1 m
+    position = np.cumsum(rng.normal(0, 0.01, (frames, len(labels) - 1)), axis=0)
+    position[:, 1::6] += 1.0
+    velocity = np.gradient(position, time, axis=0) + rng.normal(0, 0.05, position.shape)
+
+    os.makedirs(kinematics_folder, exist_ok=True)
+    filenames = []
+    for file_type, values in [("pos_global", position), ("vel_global", velocity)]:
+        filename = os.path.join(kinematics_folder, f"trial_{trial_number}_BodyKinematics_{file_type}.sto")
+        write_sto(filename, time, values, labels)
+        filenames.append(filename)
+    return filenames
+
+
+def generate_points_csv(csv_file, trials, frames=10000, points_per_trial=10):
+    """ Writes a CSV file of evenly spaced points for each trial, in the format read by create_point_dict. """
+    point_frames = np.linspace(0, frames, points_per_trial + 1).astype(int)
+    with open(csv_file, "w") as file:
+        file.write("Trial,Point,Point Start Frame,Point End Frame\n")
+        for trial_number in trials:
+            for point in range(points_per_trial):
+                # leave a gap between points, as there is between rallies
+                file.write(f"{int(trial_number)},{point + 1},{point_frames[point]},{point_frames[point + 1] - 10}\n")
+    return csv_file
+
+
+def generate_heart_rate_csv(filename, samples=3600, seed=0):
+    """ Writes a synthetic heart rate export with one sample a second, in the format read by heart_rate.process_files. """
+    rng = np.random.default_rng(seed)
+    heart_rates = np.clip(np.round(150 + np.cumsum(rng.normal(0, 1, samples))), 60, 200).astype(int)
+    seconds = np.arange(samples)
+    times = [f"{second // 3600:02d}:{second // 60 % 60:02d}:{second % 60:02d}" for second in seconds]
+    with open(filename, "w") as file:
+        file.write("Name,Synthetic\nSport,Badminton\nSample rate,Time,HR (bpm)\n")
+        file.writelines(f"1,{time},{heart_rate}\n" for time, heart_rate in zip(times, heart_rates))
+    return filename
+
+
+def generate_dataset(folder, trials=5, frames=10000, bodies=model_bodies, points_per_trial=10, disciplines=2, heart_rate_files=3, heart_rate_samples=3600, sample_rate=100, seed=0):
+    """ Writes a synthetic participant folder of kinematics, points and heart rate files.
+    ----------
+    Parameters
+    folder: string of the folder to write the dataset to
+    trials: int of the number of trials (default is 5)
+    frames: int of the number of frames in each trial (default is 10000)
+    bodies: list of the names of the bodies, or an int to use that many bodies of the full body model (default is every body)
+    points_per_trial: int of the number of points in each trial (default is 10)
+    disciplines: int of the number of discipline folders of heart rate files (default is 2)
+    heart_rate_files: int of the number of heart rate files in each discipline (default is 3)
+    heart_rate_samples: int of the number of samples in each heart rate file (default is 3600)
+    sample_rate: int of the number of kinematics frames per second (default is 100)
+    seed: int of the seed of the random numbers (default is 0)
+    ----------
+    Returns
+    A dictionary of the "kinematics_folder", "csv_file", "heart_rate_folder" and "trials" of the dataset
+    """
+    if isinstance(bodies, int):
+        bodies = model_bodies[:bodies]
+    kinematics_folder = os.path.join(folder, "kinematics")
+    trial_numbers = [f"{trial:02d}" for trial in range(1, trials + 1)]
+    for i, trial_number in enumerate(trial_numbers):
+        generate_trial(kinematics_folder, trial_number, frames, bodies, sample_rate, seed + i)
+
+    csv_file = generate_points_csv(os.path.join(folder, "points.csv"), trial_numbers, frames, points_per_trial)
+
+    heart_rate_folder = os.path.join(folder, "heart_rate")
+    for discipline in range(disciplines):
+        discipline_folder = os.path.join(heart_rate_folder, f"Discipline {discipline + 1}")
+        os.makedirs(discipline_folder, exist_ok=True)
+        for file in range(heart_rate_files):
+            generate_heart_rate_csv(os.path.join(discipline_folder, f"heart_rate_{file + 1}.csv"), heart_rate_samples, seed + 100 * discipline + file)
+
+    return {"kinematics_folder": kinematics_folder, "csv_file": csv_file, "heart_rate_folder": heart_rate_folder, "trials": trial_numbers}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Write a synthetic participant folder of OpenSim .sto, points and heart rate files.")
+    parser.add_argument("folder", help="folder to write the dataset to")
+    parser.add_argument("--trials", type=int, default=5, help="number of trials")
+    parser.add_argument("--frames", type=int, default=10000, help="number of frames in each trial")
+    parser.add_argument("--bodies", type=int, default=len(model_bodies), help="number of bodies in the .sto files")
+    parser.add_argument("--points", type=int, default=10, help="number of points in each trial")
+    parser.add_argument("--seed", type=int, default=0, help="seed of the random numbers")
+    args = parser.parse_args()
+    dataset = generate_dataset(args.folder, args.trials, args.frames, args.bodies, args.points, seed=args.seed)
+    print(f"Synthetic dataset written to {args.folder}: {len(dataset['trials'])} trials of {args.frames} frames.")
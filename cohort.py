@@ -0,0 +1,170 @@
+import os
+import argparse
+from point_dict_creator import create_point_dict
+from metrics_engine import calculate_trial_metrics
+from parallel import run_for_each_trial
+from write_results import write_metrics_to_csv
+from results_store import metrics_table, write_results_store, results_columns
+from config import keypoint, rows_to_skip, n_workers, results_store_dir, results_store_format, export_metric_csvs
+
+
+# Settings that can be given for each participant in the manifest - the names match the variables in config.py
+required_settings = ["participant", "participant_mass", "participant_age", "kinematics_folder", "csv_file"]
+# Optional settings and their default values - data_path defaults to a folder for the participant in the output folder,
+# and the heart rate step is only run for participants with a heart_rate_folder
+optional_settings = {"sheet_name": None, "data_path": None, "keypoint": keypoint, "rows_to_skip": rows_to_skip,
+                     "heart_rate_folder": None, "heart_rate_start": 60, "heart_rate_end": 2800}
+
+
+def read_cohort_manifest(manifest_file):
+    """ Reads the settings of each participant from a CSV or YAML manifest.
+    -------
+    Parameters:
+    manifest_file: path to the .csv, .yaml or .yml manifest
+    -------
+    Required CSV file headers and format example (sheet_name, data_path, keypoint, rows_to_skip, heart_rate_folder,
+    heart_rate_start and heart_rate_end are optional - see optional_settings for their defaults):
+    participant, participant_mass, participant_age, kinematics_folder, csv_file, heart_rate_folder
+    P01, 72.5, 24, data/P01/trc_hrnet/kinematics, data/P01/points.csv, data/P01/heart_rate
+    P02, 80.1, 31, data/P02/trc_hrnet/kinematics, data/P02/points.csv, data/P02/heart_rate
+    A YAML manifest is a list of the same settings for each participant (or a list under "participants").
+    -------
+    Output:
+    List of a dictionary of settings for each participant
+    """
+    # pandas is imported when a manifest is read rather than when the module is imported
+    import pandas as pd
+    if manifest_file.endswith((".yaml", ".yml")):
+        # YAML manifests need PyYAML, which is only imported when it is used
+        import yaml
+        with open(manifest_file, "r") as file:
+            manifest = yaml.safe_load(file)
+        if isinstance(manifest, dict):
+            manifest = manifest["participants"]
+    else:
+        manifest = pd.read_csv(manifest_file, skipinitialspace=True).to_dict("records")
+
+    participants = []
+    for row in manifest:
+        # blank cells in a CSV manifest are read as NaN
+        row = {setting: value for setting, value in row.items() if not (isinstance(value, float) and pd.isnull(value))}
+        missing = [setting for setting in required_settings if setting not in row]
+        if missing:
+            raise ValueError(f"Participant {row.get('participant')} is missing {missing} in {manifest_file}.")
+        settings = {setting: row[setting] for setting in required_settings}
+        for setting, default in optional_settings.items():
+            settings[setting] = row.get(setting, default)
+        settings["participant"] = str(settings["participant"])
+        settings["participant_mass"] = float(settings["participant_mass"])
+        settings["participant_age"] = float(settings["participant_age"])
+        settings["rows_to_skip"] = int(settings["rows_to_skip"])
+        settings["heart_rate_start"] = int(settings["heart_rate_start"])
+        settings["heart_rate_end"] = int(settings["heart_rate_end"])
+        participants.append(settings)
+    return participants
+
+
+def calculate_participant_trial_metrics(job, point_dict, participants):
+    """ Calculates every metric for each point of one participant's trial.
+    ----------
+    Parameters
+    job: tuple of the participant and the trial in their trial dictionary, e.g. ("P01", "trial_01")
+    point_dict: dictionary of the points in the trial
+    participants: dictionary of the settings of each participant
+    ----------
+    Returns
+    A dictionary with the distance covered, player load, negative and positive work for each point
+    """
+    participant, trial = job
+    settings = participants[participant]
+    return calculate_trial_metrics(trial, point_dict, settings["kinematics_folder"], settings["keypoint"], settings["participant_mass"], settings["rows_to_skip"])
+
+
+def run_cohort(manifest_file, output_folder, workers = n_workers):
+    """ Calculates the metrics of every participant in a manifest, scheduling all of their trials in one pool of workers.
+    ----------
+    Parameters
+    manifest_file: path to the .csv or .yaml manifest of the participants (see read_cohort_manifest)
+    output_folder: folder to write the combined results of the cohort to
+    workers: int of the number of processes used to process the trials in parallel (default is n_workers from the config file)
+    ----------
+    Returns
+    A dataframe of the metrics of every point of every participant.
+    The combined results are added to the results store and written to cohort_metrics.csv in the output folder,
+    and the metric CSV files of each participant to their data_path if export_metric_csvs is on in the config file.
+    The heart rate results of the participants with a heart_rate_folder are written to heart_rate_results.csv in their
+    data_path and to cohort_heart_rate.csv in the output folder.
+    """
+    import pandas as pd
+    participants = {settings["participant"]: settings for settings in read_cohort_manifest(manifest_file)}
+    for participant, settings in participants.items():
+        # results are kept apart from the raw .sto files unless the manifest gives a data_path
+        if settings["data_path"] is None:
+            settings["data_path"] = os.path.join(output_folder, participant)
+
+    # one job for each trial of each participant, so a participant with many trials doesn't hold up the others
+    trial_dicts = {}
+    jobs = {}
+    for participant, settings in participants.items():
+        trial_dicts[participant] = create_point_dict(settings["csv_file"], settings["sheet_name"])
+        for trial, point_dict in trial_dicts[participant].items():
+            jobs[(participant, trial)] = point_dict
+    results, errors = run_for_each_trial(calculate_participant_trial_metrics, jobs, (participants,), workers)
+
+    tables = []
+    for participant, settings in participants.items():
+        metrics_dict = {trial: results[(participant, trial)] for trial in trial_dicts[participant] if (participant, trial) in results}
+        if export_metric_csvs:
+            write_metrics_to_csv(settings["kinematics_folder"], trial_dicts[participant], metrics_dict=metrics_dict, data_path=settings["data_path"])
+        tables.append(metrics_table(metrics_dict, participant, settings["keypoint"]))
+
+    cohort_df = pd.concat(tables, ignore_index=True) if tables else pd.DataFrame(columns=results_columns)
+    # the whole cohort is added to the results store in one write
+    write_results_store(cohort_df, results_store_dir, results_store_format)
+    os.makedirs(output_folder, exist_ok=True)
+    cohort_df.to_csv(os.path.join(output_folder, "cohort_metrics.csv"), index=False)
+    run_cohort_heart_rate(participants, output_folder, workers)
+    if errors:
+        print(f"{len(errors)} trials could not be processed: {', '.join(f'{participant} {trial}' for participant, trial in errors)}")
+    return cohort_df
+
+
+def run_cohort_heart_rate(participants, output_folder, workers = n_workers):
+    """ Calculates the heart rate results of every participant with a heart_rate_folder, using the zones of their age.
+    ----------
+    Parameters
+    participants: dictionary of the settings of each participant
+    output_folder: folder to write the combined heart rate results of the cohort to
+    workers: int of the number of processes used to process the heart rate files in parallel
+    ----------
+    Returns
+    A dataframe of the heart rate results of every participant, or None if no participant has a heart_rate_folder
+    """
+    participants = {participant: settings for participant, settings in participants.items() if settings["heart_rate_folder"] is not None}
+    if not participants:
+        return None
+    # heart_rate imports pandas, so it is only imported when a participant has heart rate data
+    import pandas as pd
+    from heart_rate import calculate_zones_coefficients, process_all_disciplines
+
+    tables = []
+    for participant, settings in participants.items():
+        zones_coefficients = calculate_zones_coefficients(settings["participant_age"])
+        results = process_all_disciplines(settings["heart_rate_folder"], settings["heart_rate_start"], settings["heart_rate_end"],
+                                          zones_coefficients, workers)
+        os.makedirs(settings["data_path"], exist_ok=True)
+        results.to_csv(os.path.join(settings["data_path"], "heart_rate_results.csv"), index=False)
+        results.insert(0, "Participant", participant)
+        tables.append(results)
+    cohort_heart_rate_df = pd.concat(tables, ignore_index=True)
+    cohort_heart_rate_df.to_csv(os.path.join(output_folder, "cohort_heart_rate.csv"), index=False)
+    return cohort_heart_rate_df
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate the metrics of every participant in a cohort manifest.")
+    parser.add_argument("manifest", help="CSV or YAML manifest of the participants")
+    parser.add_argument("output_folder", help="folder to write the combined results to")
+    parser.add_argument("--workers", type=int, default=n_workers, help="number of processes used to process the trials in parallel")
+    args = parser.parse_args()
+    run_cohort(args.manifest, args.output_folder, args.workers)
@@ -17,14 +17,59 @@ csv_file =
 sheet_name = None # Needed if trials are on a specific sheet
 
 # The path to the folder containing the .sto files of kinematic data
+# The files must be named <anything><trial number>_BodyKinematics_<pos or vel>_global.sto, e.g. trial_01_BodyKinematics_pos_global.sto (see trial_files.py)
 kinematics_folder = f"......{participant}/trc_hrnet/kinematics"
 #Where you want to write the extracted metrics to
 data_path = f"......{participant}"
+# Folder of the results table of every participant - each run adds a part to it (see results_store.py)
+results_store_dir = "....../results_store"
+# Format of the parts written to the results store - ".parquet", ".feather" (both need pyarrow) or ".npz"
+results_store_format = ".npz"
+# Also write point_works.csv, distance_covered.csv and player_load.csv to data_path
+export_metric_csvs = True
 
 # Path where you want to save plots (inside participant directory)
 plot_path = f"......{participant}/plots"
 
-#Type of data to plot - Can be ["Position", "Velocity", "Acceleration" or "Energy"]
+#Type of data to plot - Can be ["Position", "Velocity", "Acceleration" or "Energy"], or a list of them to plot every type from one load of each trial
 plot_data = "Energy"
+# Draw every type in plot_data as a panel of one figure for each point, instead of a figure for each type
+plot_multi_panel = False
+# Resolution and format of the plots - "png", "svg" or "pdf"
+plot_dpi = 1200
+plot_format = "png"
 
 heart_rate_folder =  # path to directory with heart rate data
+
+# Maximum number of parsed trials (and their total size in bytes) kept in memory, so each trial is only parsed once per run
+trial_cache_max_entries = 16
+trial_cache_max_bytes = 1024**3  # 1 GB
+
+# Store a binary copy of each parsed .sto file so later runs don't parse the text again (see sto_cache.py)
+use_sto_cache = False
+sto_cache_dir = None  # None stores the cache in a .sto_cache folder next to the .sto files
+sto_cache_verify_hash = False  # also compare file hashes, not just modification times and sizes
+
+# Number of processes used to process trials in parallel (1 processes the trials one after another)
+n_workers = 1
+
+# Number of trials (or heart rate files) ahead whose files are read in the background while a trial is computed (0 turns it off, see prefetch.py)
+prefetch_depth = 2
+
+# Filter the keypoint position and velocity before the acceleration, energies and metrics are calculated (see signal_filter.py) - needs SciPy
+filter_type = None  # None, "butterworth" (zero-phase low-pass) or "savgol" (Savitzky-Golay)
+filter_cutoff = 6  # Hz, cutoff frequency of the Butterworth filter
+filter_order = 4  # order of the Butterworth filter
+savgol_window = 0.25  # seconds, length of the Savitzky-Golay window
+savgol_polyorder = 3  # order of the Savitzky-Golay polynomial
+
+# Read the .sto files in chunks of rows instead of all at once, so memory stays the same however long a trial is (see streaming.py)
+use_streaming = False
+stream_chunk_rows = 10000
+
+# Lengths in seconds of the windows the peak (worst-case) distance covered, player load and positive work are found over (see peak_metrics.py)
+peak_window_lengths = [1, 5, 10, 30]
+
+# Time each stage of the pipeline and count the files and bytes read by each trial (see instrumentation.py) - a summary is printed at the end of a run
+instrumentation_enabled = False
+instrumentation_log = None  # path to a file to write a JSON line to for every stage and file read
@@ -1,11 +1,4 @@
-import os
-import pandas as pd
-import numpy as np
-import xml.etree.ElementTree as ET
-import matplotlib.pyplot as plt
-import csv
-import numpy as np
-from full_body_kinematics import calculate_mech_energies
+from metrics_engine import load_trial_index
 from config import kinematics_folder, keypoint, rows_to_skip, participant_mass, csv_file, sheet_name
 
 
@@ -22,60 +15,14 @@ def calculate_external_mechanical_work(kinematics_folder, trial_number, start, e
     Returns
     An updated data frame for that trial with the negative and positive external mechanical works
     """
-    # check the kinematics dataframe for this trial exists 
-    kinematics_df = calculate_mech_energies(kinematics_folder, trial_number)
-    if kinematics_df is None:
+    # check the kinematics data for this trial exists 
+    trial_index = load_trial_index(kinematics_folder, trial_number)
+    if trial_index is None:
         print(f"No data for Trial Number {trial_number}. Skipping...")
         return 0,0
-    else:
-        # assign the change in total energy column to a variable
-        delta_te = kinematics_df["Change in Total Energy (J)"]
-        rows_of_data_to_skip = rows_to_skip
-        # collect all negative and positive changes in total energy. 
-        delta_te_negative = delta_te < 0
-        delta_te_positive = delta_te > 0
-        # if end is None, we have not been given a point and calculate the work for the entire trial
-        if end is None:
-            #negative work is the sum of all the negative changes in energy
-            negative_work = delta_te[delta_te_negative].sum()
-            #positive work is the sum of all the positive changes in energy
-            positive_work = delta_te[delta_te_positive].sum()
-            print(f"Processing data for trial number {trial_number}.")
-            return negative_work, positive_work
-        #if we have been given an end frame but no slice, we calculate the work for that time (usually a point within a trial)
-        elif end and not slice_start:
-            #because we have skipped rows, we need to adjust the start and end frames
-            # start must be a minimum of 1
-            if start - rows_of_data_to_skip <= 0:
-                start = 1
-            else:
-                start -= rows_of_data_to_skip
-                end -= rows_of_data_to_skip
-            #negative work is the sum of all the negative changes in energy
-            negative_work = delta_te[start:end][delta_te_negative].sum()
-            #positive work is the sum of all the positive changes in energy
-            positive_work = delta_te[start:end][delta_te_positive].sum()
-            print(f"Processing data for trial number {trial_number}.")
-            return negative_work, positive_work
-        #if we have a slice point, we use first_end and first_start to slice points within start and end
-        elif slice_start:
-            # start must be a minimum of 1
-            if start - rows_of_data_to_skip <= 0:
-                start = 1
-            else:
-                start -= rows_of_data_to_skip
-                end -= rows_of_data_to_skip
-                slice_start -= rows_of_data_to_skip
-                slice_end -= rows_of_data_to_skip
-            #negative work is the sum of all the negative changes in energy
-            negative_work = delta_te[start:slice_start][delta_te_negative].sum() + delta_te[slice_end:end][delta_te < 0].sum()
-            #positive work is the sum of all the positive changes in energy
-            positive_work = delta_te[start:slice_start][delta_te_positive].sum() + delta_te[slice_end:end][delta_te > 0].sum()
-            print(f"Processing data for trial number {trial_number}.")
-            return negative_work, positive_work
-        else:
-            print(f"Error calculating work for trial {trial_number}")
-            return 0,0
+    print(f"Processing data for trial number {trial_number}.")
+    # if end is None, the work for the entire trial is calculated, otherwise only during the (sliced) point
+    return trial_index.work(start, end, slice_start, slice_end)
 
 # If you want to calculate an individual trial, because you are slicing it up, you can use the following code
 # trial_number = "02"
@@ -1,22 +1,81 @@
-import os
-import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-import csv
-from config import kinematics_folder, keypoint, rows_to_skip, participant_mass, csv_file, sheet_name
+from config import kinematics_folder, keypoint, rows_to_skip, participant_mass, csv_file, sheet_name, use_sto_cache, sto_cache_dir, sto_cache_verify_hash
+from sto_reader import read_sto, read_sto_header
+from sto_cache import read_sto_cached
+from trial_cache import trial_cache_key, get_cached_trial, cache_trial, get_derived, store_derived
+from trial_kinematics import TrialKinematics
+from signal_filter import filter_signals, filter_settings
+from trial_files import find_trial_files
+from instrumentation import stage
 
 
 def extract_labels(filename):
     """ Read the .sto file and return the labels (column names). """
-    with open(filename, 'r') as file:
-        # Skip initial lines until the line starting with 'time' is found
-        for line in file:
-            if line.startswith('time'):
-                # Extract labels from the line starting with 'time'
-                labels = line.strip().split('\t')
-                return labels
-    # If 'time' is not found, raise an error
-    raise ValueError("Labels starting with 'time' not found in the file.")
+    return read_sto_header(filename)["labels"]
+
+
+def read_sto_columns(filename, columns, rows_of_data_to_skip):
+    """ Reads columns of a .sto file, using the binary cache if it is turned on in the config file. """
+    with stage("sto parse"):
+        if use_sto_cache:
+            return read_sto_cached(filename, columns, skip_lines=rows_of_data_to_skip, cache_dir=sto_cache_dir, verify_hash=sto_cache_verify_hash)[1]
+        return read_sto(filename, columns, skip_lines=rows_of_data_to_skip)[1]
+
+
+def create_trial_kinematics(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, planes = ["X", "Y", "Z"]):
+    """ Extracts kinematic data of a keypoint from the OpenSim .sto files of a trial.
+    ----------
+    Parameters
+    kinematics_folder: name of the folder containing the kinematics files
+    trial_number: string of the trial number to extract
+    keypoint: string of the keypoint to extract
+    planes: list of strings of the planes to extract (default is ["X", "Y", "Z"] - other choices are ["Ox", "Oy", "Oz"])
+    ----------
+    Returns
+    A read-only TrialKinematics of the time, position, velocity and acceleration of the keypoint in the specified planes (None if there are no files).
+    It is cached, so the .sto files of a trial are only parsed once until they change.
+    """
+    #look up the global files of that trial in the folder index
+    trial_files = find_trial_files(kinematics_folder, trial_number)
+    filelist = [trial_files[file_type] for file_type in ["pos_global", "vel_global"] if file_type in trial_files]
+
+    if not filelist:  # If file list is empty
+        print(f"No files found for trial number {trial_number}. Skipping...")
+        return None
+
+    # return the cached trial if these files have already been parsed
+    cache_key = trial_cache_key(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, planes, filelist, filter_settings())
+    cached_trial = get_cached_trial(cache_key)
+    if cached_trial is not None:
+        return cached_trial
+
+    keypoint_columns = [f"{keypoint}_{plane}" for plane in planes]
+    # Extract only the time and keypoint columns from the files - a missing file leaves its columns empty (NaN)
+    pos_data = read_sto_columns(trial_files["pos_global"], ["time"] + keypoint_columns, rows_of_data_to_skip) if "pos_global" in trial_files else None
+    vel_data = read_sto_columns(trial_files["vel_global"], keypoint_columns, rows_of_data_to_skip) if "vel_global" in trial_files else None
+    # frames keep the numbering they had before the skipped rows were removed, and the velocity is matched to the frames of the position
+    rows = len(pos_data["time"]) if pos_data is not None else len(vel_data[keypoint_columns[0]])
+    frames = max(rows - rows_of_data_to_skip, 0)
+    time = _frames_of(pos_data, "time", rows_of_data_to_skip, frames)
+    position = np.column_stack([_frames_of(pos_data, column, rows_of_data_to_skip, frames) for column in keypoint_columns])
+    velocity = np.column_stack([_frames_of(vel_data, column, rows_of_data_to_skip, frames) for column in keypoint_columns])
+    if filter_settings() is not None:
+        # every position and velocity column is filtered in one call, so the acceleration and energies are calculated from the filtered signals
+        with stage("filter"):
+            filtered = filter_signals(np.hstack((position, velocity)), time)
+        position, velocity = filtered[:, :len(planes)], filtered[:, len(planes):]
+    with stage("derivatives"):
+        trial_kinematics = TrialKinematics.from_arrays(keypoint, planes, rows_of_data_to_skip, time, position, velocity)
+    return cache_trial(cache_key, trial_kinematics)
+
+
+def _frames_of(data, column, rows_of_data_to_skip, frames):
+    """ Returns the frames of a column after the skipped rows, padded with NaN (or all NaN if its file is missing). """
+    values = np.full(frames, np.nan)
+    if data is not None:
+        column_values = data[column][rows_of_data_to_skip:rows_of_data_to_skip + frames]
+        values[:len(column_values)] = column_values
+    return values
 
 
 def create_kinematics_dataframe(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, planes = ["X", "Y", "Z"]): 
@@ -29,84 +88,48 @@ def create_kinematics_dataframe(kinematics_folder, trial_number, keypoint, rows_
     planes: list of strings of the planes to extract (default is ["X", "Y", "Z"] - other choices are ["Ox", "Oy", "Oz"])
     ----------
     Returns
-    A dataframe for that trial with position, velocity and acceleration data for the keypoint in the specified planes
+    A read-only dataframe for that trial with position, velocity and acceleration data for the keypoint in the specified planes.
+    It is a view of the cached TrialKinematics of the trial, so the .sto files of a trial are only parsed once until they change.
     """
-    rows_of_data_to_skip = rows_to_skip
+    trial_kinematics = create_trial_kinematics(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, planes)
+    if trial_kinematics is not None:
+        return trial_kinematics.to_dataframe()
 
-    #create filelise of relevant files for that trial
-    filelist = [os.path.join(kinematics_folder,f) for f in os.listdir(kinematics_folder) if trial_number in f and "global" in f]
 
-    if not filelist:  # If file list is empty
-        print(f"No files found for trial number {trial_number}. Skipping...")
-        pass
-    else:
-        keypoint_data = pd.DataFrame()  # Initialize an empty DataFrame to store the keypoint data
-
-        #loop through the .sto files for that trial
-        for filename in filelist:
-            if "BodyKinematics_pos_global" in filename:
-                labels = extract_labels(filename)
-                # Extract the keypoint data
-                pos_data_frame = pd.read_csv(filename, sep="\t", skiprows=rows_to_skip, names=labels)  
-                keypoint_data["time"] = pos_data_frame["time"].iloc[rows_of_data_to_skip:]
-                for plane in planes:
-                    # add the values to our dataframe
-                    keypoint_data[f"{keypoint}_{plane} (m)"] = pos_data_frame[f"{keypoint}_{plane}"].iloc[rows_of_data_to_skip:]
-            #if file contains velocity data
-            elif "BodyKinematics_vel_global" in filename: 
-                labels = extract_labels(filename)
-                # Extract the keypoint data
-                vel_data_frame = pd.read_csv(filename, sep="\t", skiprows=rows_to_skip, names=labels)
-                for plane in planes:
-                    # add the values to our dataframe
-                    keypoint_data[f"{keypoint}_{plane} (m/s)"] = vel_data_frame[f"{keypoint}_{plane}"].iloc[rows_of_data_to_skip:]
-                    time_diff = keypoint_data["time"].diff()
-                    keypoint_data[f"{keypoint}_{plane} (m/s^2)"] = keypoint_data[f"{keypoint}_{plane} (m/s)"].diff()/ time_diff            
-            else:
-                pass       
-        return keypoint_data
+def calculate_trial_energies(kinematics_folder, trial_number, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Calculates the potential, kinetic and total energy of the keypoint, keeping them with the trial in the trial cache.
+    ----------
+    Returns
+    A read-only TrialKinematics of the trial with the energies added (None if there is no data for the trial)
+    """
+    trial_kinematics = create_trial_kinematics(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip)
+    if trial_kinematics is None:
+        return None
+    # the energies depend on the participant's mass, so it is part of the name they are stored under
+    energies_name = ("energies", participant_mass)
+    trial_energies = get_derived(trial_kinematics, energies_name)
+    if trial_energies is None:
+        with stage("energies"):
+            trial_energies = trial_kinematics.with_energies(participant_mass).set_read_only()
+        store_derived(trial_kinematics, energies_name, trial_energies)
+    return trial_energies
+
 
 #calculate potential and kinetic energy of the keypoint
-def calculate_mech_energies(kinematics_folder, trial_number):
+def calculate_mech_energies(kinematics_folder, trial_number, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
     """ Calculates the potential, kinetic and total energy of the keypoint.
     ----------
     Parameters
     kinematics_folder: string of the folder containing the kinematics files
     trial_number: string of the trial number to extract
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
     ----------
     Returns
     An updated data frame for that trial with the potential, kinetic and total energy of the keypoint
     """
-    rows_of_data_to_skip = rows_to_skip
-    # Create the kinematic dataframe using the function from above 
-    kinematics_df = create_kinematics_dataframe(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip)
-    # make sure the dataframe exists
-    if kinematics_df is not None:
-        #potential_energy = mass * g * height (Y-axis)
-        if f"{keypoint}_Y (m)" in kinematics_df.columns:
-            pe = participant_mass * 9.81 * kinematics_df[f"{keypoint}_Y (m)"]
-        else:
-            print(f"Column {keypoint}_Y (m) not found in DataFrame")
-        #kinetic_energy = 0.5 * mass * velocity^2
-        kinematics_df["Resultant Velocity (m/s)"] = np.sqrt(kinematics_df[f"{keypoint}_X (m/s)"]**2 + kinematics_df[f"{keypoint}_Y (m/s)"]**2 + kinematics_df[f"{keypoint}_Z (m/s)"]**2)
-        ke = 0.5 * participant_mass * kinematics_df["Resultant Velocity (m/s)"]**2
-        #print(ke)
-        #total energy = pe + ke
-        te = pe + ke
-        # change in total energy
-        delta_te = te.diff()
-
-        #add these energies to our dataframe
-        kinematics_df["Potential Energy (J)"] = pe
-        kinematics_df["Kinetic Energy (J)"] = ke
-        kinematics_df["Total Energy (J)"] = te
-        kinematics_df["Change in Total Energy (J)"] = delta_te
-        
-        #Check your dataframe using 
-        #print(kinematics_df)
-
-        return kinematics_df
-    else:
-        pass
-
-
+    trial_energies = calculate_trial_energies(kinematics_folder, trial_number, keypoint, participant_mass, rows_of_data_to_skip)
+    if trial_energies is not None:
+        # a view of the cached arrays - adding columns to it leaves the cached trial unchanged
+        return trial_energies.to_dataframe()
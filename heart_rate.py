@@ -1,18 +1,34 @@
 import os
+import argparse
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from config import heart_rate_folder, participant_age
+from parallel import run_for_each_trial
+from prefetch import prefetch_jobs, open_prefetched
+from config import heart_rate_folder, participant_age, n_workers
 
-hr_max = 220 - participant_age
+def calculate_zones_coefficients(participant_age):
+    """ Calculate the heart rate zones and their TRIMP coefficients for a participant
+    --------
+    Parameters
+    participant_age: age of the participant in years
+    --------
+    Returns
+    list of (lower heart rate, upper heart rate, coefficient) for each zone
+    """
+    hr_max = 220 - participant_age
 
-zones_coefficients = [
-    (0.5*hr_max,0.6*hr_max,1),
-    (0.6*hr_max,0.7*hr_max,2),
-    (0.7*hr_max,0.8*hr_max,3),
-    (0.8*hr_max,0.9*hr_max,4),
-    (0.9*hr_max,1*hr_max,5),
-]
+    return [
+        (0.5*hr_max,0.6*hr_max,1),
+        (0.6*hr_max,0.7*hr_max,2),
+        (0.7*hr_max,0.8*hr_max,3),
+        (0.8*hr_max,0.9*hr_max,4),
+        (0.9*hr_max,1*hr_max,5),
+    ]
+
+
+zones_coefficients = calculate_zones_coefficients(participant_age)
+# Columns of the results of every file, whether or not there are any
+result_columns = ["File", "Average", "Max", "TRIMP", "Discipline"]
 
 
 def convert_hours_to_seconds(time):
@@ -23,27 +39,93 @@ def convert_hours_to_seconds(time):
     return hours*3600 + minutes*60 + seconds
 
 
-def calculate_trimp_score(heart_rates):
+def convert_times_to_seconds(times):
+    """ Convert a column of times in the format hh:mm:ss to seconds in one operation
+    --------
+    Parameters
+    times: pandas Series of strings of times, e.g. "00:01:30"
+    --------
+    Returns
+    numpy array of the times in seconds
+    """
+    parts = times.astype(str).str.split(":", expand=True).iloc[:, :3].astype(int).to_numpy()
+    return parts[:, 0]*3600 + parts[:, 1]*60 + parts[:, 2]
+
+
+def calculate_trimp_score(heart_rates, zones_coefficients=zones_coefficients):
     """ Calculate the TRIMP score for a given list of heart rates
     --------
     Parameters
     heart_rates: list of heart rates
+    zones_coefficients: list of the heart rate zones and coefficients (default is for participant_age from the config file)
     --------
     Returns
     float of the TRIMP score
     """
-    time_spent_in_zone = {1:0,2:0,3:0,4:0,5:0}
+    # sort the heart rates once, so the samples in each zone are counted with two binary searches
+    sorted_heart_rates = np.sort(np.asarray(heart_rates, dtype=float))
+    lowers = np.array([lower for lower, upper, coefficient in zones_coefficients], dtype=float)
+    uppers = np.array([upper for lower, upper, coefficient in zones_coefficients], dtype=float)
+    coefficients = np.array([coefficient for lower, upper, coefficient in zones_coefficients])
 
-    for hr in heart_rates:
-        for lower, upper, coefficient in zones_coefficients:
-            if lower<= hr <= upper:
-                time_spent_in_zone[coefficient] += 1
+    # both ends of a zone are included, so a heart rate on the boundary of two zones counts in both
+    time_spent_in_zone = np.searchsorted(sorted_heart_rates, uppers, side="right") - np.searchsorted(sorted_heart_rates, lowers, side="left")
 
-    trimp_total = sum(key*val for key, val in time_spent_in_zone.items()) / 60
+    trimp_total = int(np.sum(coefficients * np.maximum(time_spent_in_zone, 0))) / 60
     return trimp_total
 
 
-def process_files(heart_rate_folder, discipline, start, end):
+def process_file(job, file_path, start, end, zones_coefficients=zones_coefficients, plot_folder=None):
+    """ Process one heart rate file
+    --------
+    Parameters
+    job: tuple of the discipline and the name of the file, e.g. ("Men's Singles", "file.csv")
+    file_path: string of the path to the heart rate file
+    start: int of the start frame for the calculation
+    end: int of the end frame for the calculation
+    zones_coefficients: list of the heart rate zones and coefficients (default is for participant_age from the config file)
+    plot_folder: string of the folder to save a plot of the heart rate to (default is None - no plot)
+    --------
+    Returns
+    dictionary of the file, discipline, average and max heart rate and TRIMP score
+    """
+    discipline, file = job
+    # the time is only needed for the plot
+    columns = ["Time", "HR (bpm)"] if plot_folder else ["HR (bpm)"]
+    with open_prefetched(file_path) as hr_file:
+        data = pd.read_csv(hr_file, header=2, usecols=columns).iloc[start:end]
+    heart_rate_values = data['HR (bpm)']
+
+    average_hr = np.mean(heart_rate_values)
+    max_hr = np.max(heart_rate_values)
+    trimp = calculate_trimp_score(heart_rate_values, zones_coefficients)
+
+    if plot_folder:
+        plot_heart_rate(convert_times_to_seconds(data['Time']), heart_rate_values, f"{discipline} - {file}", os.path.join(plot_folder, f"{discipline}_{os.path.splitext(file)[0]}.png"))
+
+    return {"File": file, "Average": average_hr, "Max": max_hr, "TRIMP": trimp, "Discipline": discipline}
+
+
+def plot_heart_rate(time_seconds, heart_rate_values, title, file_path):
+    """ Save a plot of heart rate against time """
+    # matplotlib is only imported when a plot is asked for
+    from matplotlib.figure import Figure
+    fig = Figure()
+    ax = fig.add_subplot()
+    ax.set_title(title)
+    ax.plot(time_seconds, heart_rate_values)
+    ax.set_xlabel("Time (s)")
+    ax.set_ylabel("HR (bpm)")
+    os.makedirs(os.path.dirname(file_path), exist_ok=True)
+    fig.savefig(file_path)
+
+
+def heart_rate_files(discipline_folder):
+    """ Returns the names of the heart rate (.csv) files in a discipline folder, in order - other files are ignored. """
+    return [file for file in sorted(os.listdir(discipline_folder)) if file.lower().endswith(".csv")]
+
+
+def process_files(heart_rate_folder, discipline, start, end, zones_coefficients=zones_coefficients, plot_folder=None):
     """ Process the heart rate files for a given discipline
     --------
     Parameters
@@ -51,42 +133,64 @@ def process_files(heart_rate_folder, discipline, start, end):
     discipline: string of the discipline to process
     start: int of the start frame for the calculation
     end: int of the end frame for the calculation
+    zones_coefficients: list of the heart rate zones and coefficients (default is for participant_age from the config file)
+    plot_folder: string of the folder to save a plot of each file to (default is None - no plots)
     --------
     Returns
     A data frame of the results
     """
-    file_list = os.listdir(os.path.join(heart_rate_folder, discipline))
-    results = pd.DataFrame(columns=["File", "Average", "Max", "TRIMP"])
+    rows = []
+    jobs = [(file, os.path.join(heart_rate_folder, discipline, file)) for file in heart_rate_files(os.path.join(heart_rate_folder, discipline))]
+    # the next files are read in the background while each file is processed
+    for file, file_path in prefetch_jobs(jobs, lambda file, file_path: [file_path]):
+        rows.append(process_file((discipline, file), file_path, start, end, zones_coefficients, plot_folder))
 
-    for file in file_list:
-        file_path = os.path.join(heart_rate_folder, discipline, file)
-        data = pd.read_csv(file_path, header=2).iloc[start:end]
-        heart_rate_values = data['HR (bpm)']
-        time = data['Time']
+    # build the results in one go rather than appending a row for each file
+    return pd.DataFrame(rows, columns=result_columns)
 
-        average_hr = np.mean(heart_rate_values)
-        max_hr = np.max(heart_rate_values)
-        trimp = calculate_trimp_score(heart_rate_values)
 
-        results = results._append({"Discipline": discipline, "Average": average_hr, "Max": max_hr, "TRIMP": trimp}, ignore_index=True)
-
-        plt.title(file)
-        time_seconds = [convert_hours_to_seconds(t) for t in time]
-        plt.plot(time_seconds, heart_rate_values)
-        #plt.show()
+def process_all_disciplines(heart_rate_folder, start, end, zones_coefficients=zones_coefficients, workers=n_workers, plot_folder=None):
+    """ Process the heart rate files of every discipline subfolder of the heart rate folder in a pool of processes
+    --------
+    Parameters
+    heart_rate_folder: string of the folder containing a subfolder of heart rate files for each discipline
+    start: int of the start frame for the calculation
+    end: int of the end frame for the calculation
+    zones_coefficients: list of the heart rate zones and coefficients (default is for participant_age from the config file)
+    workers: int of the number of processes used to process the files in parallel (default is n_workers from the config file)
+    plot_folder: string of the folder to save a plot of each file to (default is None - no plots)
+    --------
+    Returns
+    One data frame of the results of every file in every discipline. Files that fail are reported and left out.
+    """
+    jobs = {}
+    for discipline in sorted(os.listdir(heart_rate_folder)):
+        discipline_folder = os.path.join(heart_rate_folder, discipline)
+        if not os.path.isdir(discipline_folder):
+            continue
+        for file in heart_rate_files(discipline_folder):
+            jobs[(discipline, file)] = os.path.join(discipline_folder, file)
 
-    return results
+    results, errors = run_for_each_trial(process_file, jobs, (start, end, zones_coefficients, plot_folder), workers, prefetch=lambda job, file_path: [file_path])
+    return pd.DataFrame(list(results.values()), columns=result_columns)
 
 
 def write_results(results, filename):
     results.to_csv(filename, mode='a', index=False)
 
 
-
-results_folder = ""
-discipline = "Men's Singles"
-start = 60
-end = 2800
-
-results = process_files(heart_rate_folder, discipline, start, end)
-write_results(results, results_folder)
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Calculate the average and max heart rate and TRIMP score of every heart rate file.")
+    parser.add_argument("results_file", help="CSV file to add the results to")
+    parser.add_argument("--folder", default=heart_rate_folder, help="folder containing a subfolder of heart rate files for each discipline (default is heart_rate_folder from the config file)")
+    parser.add_argument("--discipline", default=None, help="only process this discipline (default is every discipline)")
+    parser.add_argument("--start", type=int, default=60, help="start frame for the calculation")
+    parser.add_argument("--end", type=int, default=2800, help="end frame for the calculation")
+    parser.add_argument("--workers", type=int, default=n_workers, help="number of processes used to process the files in parallel")
+    parser.add_argument("--plot-folder", default=None, help="save a plot of each file to this folder (default is no plots)")
+    args = parser.parse_args()
+    if args.discipline:
+        results = process_files(args.folder, args.discipline, args.start, args.end, plot_folder=args.plot_folder)
+    else:
+        results = process_all_disciplines(args.folder, args.start, args.end, workers=args.workers, plot_folder=args.plot_folder)
+    write_results(results, args.results_file)
@@ -0,0 +1,150 @@
+import os
+import json
+import time
+from contextlib import contextmanager, nullcontext
+from config import instrumentation_enabled, instrumentation_log
+
+# Stages of the pipeline that are timed: file discovery, sto parse, derivatives, energies, metric reduction, csv write and plot render
+_settings = {"enabled": instrumentation_enabled, "log_file": instrumentation_log, "trial": None}
+# Wall time and calls of each stage, and the files opened and bytes read of each trial, in this process
+_stage_stats = {}
+_trial_stats = {}
+# Returned by stage() when instrumentation is off, so a disabled stage costs one dictionary lookup
+_no_stage = nullcontext()
+
+
+def enable_instrumentation(log_file=None):
+    """ Turns on timing of the stages, optionally writing a JSON line to the log file for every stage that finishes. """
+    _settings["enabled"] = True
+    _settings["log_file"] = log_file
+
+
+def disable_instrumentation():
+    """ Turns off timing of the stages. """
+    _settings["enabled"] = False
+
+
+def instrumentation_is_enabled():
+    return _settings["enabled"]
+
+
+def instrumentation_log_file():
+    return _settings["log_file"]
+
+
+def reset_instrumentation():
+    """ Removes the stage and trial statistics collected so far. """
+    _stage_stats.clear()
+    _trial_stats.clear()
+
+
+def _write_log(record):
+    if _settings["log_file"]:
+        # one line per record, appended so every process can write to the same log
+        with open(_settings["log_file"], "a") as file:
+            file.write(json.dumps(record) + "\n")
+
+
+def _trial_entry(trial):
+    return _trial_stats.setdefault(str(trial), {"seconds": 0.0, "files_opened": 0, "bytes_read": 0})
+
+
+@contextmanager
+def _timed_stage(name):
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        seconds = time.perf_counter() - start
+        stats = _stage_stats.setdefault(name, {"calls": 0, "seconds": 0.0})
+        stats["calls"] += 1
+        stats["seconds"] += seconds
+        _write_log({"event": "stage", "stage": name, "trial": _settings["trial"], "seconds": seconds, "pid": os.getpid(), "time": time.time()})
+
+
+def stage(name):
+    """ Times a stage of the pipeline when instrumentation is on, e.g. "with stage("sto parse"):".
+    ----------
+    Parameters
+    name: string of the stage
+    ----------
+    Returns
+    A context manager that records the wall time of the stage (it does nothing when instrumentation is off)
+    """
+    if not _settings["enabled"]:
+        return _no_stage
+    return _timed_stage(name)
+
+
+@contextmanager
+def trial_context(trial):
+    """ Attributes the stages, files and bytes recorded inside it to a trial, and times the whole trial. """
+    if not _settings["enabled"]:
+        yield
+        return
+    previous_trial = _settings["trial"]
+    _settings["trial"] = str(trial)
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        _trial_entry(trial)["seconds"] += time.perf_counter() - start
+        _settings["trial"] = previous_trial
+
+
+def record_file_read(filename):
+    """ Counts a file opened by the current trial and the bytes in it, when instrumentation is on. """
+    if not _settings["enabled"]:
+        return
+    size = os.path.getsize(filename)
+    entry = _trial_entry(_settings["trial"])
+    entry["files_opened"] += 1
+    entry["bytes_read"] += size
+    _write_log({"event": "file", "file": filename, "bytes": size, "trial": _settings["trial"], "pid": os.getpid(), "time": time.time()})
+
+
+def instrumentation_summary():
+    """ Returns the statistics collected in this process (and merged from worker processes).
+    ----------
+    Returns
+    A dictionary of the "stages" (calls and seconds of each stage) and "trials" (seconds, files opened and bytes read of each trial)
+    """
+    return {"stages": {name: dict(stats) for name, stats in _stage_stats.items()}, "trials": {trial: dict(stats) for trial, stats in _trial_stats.items()}}
+
+
+def merge_instrumentation(summary):
+    """ Adds the statistics returned by instrumentation_summary in another process to the statistics of this process. """
+    for name, stats in summary["stages"].items():
+        totals = _stage_stats.setdefault(name, {"calls": 0, "seconds": 0.0})
+        totals["calls"] += stats["calls"]
+        totals["seconds"] += stats["seconds"]
+    for trial, stats in summary["trials"].items():
+        totals = _trial_entry(trial)
+        for key, value in stats.items():
+            totals[key] += value
+
+
+def run_instrumented(function, log_file, trial, point_dict, *args):
+    """ Runs function(trial, point_dict, *args) in a worker process with instrumentation on.
+    ----------
+    Returns
+    A tuple of the result of the function and the statistics collected while it ran
+    """
+    enable_instrumentation(log_file)
+    reset_instrumentation()
+    with trial_context(trial):
+        result = function(trial, point_dict, *args)
+    return result, instrumentation_summary()
+
+
+def print_instrumentation_summary():
+    """ Prints the time spent in each stage and the slowest trials, and writes the summary to the log file. """
+    summary = instrumentation_summary()
+    _write_log({"event": "summary", **summary, "pid": os.getpid(), "time": time.time()})
+    print("Stage                  Calls   Seconds")
+    for name, stats in sorted(summary["stages"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{name:<22} {stats['calls']:>5} {stats['seconds']:>9.3f}")
+    print("Trial      Seconds  Files        Bytes")
+    for trial, stats in sorted(summary["trials"].items(), key=lambda item: -item[1]["seconds"]):
+        print(f"{trial:<10} {stats['seconds']:>7.3f} {stats['files_opened']:>6} {stats['bytes_read']:>12}")
+    return summary
@@ -0,0 +1,182 @@
+import sys
+import time
+import argparse
+
+# Only the standard library is imported here - each command imports the modules it uses when it runs,
+# and those modules only import pandas in the functions that build dataframes, so unused commands never load pandas or matplotlib.
+# Cold-start target: "python kinematics.py --help", "kinematics.py run --help" and importing write_results or metrics_engine
+# should each finish within this many seconds (checked by the benchmarks)
+cold_start_target_seconds = 0.25
+
+
+def run_command(args):
+    """ Calculates the metrics of every point and writes the CSV files, as write_results.py does. """
+    import point_dict_creator
+    from write_results import extract_metrics_for_each_point, write_metrics_to_csv, write_peak_metrics_to_csv
+    from results_manifest import extract_metrics_incrementally, extract_peak_metrics_incrementally
+    from results_store import append_metrics
+    from config import keypoint
+    trial_dict = point_dict_creator.create_point_dict(args.csv_file, args.sheet_name)
+    if args.full:
+        metrics_dict = extract_metrics_for_each_point(args.kinematics_folder, trial_dict, args.workers, streaming=args.streaming)
+    else:
+        # only the points whose .sto files or frames changed since the last run are calculated again
+        metrics_dict = extract_metrics_incrementally(args.kinematics_folder, trial_dict, args.data_path, args.workers, streaming=args.streaming)
+    append_metrics(metrics_dict, args.participant, keypoint, args.results_store, args.results_store_format)
+    if args.csv:
+        write_metrics_to_csv(args.kinematics_folder, trial_dict, ["Distance Covered", "Player Load", "Work Done"], metrics_dict=metrics_dict, data_path=args.data_path)
+    if not args.no_peaks:
+        # with --full every peak is calculated again too, otherwise only the peaks of the points that changed
+        peak_metrics_dict = None if args.full else extract_peak_metrics_incrementally(args.kinematics_folder, trial_dict, args.data_path, workers=args.workers)
+        write_peak_metrics_to_csv(args.kinematics_folder, trial_dict, peak_metrics_dict=peak_metrics_dict, data_path=args.data_path)
+
+
+def plot_command(args):
+    """ Draws the plots of every point, as visualise_data.py does. """
+    import os
+    import point_dict_creator
+    from visualise_data import generate_plots_in_loop
+    trial_dict = point_dict_creator.create_point_dict(args.csv_file, args.sheet_name)
+    data_types = args.data_type[0] if len(args.data_type) == 1 else args.data_type
+    # a single data type has a folder of its own, several share the plot folder
+    plot_folder = os.path.join(args.plot_path, data_types) if isinstance(data_types, str) else args.plot_path
+    os.makedirs(plot_folder, exist_ok=True)
+    generate_plots_in_loop(args.kinematics_folder, trial_dict, data_types, plot_folder, args.workers, args.dpi, args.format, not args.no_resume, args.multi_panel)
+
+
+def hr_command(args):
+    """ Calculates the heart rate results of every file, as heart_rate.py does. """
+    from heart_rate import process_files, process_all_disciplines, write_results
+    if args.discipline:
+        results = process_files(args.folder, args.discipline, args.start, args.end, plot_folder=args.plot_folder)
+    else:
+        results = process_all_disciplines(args.folder, args.start, args.end, workers=args.workers, plot_folder=args.plot_folder)
+    write_results(results, args.results_file)
+
+
+def export_command(args):
+    """ Writes the results store to a CSV file. """
+    from results_store import export_results_csv
+    table = export_results_csv(args.csv_file, args.results_store, args.participant)
+    print(f"{len(table)} points written to {args.csv_file}.")
+
+
+def follow_command(args):
+    """ Reports the metrics of each point of a trial while its .sto files are still being written. """
+    import point_dict_creator
+    from live_tail import follow_trial
+    from trial_files import trial_number_of
+    trial_dict = point_dict_creator.create_point_dict(args.csv_file, args.sheet_name)
+    trial = next((trial for trial in trial_dict if trial_number_of(trial) == int(args.trial)), None)
+    if trial is None:
+        raise SystemExit(f"Trial {args.trial} is not in {args.csv_file}.")
+    follow_trial(trial, trial_dict[trial], args.kinematics_folder, poll_interval=args.poll_interval, idle_timeout=args.idle_timeout)
+
+
+def cohort_command(args):
+    """ Processes every participant of a cohort manifest, as cohort.py does. """
+    from cohort import run_cohort
+    run_cohort(args.manifest, args.output_folder, args.workers)
+
+
+def cache_command(args):
+    """ Converts the .sto files of a folder to the binary cache, as sto_cache.py does. """
+    from sto_cache import build_sto_cache
+    files_cached = build_sto_cache(args.folder, args.cache_dir, args.verify_hash)
+    print(f"{files_cached} .sto files cached.")
+
+
+def create_parser(defaults):
+    """ Creates the parser of the command line, using the settings in the config file as the defaults. """
+    parser = argparse.ArgumentParser(prog="kinematics", description="Kinematic analysis of OpenSim .sto files and heart rate data.")
+    parser.add_argument("--instrument", action="store_true", help="time each stage and print a summary")
+    parser.add_argument("--instrument-log", default=None, metavar="LOG", help="also write the timings as JSON lines to LOG")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="calculate the metrics of every point and write the CSV files")
+    run_parser.add_argument("--kinematics-folder", default=defaults.get("kinematics_folder"), help="folder containing the .sto files")
+    run_parser.add_argument("--csv-file", default=defaults.get("csv_file"), help="CSV file of the start and end frames of the points")
+    run_parser.add_argument("--sheet-name", default=defaults.get("sheet_name"), help="sheet of the points if the file is an Excel workbook")
+    run_parser.add_argument("--data-path", default=defaults.get("data_path"), help="folder to write the CSV files to")
+    run_parser.add_argument("--workers", type=int, default=defaults.get("n_workers", 1), help="number of processes used to process the trials in parallel")
+    run_parser.add_argument("--full", action="store_true", help="calculate every point again instead of only the points that changed")
+    run_parser.add_argument("--streaming", action=argparse.BooleanOptionalAction, default=defaults.get("use_streaming", False), help="read the .sto files in chunks, so memory stays constant however long the trials are")
+    run_parser.add_argument("--no-peaks", action="store_true", help="don't write peak_metrics.csv")
+    run_parser.add_argument("--participant", default=defaults.get("participant"), help="participant the results are stored under")
+    run_parser.add_argument("--results-store", default=defaults.get("results_store_dir"), help="folder of the results table to add the results of every point to")
+    run_parser.add_argument("--results-store-format", default=defaults.get("results_store_format", ".npz"), choices=[".parquet", ".feather", ".npz"], help="format of the results written to the results store")
+    run_parser.add_argument("--csv", action=argparse.BooleanOptionalAction, default=defaults.get("export_metric_csvs", True), help="also write a CSV file for each metric to the data path")
+    run_parser.set_defaults(function=run_command)
+
+    plot_parser = commands.add_parser("plot", help="draw a plot of each point")
+    plot_parser.add_argument("--kinematics-folder", default=defaults.get("kinematics_folder"), help="folder containing the .sto files")
+    plot_parser.add_argument("--csv-file", default=defaults.get("csv_file"), help="CSV file of the start and end frames of the points")
+    plot_parser.add_argument("--sheet-name", default=defaults.get("sheet_name"), help="sheet of the points if the file is an Excel workbook")
+    plot_parser.add_argument("--plot-path", default=defaults.get("plot_path"), help="folder to save the plots in")
+    plot_data = defaults.get("plot_data", "Energy")
+    plot_parser.add_argument("--data-type", nargs="+", default=[plot_data] if isinstance(plot_data, str) else list(plot_data), choices=["Position", "Velocity", "Acceleration", "Energy"], help="data to plot")
+    plot_parser.add_argument("--multi-panel", action=argparse.BooleanOptionalAction, default=defaults.get("plot_multi_panel", False), help="draw every data type of a point as a panel of one figure")
+    plot_parser.add_argument("--dpi", type=int, default=defaults.get("plot_dpi", 1200), help="resolution of the plots")
+    plot_parser.add_argument("--format", default=defaults.get("plot_format", "png"), choices=["png", "svg", "pdf"], help="format of the plots")
+    plot_parser.add_argument("--workers", type=int, default=defaults.get("n_workers", 1), help="number of processes used to plot the trials in parallel")
+    plot_parser.add_argument("--no-resume", action="store_true", help="draw every plot again, even if it is unchanged")
+    plot_parser.set_defaults(function=plot_command)
+
+    hr_parser = commands.add_parser("hr", help="calculate the average and max heart rate and TRIMP score of every heart rate file")
+    hr_parser.add_argument("results_file", help="CSV file to add the results to")
+    hr_parser.add_argument("--folder", default=defaults.get("heart_rate_folder"), help="folder containing a subfolder of heart rate files for each discipline")
+    hr_parser.add_argument("--discipline", default=None, help="only process this discipline (default is every discipline)")
+    hr_parser.add_argument("--start", type=int, default=60, help="start frame for the calculation")
+    hr_parser.add_argument("--end", type=int, default=2800, help="end frame for the calculation")
+    hr_parser.add_argument("--workers", type=int, default=defaults.get("n_workers", 1), help="number of processes used to process the files in parallel")
+    hr_parser.add_argument("--plot-folder", default=None, help="save a plot of each file to this folder (default is no plots)")
+    hr_parser.set_defaults(function=hr_command)
+
+    export_parser = commands.add_parser("export", help="write the results store to a CSV file")
+    export_parser.add_argument("csv_file", help="CSV file to write")
+    export_parser.add_argument("--results-store", default=defaults.get("results_store_dir"), help="folder of the results table to export")
+    export_parser.add_argument("--participant", nargs="+", default=None, help="only export these participants (default is every participant)")
+    export_parser.set_defaults(function=export_command)
+
+    follow_parser = commands.add_parser("follow", help="report the metrics of each point while OpenSim is still writing a trial's .sto files")
+    follow_parser.add_argument("trial", help="number of the trial to follow, e.g. 01")
+    follow_parser.add_argument("--kinematics-folder", default=defaults.get("kinematics_folder"), help="folder the .sto files are written to")
+    follow_parser.add_argument("--csv-file", default=defaults.get("csv_file"), help="CSV file of the start and end frames of the points")
+    follow_parser.add_argument("--sheet-name", default=defaults.get("sheet_name"), help="sheet of the points if the file is an Excel workbook")
+    follow_parser.add_argument("--poll-interval", type=float, default=0.5, help="seconds to wait between checks of the files")
+    follow_parser.add_argument("--idle-timeout", type=float, default=30, help="seconds without new rows after which the trial is treated as finished")
+    follow_parser.set_defaults(function=follow_command)
+
+    cohort_parser = commands.add_parser("cohort", help="process every participant of a cohort manifest")
+    cohort_parser.add_argument("manifest", help="CSV or YAML manifest of the participants")
+    cohort_parser.add_argument("output_folder", help="folder to write the combined results to")
+    cohort_parser.add_argument("--workers", type=int, default=defaults.get("n_workers", 1), help="number of processes used to process the trials in parallel")
+    cohort_parser.set_defaults(function=cohort_command)
+
+    cache_parser = commands.add_parser("cache", help="convert the .sto files of a folder to the binary cache")
+    cache_parser.add_argument("folder", help="folder containing the .sto files, e.g. a participant folder")
+    cache_parser.add_argument("--cache-dir", default=defaults.get("sto_cache_dir"), help="folder to store the cache in (default is a .sto_cache folder next to each .sto file)")
+    cache_parser.add_argument("--verify-hash", action="store_true", help="also compare the SHA-1 hash of files that are already cached")
+    cache_parser.set_defaults(function=cache_command)
+    return parser
+
+
+def main(argv=None):
+    """ Runs the command line, e.g. main(["run", "--workers", "4"]). """
+    # config.py only sets variables, so it is cheap to import for the defaults
+    import config
+    parser = create_parser(vars(config))
+    args = parser.parse_args(argv)
+    if args.instrument or args.instrument_log:
+        from instrumentation import enable_instrumentation
+        enable_instrumentation(args.instrument_log)
+    start = time.perf_counter()
+    args.function(args)
+    if args.instrument or args.instrument_log:
+        from instrumentation import print_instrumentation_summary
+        print_instrumentation_summary()
+    print(f"{args.command} finished in {time.perf_counter() - start:.1f} s.")
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,211 @@
+import io
+import os
+import time
+import numpy as np
+from trial_files import find_trial_files, trial_number_of
+from sto_reader import _read_header, _column_indices, parse_sto_lines
+from streaming import StreamingMetrics
+from signal_filter import filter_settings
+from config import keypoint, rows_to_skip, participant_mass
+
+
+class StoLineParser:
+    """ Parses the rows of a .sto file as its bytes arrive, e.g. from a file that is still being written or a pipe.
+    Bytes after the last complete line are kept until the rest of the line arrives, so a row is never parsed half written.
+    """
+
+    def __init__(self, columns=None, skip_lines=0, name=".sto stream"):
+        """
+        ----------
+        Parameters
+        columns: list of the labels of the columns to return (default is None - every column)
+        skip_lines: int of the number of lines to skip from the start of the file, including the header (default is 0)
+        name: string used for the file in error messages (default is ".sto stream")
+        """
+        self.columns = columns
+        self.skip_lines = skip_lines
+        self.name = name
+        self.header = None
+        self.usecols = None
+        self.rows_left_to_skip = 0
+        self.partial = b""
+        self.header_lines = []
+
+    def feed(self, data):
+        """ Adds the next bytes of the file.
+        ----------
+        Parameters
+        data: bytes read from the file since the last call
+        ----------
+        Returns
+        A dictionary of a numpy array for each column, holding the complete rows in the data (None if there are none yet)
+        """
+        lines = (self.partial + data).split(b"\n")
+        # the last piece has no newline yet, so it waits for the next call
+        self.partial = lines.pop()
+        lines = [line.decode() for line in lines]
+        if self.header is None:
+            self.header_lines.extend(lines)
+            try:
+                self.header = _read_header(io.StringIO("\n".join(self.header_lines) + "\n"))
+            except ValueError:
+                # the labels have not been written yet
+                return None
+            self.columns, self.usecols = _column_indices(self.header, self.columns, self.name)
+            self.rows_left_to_skip = max(self.skip_lines - self.header["header_lines"], 0)
+            lines = self.header_lines[self.header["header_lines"]:]
+            self.header_lines = []
+        skip = min(self.rows_left_to_skip, len(lines))
+        self.rows_left_to_skip -= skip
+        lines = [line for line in lines[skip:] if line.strip()]
+        if not lines:
+            return None
+        return parse_sto_lines(lines, self.columns, self.usecols)
+
+
+class StoTail:
+    """ Follows a .sto file that is still being written, reading only the bytes appended since the last poll. """
+
+    def __init__(self, filename, parser=None):
+        """
+        ----------
+        Parameters
+        filename: string of the path to the .sto file
+        parser: StoLineParser the appended bytes are fed to (default is None - a parser of every column)
+        """
+        self.filename = filename
+        self.parser = parser if parser is not None else StoLineParser(name=filename)
+        self.offset = 0
+
+    def poll(self):
+        """ Returns the rows appended to the file since the last poll, in the format of StoLineParser.feed (None if there are none).
+        Raises an OSError if the file has become shorter, as it has been rewritten rather than appended to.
+        """
+        if not os.path.exists(self.filename):
+            return None
+        size = os.path.getsize(self.filename)
+        if size < self.offset:
+            raise OSError(f"{self.filename} is shorter than the {self.offset} bytes already read, so it has been rewritten.")
+        if size == self.offset:
+            return None
+        with open(self.filename, "rb") as file:
+            file.seek(self.offset)
+            data = file.read(size - self.offset)
+        self.offset += len(data)
+        return self.parser.feed(data)
+
+
+class LiveTrialMetrics:
+    """ Calculates the metrics of each point of a trial from position and velocity rows as they arrive,
+    returning a point's results as soon as the frames pass its end frame.
+    The position and velocity rows can arrive at different rates - the frames are only added once both have arrived.
+    """
+
+    def __init__(self, point_dict, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+        """
+        ----------
+        Parameters
+        point_dict: dictionary of the points in the trial e.g. {"point1": [0, 2952], "point2": [4000, 5603]}
+        keypoint: string of the keypoint (default is keypoint from the config file)
+        participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+        rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+        """
+        self.keypoint_columns = [f"{keypoint}_{plane}" for plane in ["X", "Y", "Z"]]
+        self.rows_of_data_to_skip = rows_of_data_to_skip
+        # the length of the trial is not known until it ends, so points are never cut short
+        self.streaming_metrics = StreamingMetrics(point_dict, participant_mass, rows_of_data_to_skip)
+        self.pending = {"time": np.empty(0), "position": np.empty((0, 3)), "velocity": np.empty((0, 3))}
+        # the first rows of data are skipped after the lines skipped by the parsers, as they are in memory
+        self.rows_left_to_skip = {"position": rows_of_data_to_skip, "velocity": rows_of_data_to_skip}
+
+    def pos_parser(self, name=".sto stream"):
+        """ Returns a parser for the position rows, to feed with the bytes of a BodyKinematics_pos_global file. """
+        return StoLineParser(["time"] + self.keypoint_columns, self.rows_of_data_to_skip, name)
+
+    def vel_parser(self, name=".sto stream"):
+        """ Returns a parser for the velocity rows, to feed with the bytes of a BodyKinematics_vel_global file. """
+        return StoLineParser(self.keypoint_columns, self.rows_of_data_to_skip, name)
+
+    def _add_rows(self, key, rows):
+        skip = min(self.rows_left_to_skip[key], len(rows))
+        self.rows_left_to_skip[key] -= skip
+        self.pending[key] = np.vstack((self.pending[key], rows[skip:]))
+        return skip
+
+    def add(self, pos_data=None, vel_data=None):
+        """ Adds new rows of the position and/or velocity files.
+        ----------
+        Parameters
+        pos_data: dictionary returned by the position parser (default is None - no new position rows)
+        vel_data: dictionary returned by the velocity parser (default is None - no new velocity rows)
+        ----------
+        Returns
+        A dictionary of the distance covered, player load, negative and positive work of each point that has finished since the last call
+        """
+        if pos_data is not None:
+            skip = self._add_rows("position", np.column_stack([pos_data[column] for column in self.keypoint_columns]))
+            self.pending["time"] = np.concatenate((self.pending["time"], pos_data["time"][skip:]))
+        if vel_data is not None:
+            self._add_rows("velocity", np.column_stack([vel_data[column] for column in self.keypoint_columns]))
+        frames = min(len(self.pending["position"]), len(self.pending["velocity"]))
+        if frames:
+            self.streaming_metrics.update(self.pending["time"][:frames], self.pending["position"][:frames], self.pending["velocity"][:frames])
+            self.pending = {key: values[frames:] for key, values in self.pending.items()}
+        return self.streaming_metrics.finished_points()
+
+    def finish(self):
+        """ Returns the metrics of the points that had not finished when the data ended. """
+        self.streaming_metrics.point_ends[:] = 0
+        return self.streaming_metrics.finished_points()
+
+
+def follow_trial(trial, point_dict, kinematics_folder, on_point=None, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, poll_interval=0.5, idle_timeout=30):
+    """ Follows the BodyKinematics_pos_global and vel_global files of a trial while OpenSim writes them,
+    parsing only the appended rows and reporting each point's metrics as soon as the frames pass its end frame.
+    ----------
+    Parameters
+    trial: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_dict: dictionary of the points in the trial
+    kinematics_folder: string of the folder containing the kinematics files
+    on_point: function called with (point, metrics) when a point finishes (default is None - the metrics are printed)
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    poll_interval: float of the seconds to wait between checks of the files (default is 0.5)
+    idle_timeout: float of the seconds without new rows after which the trial is treated as finished (default is 30)
+    ----------
+    Returns
+    A dictionary with the distance covered, player load, negative and positive work for each point
+    """
+    if on_point is None:
+        on_point = lambda point, metrics: print(f"Trial {trial[len('trial_'):]} {point}: " + ", ".join(f"{metric} {value:.2f}" for metric, value in metrics.items()))
+    live_metrics = LiveTrialMetrics(point_dict, keypoint, participant_mass, rows_of_data_to_skip)
+    tails = None
+    results = {}
+    last_rows = time.monotonic()
+    print(f"Following trial number {trial[len('trial_'):]} in {kinematics_folder}.")
+    if filter_settings() is not None:
+        # a zero-phase filter needs the frames after a point, so it can't be used while the files are being written
+        print("The live metrics are calculated from the unfiltered signals.")
+    while len(results) < len(point_dict) and time.monotonic() - last_rows < idle_timeout:
+        if tails is None:
+            # the files may not have been created yet
+            trial_files = find_trial_files(kinematics_folder, trial_number_of(trial))
+            if "pos_global" in trial_files and "vel_global" in trial_files:
+                tails = {"pos": StoTail(trial_files["pos_global"], live_metrics.pos_parser(trial_files["pos_global"])),
+                         "vel": StoTail(trial_files["vel_global"], live_metrics.vel_parser(trial_files["vel_global"]))}
+        if tails is not None:
+            pos_data, vel_data = tails["pos"].poll(), tails["vel"].poll()
+            if pos_data is not None or vel_data is not None:
+                last_rows = time.monotonic()
+                for point, metrics in live_metrics.add(pos_data, vel_data).items():
+                    results[point] = metrics
+                    on_point(point, metrics)
+                continue
+        time.sleep(poll_interval)
+
+    # the points still open when the files stopped growing end with the data, as they do in memory
+    for point, metrics in live_metrics.finish().items():
+        results[point] = metrics
+        on_point(point, metrics)
+    return {point: results[point] for point in point_dict}
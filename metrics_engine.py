@@ -0,0 +1,294 @@
+import numpy as np
+from full_body_kinematics import create_trial_kinematics, calculate_trial_energies
+from trial_cache import get_derived, store_derived
+from trial_files import trial_number_of
+from instrumentation import stage
+from config import keypoint, rows_to_skip, participant_mass
+
+
+def adjust_frame_numbers(rows_of_data_to_skip, start, end, slice_start=None, slice_end=None):
+    """ Adjusts the frame numbers to account for the rows of data to skip and makes sure frame numbers are not negative.
+    ----------
+    Parameters
+    rows_of_data_to_skip: int of the number of rows to skip in the data
+    start: int of the start frame for the calculation
+    end: int of the end frame for the calculation
+    slice_start: int of the frame to begin a slice of data (default is None)
+    slice_end: int of the frame to end a slice of data (default is None)
+    ----------
+    Returns
+    start: int of the adjusted start frame
+    end: int of the adjusted end frame
+    slice_start: int of the adjusted frame to begin a slice of data
+    slice_end: int of the adjusted frame to end a slice of data
+    """
+    if start - rows_of_data_to_skip <= 0:
+        start = 1
+    else:
+        start -= rows_of_data_to_skip
+    end -= rows_of_data_to_skip
+    if slice_start is not None and slice_end is not None:
+        slice_start -= rows_of_data_to_skip
+        slice_end -= rows_of_data_to_skip
+        return start, end, slice_start, slice_end
+    return start, end
+
+
+def calculate_frame_increments(position, acceleration, delta_te):
+    """ Calculates the per-frame increments that are summed to give each metric.
+    ----------
+    Parameters
+    position: numpy array of the keypoint position (frames x 3, or frames x keypoints x 3)
+    acceleration: numpy array of the keypoint acceleration (same shape as position)
+    delta_te: numpy array of the change in total energy of each frame (frames, or frames x keypoints)
+    ----------
+    Returns
+    A dictionary of arrays with one value per frame:
+    "Distance Covered" - distance between the frame and the frame before it
+    "Player Load" - player load between the frame and the frame after it (Boyd et al., 2011)
+    "Negative Work" and "Positive Work" - the negative and positive changes in total energy at the frame
+    """
+    distance = np.zeros(position.shape[:-1])
+    distance[1:] = np.sqrt((np.diff(position, axis=0)**2).sum(axis=-1))
+    player_load = np.zeros(acceleration.shape[:-1])
+    player_load[:-1] = np.sqrt((np.diff(acceleration, axis=0)**2).sum(axis=-1)/100)
+    delta_te = np.asarray(delta_te, dtype=float)
+    # missing values (e.g. the first frame of a derivative) are left out of the sums
+    increments = {
+        "Distance Covered": distance,
+        "Player Load": player_load,
+        "Negative Work": np.where(delta_te < 0, delta_te, 0),
+        "Positive Work": np.where(delta_te > 0, delta_te, 0),
+    }
+    return {metric: np.nan_to_num(values) for metric, values in increments.items()}
+
+
+def calculate_metric_windows(frames, total_frames, rows_of_data_to_skip=rows_to_skip):
+    """ Converts the frames of a point into the ranges of frame increments summed for each metric.
+    ----------
+    Parameters
+    frames: list of [start, end] or [start, end, slice_start, slice_end] frames of the point (end is None for the whole trial)
+    total_frames: int of the number of frames in the trial
+    rows_of_data_to_skip: int of the number of rows skipped in the data
+    ----------
+    Returns
+    A dictionary of the two (first, last) ranges of increments used by each metric - the second range is empty if the point is not sliced
+    """
+    start, end, slice_start, slice_end = (list(frames) + [None, None])[:4]
+    # if end is None, we have not been given a point and use the entire trial
+    if end is None:
+        return {
+            "Distance Covered": [(1, total_frames), (0, 0)],
+            "Player Load": [(0, total_frames - 1), (0, 0)],
+            "Work": [(0, total_frames), (0, 0)],
+        }
+    #if we have been given an end frame but no slice, we use the frames of the point
+    if not slice_start:
+        start, end = adjust_frame_numbers(rows_of_data_to_skip, int(start), int(end))
+        return {
+            "Distance Covered": [(start + 1, end), (0, 0)],
+            "Player Load": [(start, min(end, total_frames) - 1), (0, 0)],
+            "Work": [(start, end), (0, 0)],
+        }
+    #if we have a slice, the frames between slice_start and slice_end are left out of the point
+    start, end, slice_start, slice_end = adjust_frame_numbers(rows_of_data_to_skip, int(start), int(end), int(slice_start), int(slice_end))
+    end_of_load = min(end, total_frames)
+    return {
+        "Distance Covered": [(start + 1, slice_start), (slice_end + 1, end)],
+        "Player Load": [(start, slice_start - 1), (slice_end, end_of_load - 2)],
+        "Work": [(start, slice_start), (slice_end, end)],
+    }
+
+
+class TrialIndex:
+    """ Cumulative sums of the per-frame increments of a trial.
+    The distance covered, player load and work of any window (or a window minus a slice) then cost one subtraction,
+    so points can be re-segmented without going back to the trial's data.
+    """
+
+    def __init__(self, position, acceleration, delta_te, rows_of_data_to_skip=rows_to_skip):
+        """
+        ----------
+        Parameters
+        position: numpy array of the keypoint position (frames x 3, or frames x keypoints x 3)
+        acceleration: numpy array of the keypoint acceleration (same shape as position)
+        delta_te: numpy array of the change in total energy of each frame (frames, or frames x keypoints)
+        rows_of_data_to_skip: int of the number of rows skipped in the data
+        """
+        self.total_frames = len(position)
+        self.rows_of_data_to_skip = rows_of_data_to_skip
+        self.cumulative = {}
+        for metric, increments in calculate_frame_increments(position, acceleration, delta_te).items():
+            cumulative = np.zeros((self.total_frames + 1,) + increments.shape[1:])
+            np.cumsum(increments, axis=0, out=cumulative[1:])
+            self.cumulative[metric] = cumulative
+
+    @classmethod
+    def from_dataframe(cls, kinematics_df, rows_of_data_to_skip=rows_to_skip, keypoint=keypoint):
+        """ Creates the index of a trial from the dataframe created by calculate_mech_energies. """
+        position = kinematics_df[[f"{keypoint}_{plane} (m)" for plane in ["X", "Y", "Z"]]].to_numpy()
+        acceleration = kinematics_df[[f"{keypoint}_{plane} (m/s^2)" for plane in ["X", "Y", "Z"]]].to_numpy()
+        delta_te = kinematics_df["Change in Total Energy (J)"].to_numpy()
+        return cls(position, acceleration, delta_te, rows_of_data_to_skip)
+
+    @classmethod
+    def from_trial_kinematics(cls, trial_energies, rows_of_data_to_skip=rows_to_skip):
+        """ Creates the index of a trial from the TrialKinematics returned by calculate_trial_energies, without going through pandas. """
+        return cls(trial_energies.position, trial_energies.acceleration, trial_energies.delta_total_energy, rows_of_data_to_skip)
+
+    @property
+    def nbytes(self):
+        """ int of the size of the cumulative sums, counted by the trial cache that keeps the index. """
+        return sum(cumulative.nbytes for cumulative in self.cumulative.values())
+
+    def sum_windows(self, metric, windows):
+        """ Sums the increments of a metric over ranges of frames.
+        ----------
+        Parameters
+        metric: string of the metric - Distance Covered, Player Load, Negative Work or Positive Work
+        windows: array of (first, last) ranges of frames - the last dimension must be 2, the second last is summed
+        ----------
+        Returns
+        numpy array of the sums of each set of ranges
+        """
+        cumulative = self.cumulative[metric]
+        windows = np.asarray(windows, dtype=int)
+        first = np.clip(windows[..., 0], 0, self.total_frames)
+        last = np.clip(windows[..., 1], first, self.total_frames)
+        return (cumulative[last] - cumulative[first]).sum(axis=windows.ndim - 2)
+
+    def point_metrics(self, point_dict):
+        """ Calculates every metric for each point in a dictionary of points, e.g. {"point1": [0, 2952], "point2": [4000, 5603]}.
+        Points can also be [start, end, slice_start, slice_end] to leave out the frames between slice_start and slice_end.
+        """
+        points = list(point_dict)
+        frames = [(list(point_dict[point]) + [None, None])[:4] for point in points]
+        # when no point is sliced, every point is evaluated from arrays of its start and end frames in one go
+        if all(end is not None and not slice_start for _, end, slice_start, _ in frames):
+            interval_metrics = self.interval_metrics([start for start, *_ in frames], [end for _, end, *_ in frames])
+            return {point: {metric: values[i] for metric, values in interval_metrics.items()} for i, point in enumerate(points)}
+        windows = [calculate_metric_windows(point_dict[point], self.total_frames, self.rows_of_data_to_skip) for point in points]
+        distance_windows = np.array([window["Distance Covered"] for window in windows], dtype=int).reshape(-1, 2, 2)
+        load_windows = np.array([window["Player Load"] for window in windows], dtype=int).reshape(-1, 2, 2)
+        work_windows = np.array([window["Work"] for window in windows], dtype=int).reshape(-1, 2, 2)
+
+        distance = self.sum_windows("Distance Covered", distance_windows)
+        player_load = self.sum_windows("Player Load", load_windows)
+        negative_work = self.sum_windows("Negative Work", work_windows)
+        positive_work = self.sum_windows("Positive Work", work_windows)
+
+        point_metrics = {}
+        for i, point in enumerate(points):
+            point_metrics[point] = {
+                "Distance Covered": distance[i],
+                "Player Load": player_load[i],
+                "Negative Work": negative_work[i],
+                "Positive Work": positive_work[i],
+            }
+        return point_metrics
+
+    def interval_metrics(self, start, end):
+        """ Calculates every metric for arrays of start and end frames, e.g. the "start" and "end" of a trial returned by load_point_table.
+        ----------
+        Parameters
+        start: numpy array of the start frame of each point
+        end: numpy array of the end frame of each point
+        ----------
+        Returns
+        A dictionary of an array of each metric, with a value for each point
+        """
+        # the same frames as calculate_metric_windows gives a point that is not sliced
+        end = np.asarray(end, dtype=int) - self.rows_of_data_to_skip
+        start = np.maximum(np.asarray(start, dtype=int) - self.rows_of_data_to_skip, 1)
+        work_windows = np.stack((start, end), axis=-1)[:, None]
+        return {
+            "Distance Covered": self.sum_windows("Distance Covered", np.stack((start + 1, end), axis=-1)[:, None]),
+            "Player Load": self.sum_windows("Player Load", np.stack((start, np.minimum(end, self.total_frames) - 1), axis=-1)[:, None]),
+            "Negative Work": self.sum_windows("Negative Work", work_windows),
+            "Positive Work": self.sum_windows("Positive Work", work_windows),
+        }
+
+    def distance(self, start, end=None, slice_start=None, slice_end=None):
+        """ Returns the distance covered during the trial (end is None) or the (sliced) point. """
+        return self.point_metrics({"point": [start, end, slice_start, slice_end]})["point"]["Distance Covered"]
+
+    def player_load(self, start, end=None, slice_start=None, slice_end=None):
+        """ Returns the player load during the trial (end is None) or the (sliced) point. """
+        return self.point_metrics({"point": [start, end, slice_start, slice_end]})["point"]["Player Load"]
+
+    def work(self, start, end=None, slice_start=None, slice_end=None):
+        """ Returns the negative and positive work during the trial (end is None) or the (sliced) point. """
+        metrics = self.point_metrics({"point": [start, end, slice_start, slice_end]})["point"]
+        return metrics["Negative Work"], metrics["Positive Work"]
+
+
+def load_trial_index(kinematics_folder, trial_number, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Returns the TrialIndex of a trial, which is kept with the trial in the trial cache so it is only built once.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_number: string of the trial number
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    ----------
+    Returns
+    The TrialIndex of the trial, or None if there is no data for the trial.
+    Raises a ValueError if the files of the trial have no frames of data, so the trial is reported as an error instead of giving metrics of 0.
+    """
+    trial_kinematics = create_trial_kinematics(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip)
+    if trial_kinematics is None:
+        return None
+    if len(trial_kinematics.time) == 0:
+        raise ValueError(f"The files of trial number {trial_number} have no frames of data after the {rows_of_data_to_skip} rows skipped.")
+    # the energies depend on the participant's mass, so it is part of the name the index is stored under
+    index_name = ("TrialIndex", participant_mass)
+    trial_index = get_derived(trial_kinematics, index_name)
+    if trial_index is None:
+        trial_energies = calculate_trial_energies(kinematics_folder, trial_number, keypoint, participant_mass, rows_of_data_to_skip)
+        with stage("metric reduction"):
+            trial_index = TrialIndex.from_trial_kinematics(trial_energies, rows_of_data_to_skip)
+        store_derived(trial_kinematics, index_name, trial_index)
+    return trial_index
+
+
+def calculate_trial_metrics(trial, point_dict, kinematics_folder, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Calculates every metric for each point of a trial in the trial dictionary.
+    ----------
+    Parameters
+    trial: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_dict: dictionary of the points in the trial
+    kinematics_folder: string of the folder containing the kinematics files
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    ----------
+    Returns
+    A dictionary with the distance covered, player load, negative and positive work for each point (0 if there is no data for the trial)
+    Raises a ValueError if the files of the trial have no frames of data
+    """
+    trial_index = load_trial_index(kinematics_folder, trial_number_of(trial), keypoint, participant_mass, rows_of_data_to_skip)
+    if trial_index is None:
+        print(f"No data for Trial Number {trial[len('trial_'):]}. Skipping...")
+        return {point: {"Distance Covered": 0, "Player Load": 0, "Negative Work": 0, "Positive Work": 0} for point in point_dict}
+    #calculate the metrics of all points in the trial together
+    print(f"Processing data for trial number {trial[len('trial_'):]}.")
+    with stage("metric reduction"):
+        return trial_index.point_metrics(point_dict)
+
+
+def calculate_point_metrics(kinematics_df, point_dict, rows_of_data_to_skip=rows_to_skip, keypoint=keypoint):
+    """ Calculates distance covered, player load and external mechanical work for every point of a trial in one pass.
+    ----------
+    Parameters
+    kinematics_df: dataframe of the trial created by calculate_mech_energies
+    point_dict: dictionary of the points in the trial e.g. {"point1": [0, 2952], "point2": [4000, 5603]}
+    rows_of_data_to_skip: int of the number of rows skipped in the data
+    keypoint: string of the keypoint the metrics are calculated for
+    ----------
+    Returns
+    A dictionary with the distance covered, player load, negative and positive work for each point, e.g.
+    {"point1": {"Distance Covered": 40.2, "Player Load": 310.5, "Negative Work": -950.1, "Positive Work": 961.3}, ...}
+    """
+    # every metric is a sum of per-frame increments, so each point only needs a lookup in the cumulative sums
+    return TrialIndex.from_dataframe(kinematics_df, rows_of_data_to_skip, keypoint).point_metrics(point_dict)
@@ -0,0 +1,148 @@
+import os
+import numpy as np
+from full_body_kinematics import read_sto_columns
+from trial_files import find_trial_files, trial_number_of
+from sto_reader import read_sto_header
+from metrics_engine import TrialIndex
+from parallel import run_for_each_trial
+from prefetch import kinematics_files
+from signal_filter import filter_signals, filter_settings
+from config import kinematics_folder, rows_to_skip, participant_mass, data_path, n_workers
+
+
+def find_bodies(labels):
+    """ Returns the bodies (keypoints) in the labels of a BodyKinematics file that have X, Y and Z columns. """
+    bodies = []
+    for label in labels:
+        if label.endswith("_X"):
+            body = label[:-len("_X")]
+            if f"{body}_Y" in labels and f"{body}_Z" in labels:
+                bodies.append(body)
+    return bodies
+
+
+def create_multi_keypoint_arrays(kinematics_folder, trial_number, keypoints="all", rows_of_data_to_skip=rows_to_skip):
+    """ Extracts the kinematics of several keypoints of a trial into 3-D arrays.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_number: string of the trial number to extract
+    keypoints: list of strings of the keypoints to extract, or "all" for every body in the file (default is "all")
+    rows_of_data_to_skip: int of the number of rows to skip in the data
+    ----------
+    Returns
+    A dictionary of "keypoints" (list), "time" (frames) and "position", "velocity" and "acceleration" arrays (frames x keypoints x 3),
+    or None if there are no files for the trial
+    """
+    trial_files = find_trial_files(kinematics_folder, trial_number)
+    if "pos_global" not in trial_files or "vel_global" not in trial_files:
+        print(f"No files found for trial number {trial_number}. Skipping...")
+        return None
+
+    if keypoints == "all":
+        keypoints = find_bodies(read_sto_header(trial_files["pos_global"])["labels"])
+    keypoint_columns = [f"{keypoint}_{plane}" for keypoint in keypoints for plane in ["X", "Y", "Z"]]
+
+    # read every keypoint of each file at once
+    pos_data = read_sto_columns(trial_files["pos_global"], ["time"] + keypoint_columns, rows_of_data_to_skip)
+    vel_data = read_sto_columns(trial_files["vel_global"], keypoint_columns, rows_of_data_to_skip)
+    time = pos_data["time"][rows_of_data_to_skip:]
+    frames = min(len(time), len(vel_data[keypoint_columns[0]]) - rows_of_data_to_skip)
+    time = time[:frames]
+    position = np.stack([pos_data[column][rows_of_data_to_skip:][:frames] for column in keypoint_columns], axis=1).reshape(frames, len(keypoints), 3)
+    velocity = np.stack([vel_data[column][rows_of_data_to_skip:][:frames] for column in keypoint_columns], axis=1).reshape(frames, len(keypoints), 3)
+    if filter_settings() is not None:
+        # every keypoint and axis of the position and velocity is filtered in one call
+        position, velocity = filter_signals(np.stack((position, velocity)).transpose(1, 0, 2, 3), time).transpose(1, 0, 2, 3)
+
+    # acceleration is the change in velocity divided by the change in time - there is none for the first frame
+    acceleration = np.full(velocity.shape, np.nan)
+    acceleration[1:] = np.diff(velocity, axis=0) / np.diff(time)[:, None, None]
+    return {"keypoints": list(keypoints), "time": time, "position": position, "velocity": velocity, "acceleration": acceleration}
+
+
+def calculate_multi_keypoint_energies(keypoint_arrays, participant_mass=participant_mass):
+    """ Calculates the potential, kinetic and total energy of every keypoint.
+    ----------
+    Parameters
+    keypoint_arrays: dictionary created by create_multi_keypoint_arrays
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    ----------
+    Returns
+    A dictionary of "Potential Energy (J)", "Kinetic Energy (J)", "Total Energy (J)" and "Change in Total Energy (J)" arrays (frames x keypoints)
+    """
+    #potential_energy = mass * g * height (Y-axis)
+    pe = participant_mass * 9.81 * keypoint_arrays["position"][:, :, 1]
+    #kinetic_energy = 0.5 * mass * velocity^2
+    ke = 0.5 * participant_mass * (keypoint_arrays["velocity"]**2).sum(axis=-1)
+    te = pe + ke
+    delta_te = np.full(te.shape, np.nan)
+    delta_te[1:] = np.diff(te, axis=0)
+    return {"Potential Energy (J)": pe, "Kinetic Energy (J)": ke, "Total Energy (J)": te, "Change in Total Energy (J)": delta_te}
+
+
+def calculate_multi_keypoint_metrics(trial, point_dict, kinematics_folder, keypoints="all", participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Calculates distance covered, player load and external mechanical work of several keypoints for each point of a trial.
+    ----------
+    Parameters
+    trial: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_dict: dictionary of the points in the trial
+    kinematics_folder: string of the folder containing the kinematics files
+    keypoints: list of strings of the keypoints, or "all" for every body in the file (default is "all")
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    ----------
+    Returns
+    A long-format dataframe with one row for each point and keypoint
+    """
+    # only the tables of results need pandas, so it is imported once the arrays are ready
+    import pandas as pd
+    columns = ["Trial", "Point", "Keypoint", "Distance Covered (m)", "Player Load (AU)", "Negative Work (J)", "Positive Work (J)"]
+    keypoint_arrays = create_multi_keypoint_arrays(kinematics_folder, trial_number_of(trial), keypoints, rows_of_data_to_skip)
+    if keypoint_arrays is None:
+        return pd.DataFrame(columns=columns)
+    energies = calculate_multi_keypoint_energies(keypoint_arrays, participant_mass)
+
+    # the index sums every keypoint at once, so each metric of a point is an array with a value for each keypoint
+    trial_index = TrialIndex(keypoint_arrays["position"], keypoint_arrays["acceleration"], energies["Change in Total Energy (J)"], rows_of_data_to_skip)
+    point_metrics = trial_index.point_metrics(point_dict)
+    print(f"Processing data for trial number {trial[len('trial_'):]}.")
+
+    keypoint_count = len(keypoint_arrays["keypoints"])
+    tables = []
+    for point, metrics in point_metrics.items():
+        tables.append(pd.DataFrame({
+            "Trial": [trial[len("trial_"):]] * keypoint_count,
+            "Point": [point[len("point"):]] * keypoint_count,
+            "Keypoint": keypoint_arrays["keypoints"],
+            "Distance Covered (m)": metrics["Distance Covered"],
+            "Player Load (AU)": metrics["Player Load"],
+            "Negative Work (J)": metrics["Negative Work"],
+            "Positive Work (J)": metrics["Positive Work"],
+        }))
+    if not tables:
+        return pd.DataFrame(columns=columns)
+    return pd.concat(tables, ignore_index=True)
+
+
+def write_multi_keypoint_metrics(kinematics_folder, trial_dict, keypoints="all", workers=n_workers, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, data_path=data_path):
+    """ Writes the metrics of several keypoints for each point of every trial to keypoint_metrics.csv.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points in each trial
+    keypoints: list of strings of the keypoints, or "all" for every body in the files (default is "all")
+    workers: int of the number of processes used to process the trials in parallel (default is n_workers from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    data_path: folder to write the CSV file to (default is data_path from the config file)
+    ----------
+    Returns
+    A long-format dataframe of the metrics of each trial, point and keypoint
+    """
+    import pandas as pd
+    results, errors = run_for_each_trial(calculate_multi_keypoint_metrics, trial_dict, (kinematics_folder, keypoints, participant_mass, rows_of_data_to_skip), workers, prefetch=kinematics_files(kinematics_folder))
+    metrics_df = pd.concat(list(results.values()), ignore_index=True) if results else pd.DataFrame()
+    os.makedirs(data_path, exist_ok=True)
+    metrics_df.to_csv(os.path.join(data_path, "keypoint_metrics.csv"), index=False)
+    return metrics_df
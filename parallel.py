@@ -0,0 +1,60 @@
+from concurrent.futures import ProcessPoolExecutor
+from prefetch import prefetch_jobs
+from instrumentation import instrumentation_is_enabled, instrumentation_log_file, trial_context, run_instrumented, merge_instrumentation
+from config import n_workers
+
+
+def run_for_each_trial(function, trial_dict, args=(), workers=n_workers, on_result=None, prefetch=None):
+    """ Runs a function for each trial in the trial dictionary, using a pool of processes if more than one worker is used.
+    A trial that fails is reported and left out of the results, without stopping the other trials.
+    ----------
+    Parameters
+    function: function called as function(trial, point_dict, *args) - it must be defined at the top level of a module so it can be sent to the workers
+    trial_dict: dictionary of the points in each trial, created by create_point_dict
+    args: tuple of extra arguments passed to the function (default is ())
+    workers: int of the number of processes to use (default is n_workers from the config file - 1 runs the trials one after another)
+    on_result: function called as on_result(trial, result) as soon as the result of each trial is collected, e.g. to save progress (default is None)
+    prefetch: function called as prefetch(trial, point_dict) that returns the files a trial reads, so they are read in the background
+              while the trials before it are computed (default is None - only used when the trials run one after another)
+    ----------
+    Returns
+    results: dictionary of the result of each trial, in the same order as the trial dictionary
+    errors: dictionary of the error message of each trial that failed
+    """
+    results = {}
+    errors = {}
+    if workers is None or workers <= 1:
+        # the worker processes already overlap reading and computing, so the files are only read ahead here
+        jobs = prefetch_jobs(trial_dict.items(), prefetch) if prefetch is not None else trial_dict.items()
+        for trial, point_dict in jobs:
+            try:
+                with trial_context(trial):
+                    results[trial] = function(trial, point_dict, *args)
+                if on_result is not None:
+                    on_result(trial, results[trial])
+            except Exception as error:
+                errors[trial] = f"{type(error).__name__}: {error}"
+                print(f"Error processing {trial}: {errors[trial]}")
+        return results, errors
+
+    # the workers send back the stage timings they collected with each result
+    instrumented = instrumentation_is_enabled()
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        if instrumented:
+            futures = {trial: executor.submit(run_instrumented, function, instrumentation_log_file(), trial, point_dict, *args) for trial, point_dict in trial_dict.items()}
+        else:
+            futures = {trial: executor.submit(function, trial, point_dict, *args) for trial, point_dict in trial_dict.items()}
+        # collect the results in the order of the trial dictionary, whatever order the trials finish in
+        for trial, future in futures.items():
+            try:
+                if instrumented:
+                    results[trial], summary = future.result()
+                    merge_instrumentation(summary)
+                else:
+                    results[trial] = future.result()
+                if on_result is not None:
+                    on_result(trial, results[trial])
+            except Exception as error:
+                errors[trial] = f"{type(error).__name__}: {error}"
+                print(f"Error processing {trial}: {errors[trial]}")
+    return results, errors
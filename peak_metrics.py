@@ -0,0 +1,95 @@
+import numpy as np
+from full_body_kinematics import create_trial_kinematics
+from metrics_engine import load_trial_index, calculate_metric_windows
+from parallel import run_for_each_trial
+from prefetch import kinematics_files
+from trial_files import trial_number_of
+from config import keypoint, rows_to_skip, participant_mass, n_workers, peak_window_lengths
+
+# The metrics peaks are calculated for, and the ranges of frames (from calculate_metric_windows) their increments are summed over
+peak_metrics = {"Distance Covered": "Distance Covered", "Player Load": "Player Load", "Positive Work": "Work"}
+
+
+def rolling_window_peak(cumulative, first, last, window_frames):
+    """ Finds the largest sum of the increments in any window of consecutive frames within a range, using the cumulative sums.
+    ----------
+    Parameters
+    cumulative: numpy array of the cumulative sums of a metric's increments (frames + 1, or frames + 1 x keypoints)
+    first: int of the first frame of the range
+    last: int of the frame after the end of the range
+    window_frames: int of the number of frames in the window
+    ----------
+    Returns
+    The largest sum in any window (the sum of the whole range if it is shorter than the window)
+    """
+    if last - first <= window_frames:
+        return cumulative[last] - cumulative[first]
+    # the sum of every window in the range at once - one subtraction for each window position
+    window_sums = cumulative[first + window_frames:last + 1] - cumulative[first:last + 1 - window_frames]
+    return window_sums.max(axis=0)
+
+
+def calculate_peak_metrics(trial_index, frame_duration, point_dict, window_lengths=peak_window_lengths):
+    """ Calculates the peak distance covered, player load and positive work over windows of several lengths for each point of a trial.
+    ----------
+    Parameters
+    trial_index: TrialIndex of the trial
+    frame_duration: float of the time between frames in seconds
+    point_dict: dictionary of the points in the trial e.g. {"point1": [0, 2952], "point2": [4000, 5603]} - [start, None] is the whole trial
+    window_lengths: list of the window lengths in seconds (default is peak_window_lengths from the config file)
+    ----------
+    Returns
+    A dictionary of the peak of each metric for each window length for each point, e.g. {"point1": {"Distance Covered": {1: 4.1, 5: 16.3}, ...}}
+    """
+    point_peaks = {}
+    for point, frames in point_dict.items():
+        windows = calculate_metric_windows(frames, trial_index.total_frames, trial_index.rows_of_data_to_skip)
+        point_peaks[point] = {}
+        for metric, window_name in peak_metrics.items():
+            cumulative = trial_index.cumulative[metric]
+            # a window does not span a slice that is left out of the point
+            ranges = [(max(first, 0), min(last, trial_index.total_frames)) for first, last in windows[window_name]]
+            ranges = [(first, last) for first, last in ranges if last > first]
+            point_peaks[point][metric] = {}
+            for seconds in window_lengths:
+                window_frames = max(int(round(seconds / frame_duration)), 1)
+                peaks = [rolling_window_peak(cumulative, first, last, window_frames) for first, last in ranges]
+                point_peaks[point][metric][seconds] = np.max(peaks, axis=0) if peaks else 0
+    return point_peaks
+
+
+def calculate_trial_peak_metrics(trial, point_dict, kinematics_folder, window_lengths=peak_window_lengths, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Calculates the peak metrics of each point of a trial in the trial dictionary, and of the whole trial.
+    ----------
+    Parameters
+    trial: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_dict: dictionary of the points in the trial
+    kinematics_folder: string of the folder containing the kinematics files
+    window_lengths: list of the window lengths in seconds (default is peak_window_lengths from the config file)
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    ----------
+    Returns
+    A dictionary of the peak metrics of each point (see calculate_peak_metrics), with the whole trial under "trial", or an empty dictionary if there is no data
+    """
+    trial_number = trial_number_of(trial)
+    trial_index = load_trial_index(kinematics_folder, trial_number, keypoint, participant_mass, rows_of_data_to_skip)
+    if trial_index is None:
+        print(f"No data for Trial Number {trial[len('trial_'):]}. Skipping...")
+        return {}
+    # the window lengths are converted to frames using the typical time between frames
+    time = create_trial_kinematics(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip).time
+    frame_duration = float(np.median(np.diff(time)))
+    print(f"Processing peak metrics for trial number {trial[len('trial_'):]}.")
+    return calculate_peak_metrics(trial_index, frame_duration, {**point_dict, "trial": [0, None]}, window_lengths)
+
+
+def extract_peak_metrics_for_each_point(kinematics_folder, trial_dict, window_lengths=peak_window_lengths, workers=n_workers, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip):
+    """ Calculates the peak metrics of every point of every trial, using a pool of processes if more than one worker is used.
+    Trials that fail are reported and left out.
+    """
+    peak_metrics_dict, errors = run_for_each_trial(calculate_trial_peak_metrics, trial_dict, (kinematics_folder, window_lengths, keypoint, participant_mass, rows_of_data_to_skip), workers, prefetch=kinematics_files(kinematics_folder, keypoint, rows_of_data_to_skip))
+    if errors:
+        print(f"{len(errors)} trials could not be processed and are left out of the peak metrics: {', '.join(errors)}")
+    return peak_metrics_dict
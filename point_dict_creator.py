@@ -1,11 +1,102 @@
 import os
-import pandas as pd
-import numpy as np
-import xml.etree.ElementTree as ET
-import matplotlib.pyplot as plt
-import csv
 from config import csv_file, sheet_name
 
+# Points of each sheet that has been read - {(path, sheet_name): {"mtime_ns": ..., "size": ..., "table": ...}}
+_point_tables = {}
+
+
+def read_point_sheet(csv_file, sheet_name=None):
+    """ Reads the sheet of points into one dataframe of the points of every trial, using vectorised operations instead of a loop over the rows.
+    ----------
+    Parameters
+    csv_file: path to the CSV file (or Excel workbook) containing the points of interest
+    sheet_name: name of the sheet if in an Excel Workbook (default is None - a CSV file)
+    ----------
+    Returns
+    A dataframe with "Trial" (int), "Point" (string), "Point Start Frame" and "Point End Frame" columns and a row for each point,
+    in the order of the sheet. A point listed twice keeps its first place and its last frames.
+    """
+    # pandas is imported when a sheet is read, so importing this module stays quick
+    import pandas as pd
+    if sheet_name:
+        df = pd.read_excel(csv_file, sheet_name=sheet_name)
+    else:
+        df = pd.read_csv(csv_file)
+
+    #if a value is null, it will be filled in with the value from the previous row (suitable only for filling in trial numbers!)
+    df = df.ffill()
+    # rows before the first trial and repeated header rows are left out
+    df = df[df["Trial"].notna() & (df["Trial"].astype(str) != "Trial")]
+
+    # the points end at the first row whose trial is not a whole number (i.e. you have reached the end of the trials)
+    trial_numbers = pd.to_numeric(df["Trial"], errors="coerce")
+    not_trial = (trial_numbers.isna() | (trial_numbers % 1 != 0)).to_numpy()
+    if not_trial.any():
+        df = df.iloc[:not_trial.argmax()]
+        trial_numbers = trial_numbers.iloc[:not_trial.argmax()]
+
+    # the points keep the form pandas reads them in - a point column with empty cells is read as floats, so its points are "1.0", "2.0", ...
+    points = df["Point"].astype(str)
+
+    point_table = pd.DataFrame({
+        "Trial": trial_numbers.astype("int64").to_numpy(),
+        "Point": points.to_numpy(),
+        "Point Start Frame": df["Point Start Frame"].to_numpy(),
+        "Point End Frame": df["Point End Frame"].to_numpy(),
+    })
+    # groups are in the order they first appear, so a repeated point keeps its place but takes the frames of its last row
+    return point_table.groupby(["Trial", "Point"], sort=False).last().reset_index()
+
+
+def load_point_table(csv_file, sheet_name=None):
+    """ Returns the start and end frames of the points in each trial as arrays, ready to evaluate every point of a trial at once.
+    The sheet is only read again if the file has changed since it was last read.
+    ----------
+    Parameters
+    csv_file: path to the CSV file (or Excel workbook) containing the points of interest
+    sheet_name: name of the sheet if in an Excel Workbook (default is None - a CSV file)
+    ----------
+    Returns
+    A dictionary of the points of each trial number, in the order of the sheet, e.g.
+    {1: {"points": array(["1", "2"]), "start": array([0, 4000]), "end": array([2952, 5603])}, 2: ...}
+    The arrays are shared between callers, so they can't be changed.
+    """
+    key = (os.path.abspath(csv_file), sheet_name)
+    stat = os.stat(csv_file)
+    cached = _point_tables.get(key)
+    if cached is not None and (cached["mtime_ns"], cached["size"]) == (stat.st_mtime_ns, stat.st_size):
+        return cached["table"]
+
+    point_sheet = read_point_sheet(csv_file, sheet_name)
+    table = {}
+    for trial_number, trial_points in point_sheet.groupby("Trial", sort=False):
+        arrays = {
+            "points": trial_points["Point"].to_numpy(dtype=str),
+            "start": trial_points["Point Start Frame"].to_numpy(),
+            "end": trial_points["Point End Frame"].to_numpy(),
+        }
+        for array in arrays.values():
+            array.flags.writeable = False
+        table[int(trial_number)] = arrays
+    _point_tables[key] = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size, "table": table}
+    return table
+
+
+def clear_point_tables():
+    """ Removes every sheet from memory, so each one is read again the next time it is used (e.g. to time the loader). """
+    _point_tables.clear()
+
+
+def point_dict_from_table(point_table):
+    """ Converts the arrays returned by load_point_table to the dictionary format of create_point_dict. """
+    trial_dict = {}
+    for trial_number, arrays in point_table.items():
+        # the trial number needs to be in the format 01, 02, 03, etc.
+        trial_dict[f"trial_{trial_number:02d}"] = {
+            f"point{point}": [start, end] for point, start, end in zip(arrays["points"], arrays["start"], arrays["end"])
+        }
+    return trial_dict
+
 
 def create_point_dict(csv_file, sheet_name=None):
     """ Creates a dictionary that contains the frame numbers for the points in each trial.
@@ -32,50 +123,7 @@ def create_point_dict(csv_file, sheet_name=None):
         ...
     }
     """ 
-    # Read csv file  
-    if sheet_name:
-        df = pd.read_excel(csv_file, sheet_name=sheet_name)
-    else:
-        df = pd.read_csv(csv_file)
-    # Create empty dictionary to store trials and points
-    trial_dict = {}
-
-    #if a value is null, it will be filled in with the value from the previous row (suitable only for filling in trial numbers!)
-    df.ffill(inplace=True)
-
-    # Iterate over the rows of the DataFrame
-    for _, row in df.iterrows():
-        if pd.isnull(row["Trial"]) or row["Trial"] == "Trial":
-            continue
-        trial_num = int(row["Trial"])
-        # the trial number needs to be in the format 01, 02, 03, etc.
-        if trial_num < 10:
-            trial_num = f"0{trial_num}"
-
-        # Extract trial number, point number, start frame, and end frame from each row
-        trial_num = f"trial_{trial_num}"
-        point_num = f"point{row['Point']}"
-        start_frame = row['Point Start Frame']
-        end_frame = row['Point End Frame']
-
-        # Create a list with start and end frames
-        frame_pair = [start_frame, end_frame]
-
-        # Stop the loop if the trial number is not a number (i.e. you have reached the end of the trials)
-        if not str(row['Trial']).isdigit():
-            break        
-        # Check if the trial number is already in the result dictionary
-        if trial_num not in trial_dict:
-            # If not, add the trial number as a key with an empty dictionary as its value
-            trial_dict[trial_num] = {}
-
-        # Add the point number and its corresponding frame pair to the trial
-        trial_dict[trial_num][point_num] = frame_pair
-        
-        # Update last_trial_num and last_end_frame for the next iteration
-        last_trial_num = trial_num
-        last_end_frame = end_frame
-    return trial_dict
+    return point_dict_from_table(load_point_table(csv_file, sheet_name))
 
 # to check a dictionary is correct you can use:
 #print(create_point_dict(csv_file, sheet_name))
@@ -0,0 +1,122 @@
+import io
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from trial_files import find_trial_files, trial_number_of
+from trial_cache import trial_cache_key, is_trial_cached
+from signal_filter import filter_settings
+from config import prefetch_depth, use_sto_cache, rows_to_skip
+
+
+# Files read ahead by prefetch_jobs that have not been opened yet - the path maps to a future of its (size, mtime, bytes)
+_prefetched = {}
+_lock = threading.Lock()
+
+
+def _read_file(filename):
+    # the size and modification time are taken before reading, so a file changed while it is read is never used
+    stat = os.stat(filename)
+    with open(filename, "rb") as file:
+        return stat.st_size, stat.st_mtime_ns, file.read()
+
+
+def open_prefetched(filename, mode="r"):
+    """ Opens a file, using the bytes read ahead by prefetch_jobs if there are any, so the caller does not wait for the disk.
+    The prefetched bytes are only used once and only if the file has not changed since they were read.
+    ----------
+    Parameters
+    filename: string of the path to the file
+    mode: "r" to read text or "rb" to read bytes (default is "r")
+    ----------
+    Returns
+    A file object opened for reading, as returned by open
+    """
+    with _lock:
+        future = _prefetched.pop(os.path.abspath(filename), None)
+    if future is not None:
+        try:
+            size, mtime_ns, data = future.result()
+            stat = os.stat(filename)
+            if (stat.st_size, stat.st_mtime_ns) == (size, mtime_ns):
+                return io.BytesIO(data) if "b" in mode else io.TextIOWrapper(io.BytesIO(data))
+        except OSError:
+            # the file is opened normally below, which reports the error if there still is one
+            pass
+    return open(filename, mode)
+
+
+def prefetch_jobs(jobs, files_of_job, depth=prefetch_depth):
+    """ Yields each job, while threads read the files of the next jobs so the disk (or network storage) is busy while a job is computed.
+    At most depth jobs ahead of the current one are read, so memory stays bounded, and bytes a job did not open are dropped when it ends.
+    ----------
+    Parameters
+    jobs: iterable of (key, value) pairs, e.g. trial_dict.items()
+    files_of_job: function called as files_of_job(key, value) that returns a list of the paths of the files the job reads
+    depth: int of the number of jobs to read ahead (default is prefetch_depth from the config file - 0 reads nothing ahead)
+    ----------
+    Yields
+    The (key, value) pairs of the jobs, in order
+    """
+    if depth <= 0:
+        yield from jobs
+        return
+    jobs = list(jobs)
+    job_files = [None] * len(jobs)
+
+    def submit(executor, i):
+        try:
+            job_files[i] = [os.path.abspath(filename) for filename in files_of_job(*jobs[i])]
+        except Exception:
+            # a job whose files can't be found reports the error itself when it runs
+            job_files[i] = []
+        with _lock:
+            for filename in job_files[i]:
+                if filename not in _prefetched:
+                    _prefetched[filename] = executor.submit(_read_file, filename)
+
+    with ThreadPoolExecutor(max_workers=depth) as executor:
+        submitted = 0
+        try:
+            for i, job in enumerate(jobs):
+                # read the files of this job and the next depth jobs
+                while submitted < min(i + depth + 1, len(jobs)):
+                    submit(executor, submitted)
+                    submitted += 1
+                yield job
+                _drop(job_files[i])
+        finally:
+            # drop everything read ahead if the loop stops early
+            for i in range(submitted):
+                _drop(job_files[i])
+            executor.shutdown(wait=True, cancel_futures=True)
+
+
+def _drop(filenames):
+    with _lock:
+        for filename in filenames:
+            _prefetched.pop(filename, None)
+
+
+def kinematics_files(kinematics_folder, keypoint=None, rows_of_data_to_skip=rows_to_skip):
+    """ Returns a function giving the pos_global and vel_global files of a trial, to use as the files_of_job of prefetch_jobs.
+    Nothing is read ahead when the binary .sto cache is on, as the cached columns are read instead of the .sto files.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    keypoint: string of the keypoint the trials are parsed for, so trials already in the trial cache are not read ahead (default is None - every trial is read ahead)
+    rows_of_data_to_skip: int of the number of rows skipped in the data (default is rows_to_skip from the config file)
+    ----------
+    Returns
+    A function called as files_of_job(trial, point_dict) that returns a list of the paths of the files to read ahead
+    """
+    def trial_files(trial, point_dict):
+        if use_sto_cache:
+            return []
+        trial_number = trial_number_of(trial)
+        files = find_trial_files(kinematics_folder, trial_number)
+        filelist = [files[file_type] for file_type in ["pos_global", "vel_global"] if file_type in files]
+        # a trial that has already been parsed is taken from the trial cache, so its files would not be opened
+        if keypoint is not None and filelist and is_trial_cached(trial_cache_key(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, ["X", "Y", "Z"], filelist, filter_settings())):
+            return []
+        return filelist
+    return trial_files
@@ -0,0 +1,174 @@
+import os
+import json
+from trial_files import find_trial_files, trial_number_of
+from sto_cache import source_signature
+from streaming import select_trial_metrics_function, stream_trial_metrics
+from peak_metrics import calculate_trial_peak_metrics, peak_metrics
+from parallel import run_for_each_trial
+from prefetch import kinematics_files
+from signal_filter import filter_settings
+from config import keypoint, rows_to_skip, participant_mass, data_path, n_workers, peak_window_lengths, use_streaming
+
+# Name of the file in the results folder that records the inputs and results of every point
+results_manifest_name = ".results_manifest.json"
+
+
+def load_results_manifest(data_path):
+    """ Returns the results manifest of a results folder, or an empty manifest if there is none. """
+    try:
+        with open(os.path.join(data_path, results_manifest_name), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {"settings": None, "trials": {}}
+
+
+def write_results_manifest(data_path, manifest):
+    """ Writes the results manifest, replacing the old one in one step so a crash never leaves half a manifest. """
+    os.makedirs(data_path, exist_ok=True)
+    temp_file = os.path.join(data_path, results_manifest_name + ".tmp")
+    with open(temp_file, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temp_file, os.path.join(data_path, results_manifest_name))
+
+
+def trial_signature(kinematics_folder, trial_number, verify_hash=False):
+    """ Returns the modification time, size and (optionally) hash of each .sto file of a trial. """
+    trial_files = find_trial_files(kinematics_folder, trial_number)
+    return {file_type: source_signature(trial_files[file_type], verify_hash) for file_type in sorted(trial_files) if file_type.endswith("_global")}
+
+
+def point_frames(frames):
+    """ Returns the frames of a point in a form that can be stored in and compared with the manifest. """
+    return [None if frame is None else float(frame) for frame in frames]
+
+
+def _load_manifest(data_path, kinematics_folder, trial_dict, keypoint, participant_mass, rows_of_data_to_skip):
+    """ Loads the manifest of a results folder, starting a new one if any of the settings the results depend on have changed. """
+    manifest = load_results_manifest(data_path)
+    # every result depends on these settings, so changing any of them recalculates everything
+    settings = {"kinematics_folder": os.path.abspath(kinematics_folder), "keypoint": keypoint, "participant_mass": participant_mass, "rows_to_skip": rows_of_data_to_skip}
+    if filter_settings() is not None:
+        settings["filter"] = filter_settings()
+    if manifest["settings"] != settings:
+        manifest = {"settings": settings, "trials": {}}
+    # trials that are no longer in the trial dictionary are dropped
+    manifest["trials"] = {trial: entry for trial, entry in manifest["trials"].items() if trial in trial_dict}
+    return manifest
+
+
+def _find_changed_points(manifest, section, kinematics_folder, trial_dict, verify_hash):
+    """ Returns the points of each trial that are not in a section ("points" or "peaks") of the manifest with the same files and frames.
+    The results of a trial whose files have changed are removed from every section, so they are recalculated by the next call too.
+    """
+    jobs = {}
+    for trial, point_dict in trial_dict.items():
+        signature = trial_signature(kinematics_folder, trial_number_of(trial), verify_hash)
+        entry = manifest["trials"].get(trial)
+        if entry is None or entry["files"] != signature:
+            # the trial's files have changed, so none of its old results can be used
+            entry = manifest["trials"][trial] = {"files": signature}
+        results = entry.get(section, {})
+        changed_points = {point: frames for point, frames in point_dict.items()
+                          if point not in results or results[point]["frames"] != point_frames(frames)}
+        if changed_points:
+            jobs[trial] = changed_points
+        # points that are no longer in the trial are dropped
+        entry[section] = {point: result for point, result in results.items() if point in point_dict and point not in changed_points}
+    return jobs
+
+
+def extract_metrics_incrementally(kinematics_folder, trial_dict, data_path=data_path, workers=n_workers, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, verify_hash=False, streaming=use_streaming):
+    """ Extracts every metric for each point, only recalculating the points whose .sto files or frames have changed since the last run.
+    The results of each trial are saved to a manifest in the results folder as soon as they are calculated, so an interrupted run carries on where it stopped.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points to extract the metrics from
+    data_path: folder the results and their manifest are written to (default is data_path from the config file)
+    workers: int of the number of processes used to process the trials in parallel (default is n_workers from the config file)
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    verify_hash: bool of whether to also compare the SHA-1 hash of the .sto files, not only their modification times and sizes (default is False)
+    streaming: bool of whether to read the .sto files of the changed trials in chunks instead of all at once (default is use_streaming from the config file)
+    ----------
+    Returns
+    A dictionary of the distance covered, player load, negative and positive work for each point, in the same format as extract_metrics_for_each_point
+    """
+    manifest = _load_manifest(data_path, kinematics_folder, trial_dict, keypoint, participant_mass, rows_of_data_to_skip)
+    # find the points that have to be recalculated
+    jobs = _find_changed_points(manifest, "points", kinematics_folder, trial_dict, verify_hash)
+    print(f"{sum(len(points) for points in jobs.values())} of {sum(len(points) for points in trial_dict.values())} points need to be calculated.")
+
+    def save_trial(trial, point_metrics):
+        # store the new results and save the manifest straight away, so finished trials are kept if the run stops
+        for point, metrics in point_metrics.items():
+            manifest["trials"][trial]["points"][point] = {"frames": point_frames(jobs[trial][point]), "metrics": {metric: float(value) for metric, value in metrics.items()}}
+        write_results_manifest(data_path, manifest)
+
+    write_results_manifest(data_path, manifest)
+    trial_metrics_function = select_trial_metrics_function(streaming)
+    # streaming keeps memory constant, so the whole files of the next trials are not read ahead
+    prefetch = None if trial_metrics_function is stream_trial_metrics else kinematics_files(kinematics_folder, keypoint, rows_of_data_to_skip)
+    results, errors = run_for_each_trial(trial_metrics_function, jobs, (kinematics_folder, keypoint, participant_mass, rows_of_data_to_skip), workers, on_result=save_trial, prefetch=prefetch)
+
+    # merge the new results with the unchanged ones, in the order of the trial dictionary
+    metrics_dict = {}
+    for trial, point_dict in trial_dict.items():
+        if trial in errors:
+            continue
+        points = manifest["trials"][trial]["points"]
+        metrics_dict[trial] = {point: points[point]["metrics"] for point in point_dict if point in points}
+    return metrics_dict
+
+
+def extract_peak_metrics_incrementally(kinematics_folder, trial_dict, data_path=data_path, window_lengths=peak_window_lengths, workers=n_workers, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, verify_hash=False):
+    """ Extracts the peak metrics of each point and each whole trial, only recalculating the points whose .sto files or frames have changed since the last run.
+    The peaks are kept in the same manifest as the metrics, so a run where nothing has changed does not read any .sto files.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points to extract the peak metrics from
+    data_path: folder the results and their manifest are written to (default is data_path from the config file)
+    window_lengths: list of the window lengths in seconds (default is peak_window_lengths from the config file)
+    workers: int of the number of processes used to process the trials in parallel (default is n_workers from the config file)
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    verify_hash: bool of whether to also compare the SHA-1 hash of the .sto files, not only their modification times and sizes (default is False)
+    ----------
+    Returns
+    A dictionary of the peak metrics of each point, in the same format as extract_peak_metrics_for_each_point
+    """
+    manifest = _load_manifest(data_path, kinematics_folder, trial_dict, keypoint, participant_mass, rows_of_data_to_skip)
+    window_lengths = list(window_lengths)
+    if manifest.get("peak_window_lengths") != window_lengths:
+        # every peak depends on the window lengths
+        for entry in manifest["trials"].values():
+            entry.pop("peaks", None)
+        manifest["peak_window_lengths"] = window_lengths
+    # the whole trial is the point "trial", recalculated when the trial's files change
+    peak_trial_dict = {trial: {**point_dict, "trial": [0, None]} for trial, point_dict in trial_dict.items()}
+    jobs = _find_changed_points(manifest, "peaks", kinematics_folder, peak_trial_dict, verify_hash)
+    print(f"The peak metrics of {sum(len(points) for points in jobs.values())} of {sum(len(points) for points in peak_trial_dict.values())} points need to be calculated.")
+
+    def save_trial(trial, point_peaks):
+        # the peaks of each window length are stored as a list in the order of the window lengths, as JSON keys can only be strings
+        for point, peaks in point_peaks.items():
+            manifest["trials"][trial]["peaks"][point] = {"frames": point_frames(peak_trial_dict[trial][point]),
+                                                         "peaks": {metric: [float(peaks[metric][seconds]) for seconds in window_lengths] for metric in peak_metrics}}
+        write_results_manifest(data_path, manifest)
+
+    write_results_manifest(data_path, manifest)
+    # calculate_trial_peak_metrics adds the whole trial itself
+    jobs = {trial: {point: frames for point, frames in points.items() if point != "trial"} for trial, points in jobs.items()}
+    results, errors = run_for_each_trial(calculate_trial_peak_metrics, jobs, (kinematics_folder, window_lengths, keypoint, participant_mass, rows_of_data_to_skip), workers, on_result=save_trial, prefetch=kinematics_files(kinematics_folder, keypoint, rows_of_data_to_skip))
+
+    peak_metrics_dict = {}
+    for trial, point_dict in peak_trial_dict.items():
+        if trial in errors:
+            continue
+        points = manifest["trials"][trial]["peaks"]
+        peak_metrics_dict[trial] = {point: {metric: dict(zip(window_lengths, points[point]["peaks"][metric])) for metric in peak_metrics}
+                                    for point in point_dict if point in points}
+    return peak_metrics_dict
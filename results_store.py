@@ -0,0 +1,181 @@
+import os
+import time
+import numpy as np
+from trial_files import trial_number_of
+from config import results_store_dir, results_store_format
+
+# Columns of the results table - one row for each point of each trial of each participant
+results_columns = ["Participant", "Keypoint", "Trial", "Point", "Distance Covered (m)", "Player Load (AU)", "Negative Work (J)", "Positive Work (J)"]
+# Columns that identify a point - a point appended to the store again replaces the old row
+key_columns = ["Participant", "Keypoint", "Trial", "Point"]
+# Column of each metric in the dictionaries returned by extract_metrics_for_each_point
+metric_columns = {"Distance Covered": "Distance Covered (m)", "Player Load": "Player Load (AU)", "Negative Work": "Negative Work (J)", "Positive Work": "Positive Work (J)"}
+store_formats = [".parquet", ".feather", ".npz"]
+# Columns stored as text - the trial is stored as its whole number, so trial 101 is not confused with trial 1
+text_columns = ["Participant", "Keypoint", "Point"]
+
+
+def metrics_table(metrics_dict, participant, keypoint):
+    """ Converts the metrics of each point to a results table, building each column in one go.
+    ----------
+    Parameters
+    metrics_dict: dictionary of the distance covered, player load, negative and positive work for each point of each trial
+    participant: string of the participant, e.g. "P01"
+    keypoint: string of the keypoint the metrics were calculated for
+    ----------
+    Returns
+    A dataframe with the results_columns and a row for each point
+    """
+    # pandas is imported when the store is used rather than by every module that writes to it
+    import pandas as pd
+    points = [(trial, point, metrics) for trial, point_dict in metrics_dict.items() for point, metrics in point_dict.items()]
+    columns = {
+        "Participant": [str(participant)] * len(points),
+        "Keypoint": [keypoint] * len(points),
+        "Trial": np.array([trial_number_of(trial) for trial, _, _ in points], dtype=int),
+        # the whole number is kept, so point10 is "10" rather than "0"
+        "Point": [point[len("point"):] for _, point, _ in points],
+    }
+    for metric, column in metric_columns.items():
+        columns[column] = np.array([metrics[metric] for _, _, metrics in points], dtype=float)
+    return pd.DataFrame(columns, columns=results_columns)
+
+
+def _check_store_format(store_format):
+    if store_format not in store_formats:
+        raise ValueError(f"{store_format} is not a results store format - the options are {', '.join(store_formats)}.")
+    return store_format
+
+
+def _part_format(part_file):
+    return _check_store_format(os.path.splitext(part_file)[1].lower())
+
+
+def _store_parts(store_dir):
+    """ Returns the files of a results store in the order they were written - a store written before it was split into parts is one file.
+    Parts of every format are returned, so changing results_store_format keeps the results written before.
+    """
+    if os.path.isfile(store_dir):
+        return [store_dir]
+    if not os.path.isdir(store_dir):
+        return []
+    return [os.path.join(store_dir, name) for name in sorted(os.listdir(store_dir))
+            if name.startswith("part-") and os.path.splitext(name)[1].lower() in store_formats]
+
+
+def _read_part(part_file):
+    import pandas as pd
+    extension = _part_format(part_file)
+    if extension == ".parquet":
+        # Parquet and Feather need pyarrow, which pandas only imports when they are used
+        return pd.read_parquet(part_file)
+    if extension == ".feather":
+        return pd.read_feather(part_file)
+    with np.load(part_file, allow_pickle=False) as store:
+        columns = store["columns"].tolist()
+        return pd.DataFrame({column: store[column] for column in columns}, columns=columns)
+
+
+def _write_part(table, store_dir, extension):
+    """ Writes a table as a new part of the store, replacing a temporary file in one step so a crash never leaves half a part. """
+    os.makedirs(store_dir, exist_ok=True)
+    # the parts sort in the order they were written, so later rows replace earlier ones when the store is read
+    part_file = os.path.join(store_dir, f"part-{time.time_ns():020d}-{os.getpid()}{extension}")
+    temp_file = part_file + ".tmp"
+    if extension == ".parquet":
+        table.to_parquet(temp_file, index=False)
+    elif extension == ".feather":
+        table.to_feather(temp_file)
+    else:
+        # one array for each column - text columns are stored as fixed width strings so the file loads without pickle
+        columns = {column: table[column].to_numpy(dtype=str if column in text_columns else int if column == "Trial" else float) for column in results_columns}
+        with open(temp_file, "wb") as file:
+            np.savez(file, columns=np.array(results_columns), **columns)
+    os.replace(temp_file, part_file)
+    return part_file
+
+
+def read_results_store(store_dir=results_store_dir):
+    """ Reads the results table of every participant in a results store.
+    ----------
+    Parameters
+    store_dir: path to the results store - a folder of the parts written by each run (default is results_store_dir from the config file)
+    ----------
+    Returns
+    A dataframe with the results_columns (empty if the store has not been written yet).
+    A point written by more than one run has the row of the latest run.
+    """
+    import pandas as pd
+    parts = [_read_part(part_file) for part_file in _store_parts(store_dir)]
+    if not parts:
+        return pd.DataFrame(columns=results_columns)
+    table = pd.concat(parts, ignore_index=True) if len(parts) > 1 else parts[0]
+    # stores written before trials were stored as numbers have trials such as "01"
+    table["Trial"] = table["Trial"].astype(int)
+    return table.drop_duplicates(key_columns, keep="last").reset_index(drop=True)[results_columns]
+
+
+def write_results_store(table, store_dir=results_store_dir, store_format=results_store_format, append=True):
+    """ Writes a results table to a results store as a new part, so a run only writes its own rows however large the store has grown.
+    ----------
+    Parameters
+    table: dataframe with the results_columns, e.g. created by metrics_table
+    store_dir: path to the folder of the results store (default is results_store_dir from the config file)
+    store_format: format of the new part - ".parquet", ".feather" or ".npz" (default is results_store_format from the config file)
+    append: bool of whether to keep the rows already in the store - rows of the same participant, keypoint, trial and point are replaced (default is True)
+    ----------
+    Returns
+    The dataframe of the rows written
+    """
+    _check_store_format(store_format)
+    old_parts = _store_parts(store_dir)
+    if os.path.isfile(store_dir):
+        # a store written as one file becomes the first part of the folder
+        temp_file = store_dir + ".tmp"
+        os.replace(store_dir, temp_file)
+        os.makedirs(store_dir)
+        os.replace(temp_file, os.path.join(store_dir, f"part-{0:020d}-0{_part_format(store_dir)}"))
+        old_parts = _store_parts(store_dir)
+    table = table.drop_duplicates(key_columns, keep="last")[results_columns]
+    _write_part(table, store_dir, store_format)
+    if not append:
+        # the old parts are removed after the new part is written, so the store is never empty
+        for part_file in old_parts:
+            os.remove(part_file)
+    return table
+
+
+def compact_results_store(store_dir=results_store_dir, store_format=results_store_format):
+    """ Rewrites a results store as one part, dropping the rows replaced by later runs, so it reads quickly after many runs.
+    ----------
+    Parameters
+    store_dir: path to the folder of the results store (default is results_store_dir from the config file)
+    store_format: format of the part written (default is results_store_format from the config file)
+    ----------
+    Returns
+    The dataframe of every row in the store
+    """
+    return write_results_store(read_results_store(store_dir), store_dir, store_format, append=False)
+
+
+def append_metrics(metrics_dict, participant, keypoint, store_dir=results_store_dir, store_format=results_store_format):
+    """ Adds the metrics of each point of a participant to the results store, replacing any earlier results of the same points. """
+    return write_results_store(metrics_table(metrics_dict, participant, keypoint), store_dir, store_format)
+
+
+def export_results_csv(csv_file, store_dir=results_store_dir, participants=None):
+    """ Writes the results store (or the rows of some participants) to a CSV file.
+    ----------
+    Parameters
+    csv_file: path to the CSV file to write
+    store_dir: path to the folder of the results store (default is results_store_dir from the config file)
+    participants: list of the participants to export (default is None - every participant)
+    ----------
+    Returns
+    The dataframe that was written
+    """
+    table = read_results_store(store_dir)
+    if participants is not None:
+        table = table[table["Participant"].isin([str(participant) for participant in participants])]
+    table.to_csv(csv_file, index=False)
+    return table
@@ -0,0 +1,78 @@
+from functools import lru_cache
+import numpy as np
+from config import filter_type, filter_cutoff, filter_order, savgol_window, savgol_polyorder
+
+filter_types = [None, "butterworth", "savgol"]
+
+
+def filter_settings(filter_type=filter_type, cutoff=filter_cutoff, order=filter_order, window=savgol_window, polyorder=savgol_polyorder):
+    """ Returns the settings of the filter, to store with results that depend on it (None if filtering is off). """
+    if filter_type is None:
+        return None
+    if filter_type == "butterworth":
+        return {"filter_type": filter_type, "cutoff": cutoff, "order": order}
+    return {"filter_type": filter_type, "window": window, "polyorder": polyorder}
+
+
+@lru_cache(maxsize=None)
+def butterworth_coefficients(sample_rate, cutoff, order):
+    """ Returns the second-order sections of a low-pass Butterworth filter, calculated once for each sample rate. """
+    # SciPy is only needed when filtering is turned on, so it is imported when it is used
+    from scipy.signal import butter
+    return butter(order, cutoff, btype="low", fs=sample_rate, output="sos")
+
+
+@lru_cache(maxsize=None)
+def savgol_coefficients(window_frames, polyorder):
+    """ Returns the convolution coefficients of a Savitzky-Golay filter, calculated once for each window length. """
+    from scipy.signal import savgol_coeffs
+    return savgol_coeffs(window_frames, polyorder)
+
+
+def filter_signals(signals, time, filter_type=filter_type, cutoff=filter_cutoff, order=filter_order, window=savgol_window, polyorder=savgol_polyorder):
+    """ Filters every column of a trial in one call, with a zero-phase low-pass Butterworth filter or a Savitzky-Golay filter.
+    ----------
+    Parameters
+    signals: numpy array of the signals (frames x columns, or frames x any other dimensions) - every column is filtered along the frames
+    time: numpy array of the time of each frame, used for the sample rate
+    filter_type: None, "butterworth" or "savgol" (default is filter_type from the config file - None returns the signals unchanged)
+    cutoff: float of the cutoff frequency of the Butterworth filter in Hz (default is filter_cutoff from the config file)
+    order: int of the order of the Butterworth filter (default is filter_order from the config file)
+    window: float of the length of the Savitzky-Golay window in seconds (default is savgol_window from the config file)
+    polyorder: int of the order of the Savitzky-Golay polynomial (default is savgol_polyorder from the config file)
+    ----------
+    Returns
+    numpy array of the filtered signals, the same shape as the signals.
+    Signals with missing values, or too few frames for the filter, are returned unchanged.
+    """
+    if filter_type is None:
+        return signals
+    if filter_type not in filter_types:
+        raise ValueError(f"Unknown filter type {filter_type}. Options are: {filter_types}")
+    if len(time) < 2:
+        return signals
+    # rounded so small differences in the frame times give the same cached coefficients
+    sample_rate = round(1 / np.median(np.diff(time)), 6)
+    if filter_type == "butterworth":
+        coefficients = butterworth_coefficients(sample_rate, cutoff, order)
+        # the signals are padded at each end before filtering forwards and backwards
+        frames_needed = 3 * (2 * len(coefficients) + 1) + 1
+    else:
+        # the window is an odd number of frames longer than the polynomial order
+        window_frames = max(int(round(window * sample_rate)) // 2 * 2 + 1, polyorder + 1 + polyorder % 2)
+        coefficients = savgol_coefficients(window_frames, polyorder)
+        frames_needed = window_frames
+    if len(signals) < frames_needed or not np.isfinite(signals).all():
+        print("The signals have missing values or too few frames to filter. Leaving them unfiltered...")
+        return signals
+
+    # every column is filtered in one call
+    columns = signals.reshape(len(signals), -1)
+    if filter_type == "butterworth":
+        from scipy.signal import sosfiltfilt
+        # forwards and backwards, so the filter does not delay the signals
+        filtered = sosfiltfilt(coefficients, columns, axis=0)
+    else:
+        from scipy.ndimage import convolve1d
+        filtered = convolve1d(columns, coefficients, axis=0, mode="mirror")
+    return filtered.reshape(signals.shape)
@@ -0,0 +1,150 @@
+import os
+import json
+import hashlib
+import argparse
+import numpy as np
+from sto_reader import read_sto, read_sto_header
+
+
+def sto_cache_folder(filename, cache_dir=None):
+    """ Returns the folder the binary copy of a .sto file is stored in.
+    ----------
+    Parameters
+    filename: string of the path to the .sto file
+    cache_dir: string of the folder to store the cache in (default is None - a .sto_cache folder next to the .sto file)
+    ----------
+    Returns
+    string of the path to the cache folder of that file
+    """
+    filename = os.path.abspath(filename)
+    if cache_dir is None:
+        return os.path.join(os.path.dirname(filename), ".sto_cache", os.path.basename(filename))
+    # files from different folders can share a name, so add a short hash of the full path
+    path_hash = hashlib.sha1(filename.encode()).hexdigest()[:10]
+    return os.path.join(cache_dir, f"{os.path.basename(filename)}_{path_hash}")
+
+
+def source_signature(filename, verify_hash=False):
+    """ Returns the modification time, size and (optionally) the SHA-1 hash of the .sto file. """
+    stat = os.stat(filename)
+    signature = {"mtime_ns": stat.st_mtime_ns, "size": stat.st_size}
+    if verify_hash:
+        sha1 = hashlib.sha1()
+        with open(filename, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                sha1.update(block)
+        signature["sha1"] = sha1.hexdigest()
+    return signature
+
+
+def _source_unchanged(source, signature, filename, verify_hash):
+    """ Checks the file a cache was written from against the .sto file's modification time and size, and its SHA-1 hash if verify_hash is on. """
+    if source["mtime_ns"] != signature["mtime_ns"] or source["size"] != signature["size"]:
+        return False
+    return not verify_hash or source.get("sha1") == source_signature(filename, verify_hash=True)["sha1"]
+
+
+def _column_file(folder, labels, column):
+    return os.path.join(folder, f"column_{labels.index(column):04d}.npy")
+
+
+def _load_meta(folder):
+    try:
+        with open(os.path.join(folder, "meta.json"), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return None
+
+
+def _write_meta(folder, meta):
+    # write to a temporary file first so an interrupted run never leaves a half written meta file
+    temp_file = os.path.join(folder, "meta.json.tmp")
+    with open(temp_file, "w") as file:
+        json.dump(meta, file)
+    os.replace(temp_file, os.path.join(folder, "meta.json"))
+
+
+def read_sto_cached(filename, columns=None, dtype=np.float64, skip_lines=0, cache_dir=None, verify_hash=False):
+    """ Reads columns of a .sto file from a binary copy, converting the text file only if it has changed.
+    Each column is stored as a .npy file which is memory-mapped when it is read.
+    ----------
+    Parameters
+    filename: string of the path to the .sto file
+    columns: list of the labels of the columns to read (default is None - reads every column)
+    dtype: numpy dtype of the returned arrays (default is np.float64)
+    skip_lines: int of the number of lines to skip from the start of the file, including the header (default is 0)
+    cache_dir: string of the folder to store the cache in (default is None - a .sto_cache folder next to the .sto file)
+    verify_hash: bool of whether to also compare the SHA-1 hash of the file, not only its modification time and size (default is False).
+    The hash is always recorded when the cache is written, so turning this on or off keeps the cache.
+    ----------
+    Returns
+    header: dictionary of the header values and labels of the file
+    data: dictionary of a numpy array for each requested column
+    """
+    header = read_sto_header(filename)
+    labels = header["labels"]
+    if columns is None:
+        columns = labels
+    folder = sto_cache_folder(filename, cache_dir)
+    signature = source_signature(filename)
+
+    # the cache is only used if the file and its header are unchanged since it was written
+    meta = _load_meta(folder)
+    if meta is None or not _source_unchanged(meta["source"], signature, filename, verify_hash) or meta["header"] != header:
+        os.makedirs(folder, exist_ok=True)
+        for old_file in os.listdir(folder):
+            if old_file.endswith(".npy"):
+                os.remove(os.path.join(folder, old_file))
+        meta = {"source": source_signature(filename, verify_hash=True), "header": header, "columns": []}
+
+    # convert the columns that have not been cached yet
+    missing = [column for column in columns if column not in meta["columns"]]
+    if missing:
+        sto_data = read_sto(filename, missing)[1]
+        for column in missing:
+            temp_file = _column_file(folder, labels, column)[:-len(".npy")] + ".tmp.npy"
+            np.save(temp_file, sto_data[column])
+            os.replace(temp_file, _column_file(folder, labels, column))
+        meta["columns"] = meta["columns"] + missing
+        _write_meta(folder, meta)
+
+    # only lines after the header are data, so skip the remaining lines from there
+    rows_to_skip = max(skip_lines - header["header_lines"], 0)
+    data = {}
+    for column in columns:
+        values = np.load(_column_file(folder, labels, column), mmap_mode="r")[rows_to_skip:]
+        data[column] = values if values.dtype == dtype else values.astype(dtype)
+    return header, data
+
+
+def build_sto_cache(folder, cache_dir=None, verify_hash=False):
+    """ Converts every .sto file in a folder (and its subfolders) to the binary cache.
+    ----------
+    Parameters
+    folder: string of the folder containing the .sto files, e.g. a participant folder
+    cache_dir: string of the folder to store the cache in (default is None - a .sto_cache folder next to each .sto file)
+    verify_hash: bool of whether to also compare the SHA-1 hash of files that are already cached (default is False)
+    ----------
+    Returns
+    int of the number of .sto files cached
+    """
+    files_cached = 0
+    for directory, subfolders, files in os.walk(folder):
+        # don't look inside the cache folders themselves
+        subfolders[:] = [subfolder for subfolder in subfolders if subfolder != ".sto_cache"]
+        for file in sorted(files):
+            if file.endswith(".sto"):
+                read_sto_cached(os.path.join(directory, file), cache_dir=cache_dir, verify_hash=verify_hash)
+                print(f"Cached {os.path.join(directory, file)}")
+                files_cached += 1
+    return files_cached
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Convert the .sto files of a participant folder to the binary cache.")
+    parser.add_argument("folder", help="folder containing the .sto files, e.g. a participant folder")
+    parser.add_argument("--cache-dir", default=None, help="folder to store the cache in (default is a .sto_cache folder next to each .sto file)")
+    parser.add_argument("--verify-hash", action="store_true", help="also compare the SHA-1 hash of files that are already cached")
+    args = parser.parse_args()
+    files_cached = build_sto_cache(args.folder, args.cache_dir, args.verify_hash)
+    print(f"{files_cached} .sto files cached.")
@@ -0,0 +1,141 @@
+import itertools
+import numpy as np
+from instrumentation import record_file_read
+from prefetch import open_prefetched
+
+
+def _read_header(file):
+    """ Reads the header of an open .sto file up to and including the line of labels.
+    ----------
+    Parameters
+    file: .sto file opened for reading
+    ----------
+    Returns
+    A dictionary of the header values (e.g. nRows, nColumns), the labels and the number of lines read
+    """
+    header = {}
+    lines_read = 0
+    end_of_header = False
+    for line in iter(file.readline, ""):
+        lines_read += 1
+        # the labels are on the line after 'endheader' - files without 'endheader' start the labels with 'time'
+        if end_of_header or line.startswith("time"):
+            header["labels"] = line.strip().split("\t")
+            header["header_lines"] = lines_read
+            return header
+        if line.strip() == "endheader":
+            end_of_header = True
+        elif "=" in line:
+            key, value = line.strip().split("=", 1)
+            header[key] = int(value) if value.isdigit() else value
+    # If 'time' is not found, raise an error
+    raise ValueError("Labels starting with 'time' not found in the file.")
+
+
+def read_sto_header(filename):
+    """ Read the header of an OpenSim .sto file.
+    ----------
+    Parameters
+    filename: string of the path to the .sto file
+    ----------
+    Returns
+    A dictionary of the header values (e.g. "nRows", "nColumns"), the "labels" (column names) and the number of "header_lines"
+    """
+    with open(filename, "r") as file:
+        return _read_header(file)
+
+
+def read_sto(filename, columns=None, dtype=np.float64, skip_lines=0):
+    """ Reads the requested columns of an OpenSim .sto file, opening the file once.
+    ----------
+    Parameters
+    filename: string of the path to the .sto file
+    columns: list of the labels of the columns to read (default is None - reads every column)
+    dtype: numpy dtype of the returned arrays (default is np.float64 - np.float32 halves the memory used)
+    skip_lines: int of the number of lines to skip from the start of the file, including the header (default is 0)
+    ----------
+    Returns
+    header: dictionary of the header values and labels of the file
+    data: dictionary of a numpy array for each requested column
+    """
+    record_file_read(filename)
+    # the bytes of the file may already have been read in the background by prefetch_jobs
+    with open_prefetched(filename) as file:
+        header = _read_header(file)
+        columns, usecols = _column_indices(header, columns, filename)
+        # only lines after the header are data, so skip the remaining lines from there
+        rows_to_skip = max(skip_lines - header["header_lines"], 0)
+        max_rows = None
+        if "nRows" in header:
+            max_rows = max(header["nRows"] - rows_to_skip, 0)
+        # only the requested columns are converted to numbers
+        values = np.loadtxt(file, delimiter="\t", usecols=usecols, dtype=dtype, ndmin=2, skiprows=rows_to_skip, max_rows=max_rows)
+
+    # store each column contiguously
+    values = np.ascontiguousarray(values.T)
+    data = {column: values[i] for i, column in enumerate(columns)}
+    return header, data
+
+
+def iter_sto_chunks(filename, columns=None, chunk_rows=10000, dtype=np.float64, skip_lines=0):
+    """ Reads the requested columns of an OpenSim .sto file in chunks of rows, so the whole file is never held in memory.
+    ----------
+    Parameters
+    filename: string of the path to the .sto file
+    columns: list of the labels of the columns to read (default is None - reads every column)
+    chunk_rows: int of the number of rows in each chunk (default is 10000)
+    dtype: numpy dtype of the returned arrays (default is np.float64)
+    skip_lines: int of the number of lines to skip from the start of the file, including the header (default is 0)
+    ----------
+    Yields
+    header: dictionary of the header values and labels of the file
+    data: dictionary of a numpy array for each requested column, holding the rows of the chunk
+    """
+    record_file_read(filename)
+    with open(filename, "r") as file:
+        header = _read_header(file)
+        columns, usecols = _column_indices(header, columns, filename)
+        rows_to_skip = max(skip_lines - header["header_lines"], 0)
+        rows_left = None
+        if "nRows" in header:
+            rows_left = max(header["nRows"] - rows_to_skip, 0)
+        # skip the lines without keeping them
+        for _ in itertools.islice(file, rows_to_skip):
+            pass
+        while rows_left is None or rows_left > 0:
+            lines = list(itertools.islice(file, chunk_rows if rows_left is None else min(chunk_rows, rows_left)))
+            if not lines:
+                break
+            if rows_left is not None:
+                rows_left -= len(lines)
+            yield header, parse_sto_lines(lines, columns, usecols, dtype)
+
+
+def parse_sto_lines(lines, columns, usecols, dtype=np.float64):
+    """ Converts rows of a .sto file to a dictionary of a numpy array for each column.
+    ----------
+    Parameters
+    lines: list of strings of the rows of data
+    columns: list of the labels of the columns to return
+    usecols: list of the positions of those columns in each row
+    dtype: numpy dtype of the returned arrays (default is np.float64)
+    ----------
+    Returns
+    A dictionary of a numpy array for each column
+    """
+    values = np.loadtxt(lines, delimiter="\t", usecols=usecols, dtype=dtype, ndmin=2)
+    values = np.ascontiguousarray(values.T)
+    return {column: values[i] for i, column in enumerate(columns)}
+
+
+def _column_indices(header, columns, filename):
+    """ Checks the requested columns are in the file and returns them with their positions in each row. """
+    labels = header["labels"]
+    if "nColumns" in header and header["nColumns"] != len(labels):
+        raise ValueError(f"{filename} has {len(labels)} labels but its header says nColumns={header['nColumns']}.")
+    if columns is None:
+        columns = labels
+    missing = [column for column in columns if column not in labels]
+    if missing:
+        raise ValueError(f"Columns {missing} not found in {filename}.")
+    return columns, [labels.index(column) for column in columns]
@@ -0,0 +1,160 @@
+import sys
+import numpy as np
+from trial_files import find_trial_files, trial_number_of
+from sto_reader import read_sto_header, iter_sto_chunks
+from metrics_engine import calculate_metric_windows, calculate_trial_metrics
+from signal_filter import filter_settings
+from config import keypoint, rows_to_skip, participant_mass, stream_chunk_rows
+
+
+class StreamingMetrics:
+    """ Adds up the distance covered, player load and external mechanical work of each point as frames of a trial arrive.
+    Only the last frame of the previous chunk is kept between chunks, so memory does not grow with the length of the recording.
+    The per-frame increments are the same as the ones used by TrialIndex, so the results match the in-memory calculation.
+    """
+
+    def __init__(self, point_dict, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, total_frames=None):
+        """
+        ----------
+        Parameters
+        point_dict: dictionary of the points in the trial e.g. {"point1": [0, 2952], "point2": [4000, 5603]}
+        participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+        rows_of_data_to_skip: int of the number of rows skipped in the data (default is rows_to_skip from the config file)
+        total_frames: int of the number of frames in the trial, if it is known (default is None)
+        """
+        self.participant_mass = participant_mass
+        self.points = list(point_dict)
+        # without the length of the trial, points are never cut short by the end of the data
+        windows_length = total_frames if total_frames is not None else sys.maxsize // 2
+        windows = [calculate_metric_windows(point_dict[point], windows_length, rows_of_data_to_skip) for point in self.points]
+        self.windows = {
+            "Distance Covered": np.array([window["Distance Covered"] for window in windows], dtype=np.int64).reshape(-1, 2, 2),
+            "Player Load": np.array([window["Player Load"] for window in windows], dtype=np.int64).reshape(-1, 2, 2),
+            "Work": np.array([window["Work"] for window in windows], dtype=np.int64).reshape(-1, 2, 2),
+        }
+        self.totals = {metric: np.zeros(len(self.points)) for metric in ["Distance Covered", "Player Load", "Negative Work", "Positive Work"]}
+        # the frame each point is complete at - player load needs the acceleration of the frame after its last increment
+        self.point_ends = np.maximum.reduce([self.windows["Distance Covered"][:, :, 1].max(axis=1), self.windows["Player Load"][:, :, 1].max(axis=1) + 1, self.windows["Work"][:, :, 1].max(axis=1)])
+        self.emitted = np.zeros(len(self.points), dtype=bool)
+        self.frames_seen = 0
+        # state carried over from the last frame of the previous chunk
+        self.previous = None
+
+    def _add_increments(self, metric, windows, increments, first_frame):
+        """ Adds the increments of frames first_frame onwards to the totals of the points whose windows contain them. """
+        if len(increments) == 0:
+            return
+        cumulative = np.concatenate(([0.0], np.cumsum(np.nan_to_num(increments))))
+        last_frame = first_frame + len(increments)
+        first = np.clip(windows[..., 0], first_frame, last_frame)
+        last = np.clip(windows[..., 1], first, last_frame)
+        self.totals[metric] += (cumulative[last - first_frame] - cumulative[first - first_frame]).sum(axis=1)
+
+    def update(self, time, position, velocity):
+        """ Adds the next frames of the trial.
+        ----------
+        Parameters
+        time: numpy array of the time of each frame
+        position: numpy array of the keypoint position (frames x 3)
+        velocity: numpy array of the keypoint velocity (frames x 3)
+        """
+        frames = len(time)
+        if frames == 0:
+            return
+        te = self.participant_mass * 9.81 * position[:, 1] + 0.5 * self.participant_mass * (velocity**2).sum(axis=1)
+        first_frame = self.frames_seen
+        if self.previous is None:
+            # the first frame has no distance, acceleration or change in energy
+            distance = np.concatenate(([0.0], np.sqrt((np.diff(position, axis=0)**2).sum(axis=1))))
+            acceleration = np.full(velocity.shape, np.nan)
+            acceleration[1:] = np.diff(velocity, axis=0) / np.diff(time)[:, None]
+            delta_te = np.concatenate(([np.nan], np.diff(te)))
+        else:
+            distance = np.sqrt((np.diff(np.vstack((self.previous["position"], position)), axis=0)**2).sum(axis=1))
+            acceleration = np.diff(np.vstack((self.previous["velocity"], velocity)), axis=0) / np.diff(np.concatenate(([self.previous["time"]], time)))[:, None]
+            delta_te = np.diff(np.concatenate(([self.previous["te"]], te)))
+
+        # player load needs the acceleration of the next frame, so its increments lag one frame behind
+        if self.previous is None:
+            player_load = np.sqrt((np.diff(acceleration, axis=0)**2).sum(axis=1)/100)
+            load_first_frame = first_frame
+        else:
+            player_load = np.sqrt((np.diff(np.vstack((self.previous["acceleration"], acceleration)), axis=0)**2).sum(axis=1)/100)
+            load_first_frame = first_frame - 1
+
+        self._add_increments("Distance Covered", self.windows["Distance Covered"], distance, first_frame)
+        self._add_increments("Player Load", self.windows["Player Load"], player_load, load_first_frame)
+        self._add_increments("Negative Work", self.windows["Work"], np.where(delta_te < 0, delta_te, 0), first_frame)
+        self._add_increments("Positive Work", self.windows["Work"], np.where(delta_te > 0, delta_te, 0), first_frame)
+
+        self.frames_seen += frames
+        self.previous = {"time": time[-1], "position": position[-1], "velocity": velocity[-1], "acceleration": acceleration[-1], "te": te[-1]}
+
+    def results(self, points=None):
+        """ Returns the distance covered, player load, negative and positive work of the points (default is every point). """
+        point_metrics = {}
+        for i, point in enumerate(self.points):
+            if points is None or point in points:
+                point_metrics[point] = {metric: self.totals[metric][i] for metric in self.totals}
+        return point_metrics
+
+    def finished_points(self):
+        """ Returns the metrics of the points the frames have passed the end of since this was last called. """
+        finished = (self.point_ends <= self.frames_seen) & ~self.emitted
+        self.emitted |= finished
+        return self.results([point for point, is_finished in zip(self.points, finished) if is_finished])
+
+
+def stream_trial_metrics(trial, point_dict, kinematics_folder, keypoint=keypoint, participant_mass=participant_mass, rows_of_data_to_skip=rows_to_skip, chunk_rows=stream_chunk_rows):
+    """ Calculates every metric for each point of a trial, reading the .sto files in chunks so memory stays constant.
+    ----------
+    Parameters
+    trial: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_dict: dictionary of the points in the trial
+    kinematics_folder: string of the folder containing the kinematics files
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    chunk_rows: int of the number of rows read at a time (default is stream_chunk_rows from the config file)
+    ----------
+    Returns
+    A dictionary with the distance covered, player load, negative and positive work for each point (0 if there is no data for the trial)
+    Raises a ValueError if the files of the trial have no frames of data
+    """
+    trial_files = find_trial_files(kinematics_folder, trial_number_of(trial))
+    if "pos_global" not in trial_files or "vel_global" not in trial_files:
+        print(f"No data for Trial Number {trial[len('trial_'):]}. Skipping...")
+        return {point: {"Distance Covered": 0, "Player Load": 0, "Negative Work": 0, "Positive Work": 0} for point in point_dict}
+
+    # the number of frames is known from the header, so points running past the end of the trial are treated as in memory
+    header = read_sto_header(trial_files["pos_global"])
+    total_frames = None
+    if "nRows" in header:
+        total_frames = max(header["nRows"] - max(rows_of_data_to_skip - header["header_lines"], 0) - rows_of_data_to_skip, 0)
+    streaming_metrics = StreamingMetrics(point_dict, participant_mass, rows_of_data_to_skip, total_frames)
+
+    keypoint_columns = [f"{keypoint}_{plane}" for plane in ["X", "Y", "Z"]]
+    pos_chunks = iter_sto_chunks(trial_files["pos_global"], ["time"] + keypoint_columns, chunk_rows, skip_lines=rows_of_data_to_skip)
+    vel_chunks = iter_sto_chunks(trial_files["vel_global"], keypoint_columns, chunk_rows, skip_lines=rows_of_data_to_skip)
+    rows_left_to_skip = rows_of_data_to_skip
+    for (_, pos_data), (_, vel_data) in zip(pos_chunks, vel_chunks):
+        # the first rows of data are skipped, as they are in memory
+        skip = min(rows_left_to_skip, len(pos_data["time"]))
+        rows_left_to_skip -= skip
+        position = np.column_stack([pos_data[column][skip:] for column in keypoint_columns])
+        velocity = np.column_stack([vel_data[column][skip:] for column in keypoint_columns])
+        streaming_metrics.update(pos_data["time"][skip:], position, velocity)
+    if streaming_metrics.frames_seen == 0:
+        raise ValueError(f"The files of trial number {trial[len('trial_'):]} have no frames of data after the {rows_of_data_to_skip} rows skipped.")
+    print(f"Processing data for trial number {trial[len('trial_'):]}.")
+    return streaming_metrics.results()
+
+
+def select_trial_metrics_function(streaming):
+    """ Returns the function that calculates the metrics of a trial - stream_trial_metrics when streaming, otherwise calculate_trial_metrics.
+    A zero-phase filter needs the whole trial, so the trials are read all at once when a filter is turned on.
+    """
+    if streaming and filter_settings() is not None:
+        print("The .sto files can't be streamed when a filter is turned on. Reading each trial at once...")
+        return calculate_trial_metrics
+    return stream_trial_metrics if streaming else calculate_trial_metrics
@@ -0,0 +1,41 @@
+import numpy as np
+from benchmarks.synthetic_data import generate_trial
+from metrics_engine import calculate_trial_metrics, calculate_metric_windows, load_trial_index
+from peak_metrics import calculate_trial_peak_metrics, peak_metrics
+
+point_dict = {"point1": [0, 400], "point2": [500, 1500, 800, 900]}
+
+
+def brute_force_peak(increments, ranges, window_frames):
+    """ The largest sum of window_frames consecutive increments in any of the ranges, trying every window in turn. """
+    peaks = []
+    for first, last in ranges:
+        if last - first <= window_frames:
+            peaks.append(increments[first:last].sum())
+        else:
+            peaks.append(max(increments[i:i + window_frames].sum() for i in range(first, last - window_frames + 1)))
+    return max(peaks)
+
+
+def test_peaks_match_every_window(tmp_path):
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=1600, bodies=["pelvis"], seed=5)
+    peaks = calculate_trial_peak_metrics("trial_01", point_dict, kinematics_folder, [0.5, 2], "pelvis", 70, 0)
+    trial_index = load_trial_index(kinematics_folder, 1, "pelvis", 70, 0)
+    for point, frames in {**point_dict, "trial": [0, None]}.items():
+        windows = calculate_metric_windows(frames, trial_index.total_frames, 0)
+        for metric, window_name in peak_metrics.items():
+            increments = np.diff(trial_index.cumulative[metric])
+            ranges = [(first, min(last, trial_index.total_frames)) for first, last in windows[window_name] if last > first]
+            # the synthetic trials have 100 frames a second
+            for seconds, window_frames in [(0.5, 50), (2, 200)]:
+                assert np.isclose(peaks[point][metric][seconds], brute_force_peak(increments, ranges, window_frames)), (point, metric, seconds)
+
+
+def test_window_longer_than_the_point_is_the_whole_point(tmp_path):
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=1600, bodies=["pelvis"], seed=5)
+    peaks = calculate_trial_peak_metrics("trial_01", {"point1": [0, 400]}, kinematics_folder, [30], "pelvis", 70, 0)
+    metrics = calculate_trial_metrics("trial_01", {"point1": [0, 400]}, kinematics_folder, "pelvis", 70, 0)
+    for metric in peak_metrics:
+        assert np.isclose(peaks["point1"][metric][30], metrics["point1"][metric])
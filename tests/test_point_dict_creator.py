@@ -0,0 +1,14 @@
+from point_dict_creator import create_point_dict
+
+
+def test_point_names(tmp_path):
+    csv_file = tmp_path / "points.csv"
+    csv_file.write_text("Trial,Point,Point Start Frame,Point End Frame\n1,1,0,100\n,2,150,300\n101,10,0,200\n")
+    assert create_point_dict(str(csv_file)) == {"trial_01": {"point1": [0, 100], "point2": [150, 300]}, "trial_101": {"point10": [0, 200]}}
+
+
+def test_points_read_as_floats_keep_their_form(tmp_path):
+    # an empty point cell makes pandas read the column as floats, and the empty cell takes the point above
+    csv_file = tmp_path / "points.csv"
+    csv_file.write_text("Trial,Point,Point Start Frame,Point End Frame\n1,1,0,100\n1,,150,300\n1,2,400,500\n")
+    assert create_point_dict(str(csv_file)) == {"trial_01": {"point1.0": [150, 300], "point2.0": [400, 500]}}
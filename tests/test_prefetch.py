@@ -0,0 +1,15 @@
+from benchmarks.synthetic_data import generate_trial
+from metrics_engine import calculate_trial_metrics
+from prefetch import kinematics_files
+
+
+def test_cached_trials_are_not_read_ahead(tmp_path):
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=300, bodies=["pelvis"], seed=1)
+    files_02 = generate_trial(kinematics_folder, "02", frames=300, bodies=["pelvis"], seed=2)
+    calculate_trial_metrics("trial_01", {"point1": [0, 200]}, kinematics_folder, "pelvis", 70, 0)
+    files_of_job = kinematics_files(kinematics_folder, "pelvis", 0)
+    assert files_of_job("trial_01", {}) == []
+    assert files_of_job("trial_02", {}) == files_02
+    # trial_01 is parsed again for other rows to skip, so its files are read ahead
+    assert len(kinematics_files(kinematics_folder, "pelvis", 35)("trial_01", {})) == 2
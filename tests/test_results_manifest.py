@@ -0,0 +1,73 @@
+import os
+import numpy as np
+import results_manifest
+from benchmarks.synthetic_data import generate_trial
+from metrics_engine import calculate_trial_metrics
+from results_manifest import extract_metrics_incrementally
+
+trial_dict = {"trial_01": {"point1": [0, 300], "point2": [350, 700]}, "trial_02": {"point1": [0, 500]}}
+
+
+def record_trials(monkeypatch, fail=()):
+    """ Records the trials calculated by extract_metrics_incrementally, raising an error for the trials in fail. """
+    calculated = []
+    def trial_metrics(trial, point_dict, *args):
+        calculated.append((trial, list(point_dict)))
+        if trial in fail:
+            raise RuntimeError(f"{trial} stopped")
+        return calculate_trial_metrics(trial, point_dict, *args)
+    monkeypatch.setattr(results_manifest, "select_trial_metrics_function", lambda streaming: trial_metrics)
+    return calculated
+
+
+def assert_matches_in_memory(metrics_dict, kinematics_folder, trial_dict=trial_dict):
+    for trial, point_dict in trial_dict.items():
+        expected = calculate_trial_metrics(trial, point_dict, kinematics_folder, "pelvis", 70, 0)
+        for point in point_dict:
+            for metric, value in expected[point].items():
+                assert np.isclose(metrics_dict[trial][point][metric], value), (trial, point, metric)
+
+
+def test_interrupted_run_carries_on(tmp_path, monkeypatch):
+    kinematics_folder, data_path = str(tmp_path / "kinematics"), str(tmp_path / "results")
+    generate_trial(kinematics_folder, "01", frames=800, bodies=["pelvis"], seed=1)
+    generate_trial(kinematics_folder, "02", frames=800, bodies=["pelvis"], seed=2)
+
+    # trial_02 fails, so only trial_01 is kept in the manifest
+    calculated = record_trials(monkeypatch, fail=["trial_02"])
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+    assert list(metrics_dict) == ["trial_01"]
+
+    calculated = record_trials(monkeypatch)
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+    assert calculated == [("trial_02", ["point1"])]
+    assert_matches_in_memory(metrics_dict, kinematics_folder)
+
+    # nothing has changed, so nothing is calculated
+    calculated = record_trials(monkeypatch)
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+    assert calculated == []
+    assert_matches_in_memory(metrics_dict, kinematics_folder)
+
+
+def test_changed_trial_and_points_are_recalculated(tmp_path, monkeypatch):
+    kinematics_folder, data_path = str(tmp_path / "kinematics"), str(tmp_path / "results")
+    generate_trial(kinematics_folder, "01", frames=800, bodies=["pelvis"], seed=1)
+    pos_file = generate_trial(kinematics_folder, "02", frames=800, bodies=["pelvis"], seed=2)[0]
+    extract_metrics_incrementally(kinematics_folder, trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+
+    # new data in trial_02 with the same file size
+    modified = os.stat(pos_file).st_mtime_ns
+    for filename in generate_trial(kinematics_folder, "02", frames=800, bodies=["pelvis"], seed=3):
+        os.utime(filename, ns=(modified + 10**9, modified + 10**9))
+    calculated = record_trials(monkeypatch)
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+    assert calculated == [("trial_02", ["point1"])]
+    assert_matches_in_memory(metrics_dict, kinematics_folder)
+
+    # only the point whose frames changed is calculated again
+    new_trial_dict = {**trial_dict, "trial_01": {"point1": [0, 300], "point2": [350, 650]}}
+    calculated = record_trials(monkeypatch)
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, new_trial_dict, data_path, 1, "pelvis", 70, 0, streaming=False)
+    assert calculated == [("trial_01", ["point2"])]
+    assert_matches_in_memory(metrics_dict, kinematics_folder, new_trial_dict)
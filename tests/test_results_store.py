@@ -0,0 +1,36 @@
+import os
+from results_store import append_metrics, read_results_store, compact_results_store
+
+
+def metrics(value):
+    return {"Distance Covered": value, "Player Load": value, "Negative Work": -value, "Positive Work": value}
+
+
+def test_trial_01_and_trial_101_are_separate_rows(tmp_path):
+    store_dir = str(tmp_path / "results_store")
+    append_metrics({"trial_01": {"point1": metrics(1.0)}, "trial_101": {"point1": metrics(2.0)}}, "P01", "pelvis", store_dir, ".npz")
+    table = read_results_store(store_dir)
+    assert sorted(table["Trial"]) == [1, 101]
+
+
+def test_append_replaces_only_the_points_written_again(tmp_path):
+    store_dir = str(tmp_path / "results_store")
+    append_metrics({"trial_01": {"point1": metrics(1.0), "point2": metrics(2.0)}}, "P01", "pelvis", store_dir, ".npz")
+    append_metrics({"trial_01": {"point2": metrics(5.0)}}, "P01", "pelvis", store_dir, ".npz")
+    table = read_results_store(store_dir).set_index("Point")
+    assert table.loc["1", "Distance Covered (m)"] == 1.0
+    assert table.loc["2", "Distance Covered (m)"] == 5.0
+
+
+def test_store_written_as_one_file_becomes_a_folder(tmp_path):
+    store_dir = str(tmp_path / "results_store")
+    append_metrics({"trial_01": {"point1": metrics(1.0)}}, "P01", "pelvis", store_dir, ".npz")
+    # a store written before stores were folders is a single results.npz file
+    old_store = str(tmp_path / "results.npz")
+    os.rename(os.path.join(store_dir, os.listdir(store_dir)[0]), old_store)
+    append_metrics({"trial_02": {"point1": metrics(2.0)}}, "P01", "pelvis", old_store, ".npz")
+    assert len(os.listdir(old_store)) == 2
+    assert sorted(read_results_store(old_store)["Trial"]) == [1, 2]
+    compact_results_store(old_store, ".npz")
+    assert len(os.listdir(old_store)) == 1
+    assert sorted(read_results_store(old_store)["Trial"]) == [1, 2]
@@ -0,0 +1,43 @@
+import numpy as np
+from scipy.signal import butter, filtfilt, savgol_filter
+from signal_filter import filter_signals
+
+sample_rate = 100
+
+
+def noisy_signals(frames=1000, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames) / sample_rate
+    signals = np.cumsum(rng.normal(0, 0.01, (frames, 2, 3)), axis=0) + rng.normal(0, 0.005, (frames, 2, 3))
+    return signals, time
+
+
+def test_no_filter_returns_the_signals():
+    signals, time = noisy_signals()
+    assert filter_signals(signals, time, None) is signals
+
+
+def test_butterworth_matches_filtering_each_column():
+    signals, time = noisy_signals()
+    filtered = filter_signals(signals, time, "butterworth", cutoff=6, order=4)
+    b, a = butter(4, 6, btype="low", fs=sample_rate)
+    for keypoint in range(2):
+        for plane in range(3):
+            assert np.allclose(filtered[:, keypoint, plane], filtfilt(b, a, signals[:, keypoint, plane]), atol=1e-8)
+
+
+def test_savgol_matches_filtering_each_column():
+    signals, time = noisy_signals()
+    filtered = filter_signals(signals, time, "savgol", window=0.25, polyorder=3)
+    for keypoint in range(2):
+        for plane in range(3):
+            # 0.25 s at 100 Hz is rounded to a window of 25 frames
+            assert np.allclose(filtered[:, keypoint, plane], savgol_filter(signals[:, keypoint, plane], 25, 3, mode="mirror"))
+
+
+def test_missing_values_and_short_signals_are_left_unfiltered():
+    signals, time = noisy_signals()
+    signals[10, 0, 0] = np.nan
+    assert filter_signals(signals, time, "butterworth") is signals
+    signals, time = noisy_signals(frames=10)
+    assert filter_signals(signals, time, "savgol", window=0.25, polyorder=3) is signals
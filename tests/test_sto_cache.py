@@ -0,0 +1,80 @@
+import os
+import numpy as np
+import sto_cache
+from benchmarks.synthetic_data import generate_trial
+from sto_reader import read_sto
+from sto_cache import read_sto_cached
+
+columns = ["time", "pelvis_X", "pelvis_Y"]
+
+
+def count_parses(monkeypatch):
+    """ Counts the .sto files parsed by the cache, instead of read from its binary copy. """
+    parses = []
+    def counted_read_sto(filename, *args, **kwargs):
+        parses.append(filename)
+        return read_sto(filename, *args, **kwargs)
+    monkeypatch.setattr(sto_cache, "read_sto", counted_read_sto)
+    return parses
+
+
+def assert_matches_text_file(filename, data, skip_lines=0):
+    expected = read_sto(filename, columns, skip_lines=skip_lines)[1]
+    for column in columns:
+        assert np.array_equal(data[column], expected[column])
+
+
+def test_cache_is_only_built_once(tmp_path, monkeypatch):
+    parses = count_parses(monkeypatch)
+    filename = generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=1)[0]
+    assert_matches_text_file(filename, read_sto_cached(filename, columns)[1])
+    assert_matches_text_file(filename, read_sto_cached(filename, columns, skip_lines=46)[1], skip_lines=46)
+    assert len(parses) == 1
+    # a column that was not cached yet is parsed on its own
+    read_sto_cached(filename, ["pelvis_Z"])
+    assert len(parses) == 2
+
+
+def test_changed_file_is_parsed_again(tmp_path, monkeypatch):
+    parses = count_parses(monkeypatch)
+    filename = generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=1)[0]
+    read_sto_cached(filename, columns)
+    modified = os.stat(filename).st_mtime_ns
+    # the same number of rows with different values gives a file of the same size, so only the modification time changes
+    generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=2)
+    os.utime(filename, ns=(modified + 10**9, modified + 10**9))
+    assert_matches_text_file(filename, read_sto_cached(filename, columns)[1])
+    assert len(parses) == 2
+
+
+def test_changed_header_is_parsed_again(tmp_path, monkeypatch):
+    parses = count_parses(monkeypatch)
+    filename = generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=1)[0]
+    read_sto_cached(filename, columns)
+    generate_trial(str(tmp_path), "01", frames=200, bodies=["pelvis"], seed=1)
+    data = read_sto_cached(filename, columns)[1]
+    assert len(data["time"]) == 200
+    assert_matches_text_file(filename, data)
+    assert len(parses) == 2
+
+
+def test_turning_hash_verification_on_or_off_keeps_the_cache(tmp_path, monkeypatch):
+    parses = count_parses(monkeypatch)
+    filename = generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=1)[0]
+    for verify_hash in [False, True, False, True]:
+        assert_matches_text_file(filename, read_sto_cached(filename, columns, verify_hash=verify_hash)[1])
+    assert len(parses) == 1
+
+
+def test_hash_verification_finds_changes_that_keep_the_modification_time(tmp_path, monkeypatch):
+    parses = count_parses(monkeypatch)
+    filename = generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=1)[0]
+    read_sto_cached(filename, columns)
+    stat = os.stat(filename)
+    generate_trial(str(tmp_path), "01", frames=300, bodies=["pelvis"], seed=2)
+    os.utime(filename, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+    # without verification the file looks unchanged
+    read_sto_cached(filename, columns)
+    assert len(parses) == 1
+    assert_matches_text_file(filename, read_sto_cached(filename, columns, verify_hash=True)[1])
+    assert len(parses) == 2
@@ -0,0 +1,77 @@
+import numpy as np
+import pytest
+from benchmarks.synthetic_data import write_sto
+from sto_reader import read_sto, read_sto_header, iter_sto_chunks
+
+labels = ["time", "pelvis_X", "pelvis_Y", "pelvis_Z"]
+
+
+def synthetic_sto(tmp_path, frames=200, seed=0):
+    rng = np.random.default_rng(seed)
+    time = np.arange(frames) / 100
+    values = rng.normal(0, 1, (frames, len(labels) - 1))
+    filename = str(tmp_path / "trial_01_BodyKinematics_pos_global.sto")
+    write_sto(filename, time, values, labels)
+    return filename, np.column_stack([time, values])
+
+
+def test_header(tmp_path):
+    filename, _ = synthetic_sto(tmp_path)
+    header = read_sto_header(filename)
+    assert header["nRows"] == 200
+    assert header["nColumns"] == 4
+    assert header["labels"] == labels
+    assert header["header_lines"] == 11
+
+
+def test_read_sto_matches_loadtxt(tmp_path):
+    filename, _ = synthetic_sto(tmp_path)
+    expected = np.loadtxt(filename, skiprows=11)
+    header, data = read_sto(filename, ["pelvis_Z", "time"])
+    assert list(data) == ["pelvis_Z", "time"]
+    assert np.array_equal(data["time"], expected[:, 0])
+    assert np.array_equal(data["pelvis_Z"], expected[:, 3])
+    # skip_lines counts the header lines too
+    _, data = read_sto(filename, ["pelvis_X"], skip_lines=11 + 35)
+    assert np.array_equal(data["pelvis_X"], expected[35:, 1])
+
+
+def test_only_nrows_rows_are_read(tmp_path):
+    filename, _ = synthetic_sto(tmp_path)
+    expected = np.loadtxt(filename, skiprows=11)
+    # lines after the nRows rows of data, e.g. from a file that was appended to, are not data
+    with open(filename, "a") as file:
+        file.write("not\ta\trow\tof data\n")
+    _, data = read_sto(filename, ["pelvis_Y"])
+    assert np.array_equal(data["pelvis_Y"], expected[:, 2])
+    chunks = [chunk["pelvis_Y"] for _, chunk in iter_sto_chunks(filename, ["pelvis_Y"], chunk_rows=33)]
+    assert np.array_equal(np.concatenate(chunks), expected[:, 2])
+
+
+def test_file_without_endheader(tmp_path):
+    filename = str(tmp_path / "no_header.sto")
+    with open(filename, "w") as file:
+        file.write("\t".join(labels) + "\n0.00\t1\t2\t3\n0.01\t4\t5\t6\n")
+    header, data = read_sto(filename, ["pelvis_Y"])
+    assert header["header_lines"] == 1
+    assert np.array_equal(data["pelvis_Y"], [2, 5])
+
+
+def test_chunks_match_read_sto(tmp_path):
+    filename, _ = synthetic_sto(tmp_path)
+    _, data = read_sto(filename, skip_lines=20)
+    chunks = [chunk for _, chunk in iter_sto_chunks(filename, chunk_rows=50, skip_lines=20)]
+    for column in labels:
+        assert np.array_equal(np.concatenate([chunk[column] for chunk in chunks]), data[column])
+
+
+def test_wrong_ncolumns_and_missing_columns(tmp_path):
+    filename, _ = synthetic_sto(tmp_path)
+    with pytest.raises(ValueError):
+        read_sto(filename, ["pelvis_W"])
+    with open(filename, "r") as file:
+        text = file.read()
+    with open(filename, "w") as file:
+        file.write(text.replace("nColumns=4", "nColumns=5"))
+    with pytest.raises(ValueError):
+        read_sto(filename)
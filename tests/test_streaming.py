@@ -0,0 +1,29 @@
+import numpy as np
+from benchmarks.synthetic_data import generate_trial
+from metrics_engine import calculate_trial_metrics
+from streaming import stream_trial_metrics
+
+point_dict = {"point1": [0, 400], "point2": [450, 1200], "point3": [1300, 2400, 1500, 1700], "point4": [2300, 2600]}
+
+
+def test_streaming_matches_reading_the_whole_trial(tmp_path):
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=2500, bodies=["pelvis"], seed=3)
+    for rows_to_skip in [0, 35]:
+        in_memory = calculate_trial_metrics("trial_01", point_dict, kinematics_folder, "pelvis", 70, rows_to_skip)
+        # chunks that don't line up with the points, the slice or the rows skipped
+        streamed = stream_trial_metrics("trial_01", point_dict, kinematics_folder, "pelvis", 70, rows_to_skip, chunk_rows=97)
+        assert streamed.keys() == in_memory.keys()
+        for point in point_dict:
+            for metric, value in in_memory[point].items():
+                assert np.isclose(streamed[point][metric], value), (point, metric)
+
+
+def test_distance_covered_matches_the_positions_in_the_file(tmp_path):
+    kinematics_folder = str(tmp_path)
+    pos_file = generate_trial(kinematics_folder, "01", frames=1000, bodies=["pelvis"], seed=4)[0]
+    # time and the X, Y and Z position of the pelvis, after the header of the synthetic files
+    position = np.loadtxt(pos_file, skiprows=11, usecols=[1, 2, 3])
+    expected = np.linalg.norm(np.diff(position[1:400], axis=0), axis=1).sum()
+    streamed = stream_trial_metrics("trial_01", {"point1": [0, 400]}, kinematics_folder, "pelvis", 70, 0, chunk_rows=64)
+    assert np.isclose(streamed["point1"]["Distance Covered"], expected)
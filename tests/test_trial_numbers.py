@@ -0,0 +1,33 @@
+import os
+import numpy as np
+from benchmarks.synthetic_data import generate_trial
+from trial_files import find_trial_files, trial_number_of
+from metrics_engine import calculate_trial_metrics
+
+
+def test_trial_number_of():
+    assert trial_number_of("trial_01") == 1
+    assert trial_number_of("trial_101") == 101
+
+
+def test_trial_01_and_trial_101_are_kept_apart(tmp_path):
+    # the two trials have different data, so their metrics can only match if one trial's files are read for the other
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=500, bodies=["pelvis"], seed=1)
+    generate_trial(kinematics_folder, "101", frames=500, bodies=["pelvis"], seed=2)
+    assert find_trial_files(kinematics_folder, 1) != find_trial_files(kinematics_folder, 101)
+
+    point_dict = {"point1": [0, 400]}
+    trial_01 = calculate_trial_metrics("trial_01", point_dict, kinematics_folder, "pelvis", 70, 0)
+    trial_101 = calculate_trial_metrics("trial_101", point_dict, kinematics_folder, "pelvis", 70, 0)
+    assert not np.isclose(trial_01["point1"]["Distance Covered"], trial_101["point1"]["Distance Covered"])
+    assert trial_101["point1"]["Distance Covered"] > 0
+
+
+def test_other_names_are_still_found(tmp_path, capsys):
+    kinematics_folder = str(tmp_path)
+    pos_file, vel_file = generate_trial(kinematics_folder, "02", frames=500, bodies=["pelvis"], seed=3)
+    renamed = str(tmp_path / "BodyKinematics_pos_global_trial02.sto")
+    os.rename(pos_file, renamed)
+    assert find_trial_files(kinematics_folder, 2) == {"pos_global": renamed, "vel_global": vel_file}
+    assert "Warning" in capsys.readouterr().out
@@ -0,0 +1,24 @@
+import numpy as np
+from benchmarks.synthetic_data import generate_trial
+from metrics_engine import calculate_trial_metrics
+from write_results import extract_metrics_for_each_point
+
+trial_dict = {"trial_01": {"point1": [0, 300]}, "trial_02": {"point1": [0, 300]}}
+
+
+def test_trial_without_frames_is_an_error(tmp_path):
+    kinematics_folder = str(tmp_path)
+    generate_trial(kinematics_folder, "01", frames=500, bodies=["pelvis"], seed=1)
+    pos_file = generate_trial(kinematics_folder, "02", frames=500, bodies=["pelvis"], seed=2)[0]
+    # keep only the header of trial_02's position file
+    with open(pos_file, "r") as file:
+        header = file.readlines()[:11]
+    with open(pos_file, "w") as file:
+        file.writelines(header)
+
+    expected = calculate_trial_metrics("trial_01", trial_dict["trial_01"], kinematics_folder, "pelvis", 70, 0)
+    for streaming in [False, True]:
+        metrics_dict = extract_metrics_for_each_point(kinematics_folder, trial_dict, 1, "pelvis", 70, 0, streaming)
+        # trial_02 is left out rather than written as zeros
+        assert list(metrics_dict) == ["trial_01"]
+        assert np.isclose(metrics_dict["trial_01"]["point1"]["Distance Covered"], expected["point1"]["Distance Covered"])
@@ -0,0 +1,141 @@
+import os
+from collections import OrderedDict
+from config import trial_cache_max_entries, trial_cache_max_bytes
+
+
+# Process-wide cache of parsed trials - the least recently used trial is evicted first
+_trial_cache = OrderedDict()
+_cache_stats = {"hits": 0, "misses": 0, "bytes": 0}
+# Objects calculated from a cached trial (e.g. its energies and TrialIndex) - they are removed together with the trial
+_derived_cache = {}
+
+
+def trial_cache_key(kinematics_folder, trial_number, keypoint, rows_of_data_to_skip, planes, filelist, settings=None):
+    """ Creates the key used to store a parsed trial in the cache.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_number: string or int of the trial number
+    keypoint: string of the keypoint extracted
+    rows_of_data_to_skip: int of the number of rows skipped in the data
+    planes: list of strings of the planes extracted
+    filelist: list of the .sto files the trial was parsed from
+    settings: dictionary of any other settings the parsed trial depends on, e.g. the filter (default is None)
+    ----------
+    Returns
+    A tuple that changes whenever any of the inputs or the modification time of the files change
+    """
+    file_mtimes = tuple((filename, os.stat(filename).st_mtime_ns) for filename in sorted(filelist))
+    settings = tuple(sorted(settings.items())) if settings else ()
+    # "01" and 1 are the same trial
+    return (os.path.abspath(kinematics_folder), int(trial_number), keypoint, rows_of_data_to_skip, tuple(planes), file_mtimes, settings)
+
+
+def get_cached_trial(key):
+    """ Returns the cached TrialKinematics for the key, or None if the trial has not been cached. """
+    trial_kinematics = _trial_cache.get(key)
+    if trial_kinematics is None:
+        _cache_stats["misses"] += 1
+        return None
+    _cache_stats["hits"] += 1
+    # mark the trial as the most recently used
+    _trial_cache.move_to_end(key)
+    return trial_kinematics
+
+
+def is_trial_cached(key):
+    """ Returns whether a trial is in the cache, without counting a hit or miss or changing which trial is evicted next. """
+    return key in _trial_cache
+
+
+def cache_trial(key, trial_kinematics):
+    """ Stores a trial in the cache, made read-only, and evicts the least recently used trials if the cache is full.
+    ----------
+    Parameters
+    key: tuple created by trial_cache_key
+    trial_kinematics: TrialKinematics of the parsed trial
+    ----------
+    Returns
+    The read-only TrialKinematics that was stored in the cache
+    """
+    # the arrays cannot be written to, so callers cannot change the trial for each other
+    trial_kinematics.set_read_only()
+
+    if key in _trial_cache:
+        _remove_entry(key)
+    _trial_cache[key] = trial_kinematics
+    _derived_cache[id(trial_kinematics)] = {}
+    _cache_stats["bytes"] += trial_kinematics.nbytes
+
+    _evict()
+    return trial_kinematics
+
+
+def _evict():
+    # evict the least recently used trials, always keeping the most recently used trial
+    while len(_trial_cache) > 1 and (len(_trial_cache) > trial_cache_max_entries or _cache_stats["bytes"] > trial_cache_max_bytes):
+        _remove_entry(next(iter(_trial_cache)))
+
+
+def _derived_nbytes(trial_kinematics, value):
+    """ Returns the bytes of a derived object that are not shared with the trial it was calculated from. """
+    nbytes = getattr(value, "nbytes", 0)
+    # the trial with its energies added shares the arrays of the trial, so only the energies are counted
+    if getattr(value, "values", None) is trial_kinematics.values:
+        nbytes -= trial_kinematics.values.nbytes
+    return nbytes
+
+
+def _remove_entry(key):
+    trial_kinematics = _trial_cache.pop(key)
+    derived = _derived_cache.pop(id(trial_kinematics), {})
+    _cache_stats["bytes"] -= trial_kinematics.nbytes + sum(_derived_nbytes(trial_kinematics, value) for value in derived.values())
+
+
+def get_derived(trial_kinematics, name):
+    """ Returns an object calculated from a cached trial and stored with store_derived, or None if there isn't one. """
+    return _derived_cache.get(id(trial_kinematics), {}).get(name)
+
+
+def store_derived(trial_kinematics, name, value):
+    """ Stores an object calculated from a cached trial, so it is kept for as long as the trial is cached.
+    Its size (its nbytes) counts towards the size of the cache. Nothing is stored if the trial is not in the cache.
+    """
+    derived = _derived_cache.get(id(trial_kinematics))
+    if derived is None:
+        return
+    if name in derived:
+        _cache_stats["bytes"] -= _derived_nbytes(trial_kinematics, derived[name])
+    derived[name] = value
+    # the derived objects count towards trial_cache_max_bytes, as they are kept for as long as the trial
+    _cache_stats["bytes"] += _derived_nbytes(trial_kinematics, value)
+    _evict()
+
+
+def invalidate_trial(kinematics_folder, trial_number=None):
+    """ Removes the cached trials of a kinematics folder from the cache.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_number: string or int of the trial number to remove (default is None - removes every trial in the folder)
+    ----------
+    Returns
+    int of the number of cached trials that were removed
+    """
+    folder = os.path.abspath(kinematics_folder)
+    keys = [key for key in _trial_cache if key[0] == folder and (trial_number is None or key[1] == int(trial_number))]
+    for key in keys:
+        _remove_entry(key)
+    return len(keys)
+
+
+def clear_trial_cache():
+    """ Removes every trial from the cache and resets the hit and miss counters. """
+    _trial_cache.clear()
+    _derived_cache.clear()
+    _cache_stats.update({"hits": 0, "misses": 0, "bytes": 0})
+
+
+def trial_cache_info():
+    """ Returns a dictionary of the cache hits, misses, number of cached trials and their size in bytes. """
+    return {"hits": _cache_stats["hits"], "misses": _cache_stats["misses"], "entries": len(_trial_cache), "bytes": _cache_stats["bytes"]}
@@ -0,0 +1,93 @@
+import os
+import re
+from instrumentation import stage
+
+
+# OpenSim BodyKinematics output files, e.g. trial_01_BodyKinematics_pos_global.sto - the trial number is the last number before BodyKinematics
+_trial_file_pattern = re.compile(r"^(?P<name>.*?)(?P<trial>\d+)_?BodyKinematics_(?P<file_type>[A-Za-z]+_[A-Za-z]+)\.sto$")
+# Global files with other names are still used for every trial number in their name, as they were before the files were indexed
+_fallback_file_types = ["pos_global", "vel_global"]
+
+# Index of each kinematics folder - {folder: {"mtime_ns": ..., "trials": {trial: {file_type: path}}}}
+_folder_index = {}
+
+
+def parse_trial_filename(filename):
+    """ Parses the name of an OpenSim BodyKinematics file.
+    ----------
+    Parameters
+    filename: string of the name of the file, e.g. "trial_01_BodyKinematics_pos_global.sto"
+    ----------
+    Returns
+    A tuple of the trial number (int) and the file type (e.g. "pos_global", "vel_global", "acc_local"), or None if it is not a BodyKinematics file
+    """
+    match = _trial_file_pattern.match(os.path.basename(filename))
+    if match is None:
+        return None
+    return int(match.group("trial")), match.group("file_type")
+
+
+def index_trial_files(kinematics_folder):
+    """ Returns the files of every trial in a kinematics folder, listing the folder again only if it has changed.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    ----------
+    Returns
+    A dictionary of the files of each trial number, e.g. {1: {"pos_global": ".../trial_01_BodyKinematics_pos_global.sto", "vel_global": ...}}
+    """
+    folder = os.path.abspath(kinematics_folder)
+    # adding, removing or renaming a file changes the modification time of the folder
+    mtime_ns = os.stat(folder).st_mtime_ns
+    folder_index = _folder_index.get(folder)
+    if folder_index is not None and folder_index["mtime_ns"] == mtime_ns:
+        return folder_index["trials"]
+
+    trials = {}
+    unmatched = []
+    for filename in sorted(os.listdir(folder)):
+        parsed = parse_trial_filename(filename)
+        if parsed is not None:
+            trial, file_type = parsed
+            trials.setdefault(trial, {})[file_type] = os.path.join(kinematics_folder, filename)
+        else:
+            unmatched.append(filename)
+    for filename in unmatched:
+        file_type = next((file_type for file_type in _fallback_file_types if f"BodyKinematics_{file_type}" in filename), None)
+        trial_numbers = sorted({int(number) for number in re.findall(r"\d+", filename)})
+        if file_type is None or not trial_numbers:
+            continue
+        print(f"Warning: {filename} is not named like trial_01_BodyKinematics_{file_type}.sto. "
+              f"Using it as the {file_type} file of trial number {' or '.join(str(trial) for trial in trial_numbers)} - rename it to be sure it is used for the right trial.")
+        # a file named in the expected way takes priority
+        for trial in trial_numbers:
+            trials.setdefault(trial, {}).setdefault(file_type, os.path.join(kinematics_folder, filename))
+    _folder_index[folder] = {"mtime_ns": mtime_ns, "trials": trials}
+    return trials
+
+
+def trial_number_of(trial):
+    """ Returns the trial number (int) of a trial in the trial dictionary, e.g. 101 for "trial_101" - the whole number, not just its last two digits. """
+    return int(trial[len("trial_"):])
+
+
+def find_trial_files(kinematics_folder, trial_number):
+    """ Returns the files of a trial from the folder index.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_number: string or int of the trial number, e.g. "01" - it must match exactly, so "01" does not find trial 101
+    ----------
+    Returns
+    A dictionary of the path of each file type of the trial, e.g. {"pos_global": ..., "vel_global": ...} (empty if there are no files)
+    """
+    with stage("file discovery"):
+        return index_trial_files(kinematics_folder).get(int(trial_number), {})
+
+
+def clear_trial_file_index(kinematics_folder=None):
+    """ Removes a folder (default is every folder) from the index, so it is listed again the next time it is used. """
+    if kinematics_folder is None:
+        _folder_index.clear()
+    else:
+        _folder_index.pop(os.path.abspath(kinematics_folder), None)
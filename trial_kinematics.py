@@ -0,0 +1,128 @@
+import numpy as np
+
+
+class TrialKinematics:
+    """ The kinematics of a keypoint in a trial, stored as one contiguous array with a row for each quantity.
+    time, position, velocity and acceleration (and the energies, once added) are views of that array,
+    so the metrics work on NumPy arrays directly and to_dataframe shares the data instead of copying it.
+    """
+
+    __slots__ = ("keypoint", "planes", "first_frame", "values", "energies")
+
+    # rows of the energies array, in the order of the columns added by calculate_mech_energies
+    energy_columns = ["Resultant Velocity (m/s)", "Potential Energy (J)", "Kinetic Energy (J)", "Total Energy (J)", "Change in Total Energy (J)"]
+
+    def __init__(self, keypoint, planes, first_frame, values, energies=None):
+        """
+        ----------
+        Parameters
+        keypoint: string of the keypoint
+        planes: list of strings of the planes, e.g. ["X", "Y", "Z"]
+        first_frame: int of the frame number of the first row (the number of rows skipped in the data)
+        values: numpy array of time, the position in each plane and then the velocity and acceleration of each plane in turn (rows x frames)
+        energies: numpy array of the energy_columns (rows x frames) (default is None - the energies have not been calculated)
+        """
+        self.keypoint = keypoint
+        self.planes = list(planes)
+        self.first_frame = first_frame
+        self.values = values
+        self.energies = energies
+
+    @classmethod
+    def from_arrays(cls, keypoint, planes, first_frame, time, position, velocity):
+        """ Creates the kinematics of a trial from its time (frames), position and velocity (frames x planes), calculating the acceleration.
+        The acceleration of the first frame is NaN, as it has no frame before it.
+        """
+        n_planes = len(planes)
+        values = np.empty((1 + 3 * n_planes, len(time)))
+        values[0] = time
+        values[1:1 + n_planes] = position.T
+        # the velocity and acceleration of each plane alternate, as the columns of the dataframe do
+        velocity_rows = values[1 + n_planes::2]
+        acceleration_rows = values[2 + n_planes::2]
+        velocity_rows[:] = velocity.T
+        acceleration_rows[:, :1] = np.nan
+        acceleration_rows[:, 1:] = np.diff(velocity_rows, axis=1) / np.diff(values[0])
+        return cls(keypoint, planes, first_frame, values)
+
+    @property
+    def time(self):
+        return self.values[0]
+
+    @property
+    def position(self):
+        """ numpy array of the position (frames x planes) - a view of the trial's data. """
+        return self.values[1:1 + len(self.planes)].T
+
+    @property
+    def velocity(self):
+        """ numpy array of the velocity (frames x planes) - a view of the trial's data. """
+        return self.values[1 + len(self.planes)::2].T
+
+    @property
+    def acceleration(self):
+        """ numpy array of the acceleration (frames x planes) - a view of the trial's data. """
+        return self.values[2 + len(self.planes)::2].T
+
+    @property
+    def delta_total_energy(self):
+        """ numpy array of the change in total energy of each frame (None if the energies have not been calculated). """
+        return None if self.energies is None else self.energies[4]
+
+    @property
+    def nbytes(self):
+        return self.values.nbytes + (0 if self.energies is None else self.energies.nbytes)
+
+    def __len__(self):
+        return self.values.shape[1]
+
+    def set_read_only(self):
+        """ Stops the arrays being changed, so a trial shared through the trial cache is the same for every caller. """
+        self.values.flags.writeable = False
+        if self.energies is not None:
+            self.energies.flags.writeable = False
+        return self
+
+    def with_energies(self, participant_mass):
+        """ Returns the kinematics with the potential, kinetic and total energy of the keypoint added, sharing the arrays of this trial.
+        ----------
+        Parameters
+        participant_mass: mass of the participant in kg
+        ----------
+        Returns
+        A TrialKinematics with the energies array
+        """
+        velocity = self.velocity
+        energies = np.empty((len(self.energy_columns), len(self)))
+        # resultant velocity
+        energies[0] = np.sqrt(velocity[:, 0]**2 + velocity[:, 1]**2 + velocity[:, 2]**2)
+        #potential_energy = mass * g * height (Y-axis)
+        energies[1] = participant_mass * 9.81 * self.position[:, self.planes.index("Y")]
+        #kinetic_energy = 0.5 * mass * velocity^2
+        energies[2] = 0.5 * participant_mass * energies[0]**2
+        #total energy = pe + ke
+        energies[3] = energies[1] + energies[2]
+        # change in total energy - the first frame has no frame before it
+        energies[4, :1] = np.nan
+        energies[4, 1:] = np.diff(energies[3])
+        return TrialKinematics(self.keypoint, self.planes, self.first_frame, self.values, energies)
+
+    def columns(self):
+        """ Returns the names of the columns of to_dataframe. """
+        columns = ["time"] + [f"{self.keypoint}_{plane} (m)" for plane in self.planes]
+        for plane in self.planes:
+            columns += [f"{self.keypoint}_{plane} (m/s)", f"{self.keypoint}_{plane} (m/s^2)"]
+        return columns
+
+    def to_dataframe(self):
+        """ Returns the trial as a dataframe that shares the arrays of the trial, in the format of create_kinematics_dataframe
+        (and calculate_mech_energies once the energies have been added). Frames keep the numbering they had before the skipped rows were removed.
+        """
+        # the arrays don't need pandas, so it is only imported for the dataframe view
+        import pandas as pd
+        index = pd.RangeIndex(self.first_frame, self.first_frame + len(self))
+        kinematics_df = pd.DataFrame(self.values.T, index=index, columns=self.columns(), copy=False)
+        if self.energies is None:
+            return kinematics_df
+        energies_df = pd.DataFrame(self.energies.T, index=index, columns=self.energy_columns, copy=False)
+        return pd.concat([kinematics_df, energies_df], axis=1)
@@ -1,126 +1,219 @@
 import os
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
+import json
+import hashlib
 from full_body_kinematics import create_kinematics_dataframe, calculate_mech_energies
-from config import kinematics_folder, keypoint, csv_file, sheet_name, plot_path, plot_data, rows_to_skip
+from trial_files import find_trial_files, trial_number_of
+from config import kinematics_folder, keypoint, participant_mass, csv_file, sheet_name, plot_path, plot_data, rows_to_skip, n_workers, plot_dpi, plot_format, plot_multi_panel
 from point_dict_creator import create_point_dict
+from parallel import run_for_each_trial
+from instrumentation import stage, print_instrumentation_summary, instrumentation_is_enabled
+from signal_filter import filter_settings
 
-def generate_plots_in_loop(kinematics_folder, trial_dict, data_type, file_path):
+# The columns, legend labels and y-axis label of each type of plot, and the number of frames left off the end of each point
+plot_types = {
+    "Position": {"columns": [f"{keypoint}_X (m)", f"{keypoint}_Y (m)", f"{keypoint}_Z (m)"], "labels": ["X Position", "Y Position", "Z Position"], "ylabel": "Position (m)", "end_offset": 0},
+    "Velocity": {"columns": [f"{keypoint}_X (m/s)", f"{keypoint}_Y (m/s)", f"{keypoint}_Z (m/s)"], "labels": ["X Velocity", "Y Velocity", "Z Velocity"], "ylabel": "Velocity (m/s)", "end_offset": 0},
+    "Acceleration": {"columns": [f"{keypoint}_X (m/s^2)", f"{keypoint}_Y (m/s^2)", f"{keypoint}_Z (m/s^2)"], "labels": ["X Acceleration", "Y Acceleration", "Z Acceleration"], "ylabel": "Acceleration (m/s^2)", "end_offset": 1},
+    "Energy": {"columns": ["Potential Energy (J)", "Kinetic Energy (J)", "Total Energy (J)"], "labels": ["Potential Energy", "Kinetic Energy", "Total Energy"], "ylabel": "Energy (J)", "end_offset": 0},
+}
+line_styles = ["dashed", "dotted", "solid"]
+
+# Name of the file in each plot folder that records the inputs of every plot saved there
+plot_manifest_name = ".plot_manifest.json"
+
+# The font is looked up once in each process and reused for every plot
+_plot_font = {}
+
+
+def get_plot_font():
+    """ Returns the Times New Roman font used for the plots, looking it up the first time it is used in the process. """
+    if "font" not in _plot_font:
+        from matplotlib.font_manager import FontProperties, findfont
+        _plot_font["font"] = FontProperties(fname=findfont(FontProperties(family="Times New Roman")), size=12)
+    return _plot_font["font"]
+
+
+def plot_signature(trial_files, point_frames, data_type, dpi, file_format):
+    """ Returns a hash of everything a plot depends on, so a plot is only drawn again when one of them changes.
+    ----------
+    Parameters
+    trial_files: dictionary of the .sto files of the trial, created by find_trial_files
+    point_frames: list of the start and end frames of the point
+    data_type: string of the data plotted
+    dpi: int of the resolution of the plot
+    file_format: string of the format of the plot, e.g. "png"
+    ----------
+    Returns
+    string of the hash
+    """
+    files = [(trial_files[file_type], os.stat(trial_files[file_type]).st_mtime_ns, os.stat(trial_files[file_type]).st_size) for file_type in ["pos_global", "vel_global"] if file_type in trial_files]
+    inputs = [files, [int(frame) for frame in point_frames], data_type, keypoint, rows_to_skip, participant_mass, dpi, file_format]
+    # the filter is only added when it is on, so plots drawn before filtering was added are still up to date
+    if filter_settings() is not None:
+        inputs.append(filter_settings())
+    return hashlib.sha1(json.dumps(inputs).encode()).hexdigest()
+
+
+def draw_point_plot(ax, point_df, trial_number, point_num, point_frames, data_type):
+    """ Draws the data of a point on a set of axes.
+    ---------
+    Parameters
+    ax: matplotlib axes to draw on
+    point_df: dataframe of the frames of the point, sliced from the dataframe created by calculate_mech_energies
+    trial_number: string of the trial in the trial dictionary, e.g. "trial_01"
+    point_num: string of the point, e.g. "point1"
+    point_frames: int of the number of frames in the point (end frame - start frame)
+    data_type: string of the data to plot - Position, Velocity, Acceleration or Energy
+    """
+    plot_type = plot_types[data_type]
+    font = get_plot_font()
+    point_df = point_df.iloc[:max(point_frames - plot_type["end_offset"], 0)]
+    time = point_df['time']
+    # Calculate the offset to adjust the time values
+    time_offset = time.iloc[0]
+    # Subtract the offset from all the time values
+    time = time - time_offset
+    for column, label, line_style in zip(plot_type["columns"], plot_type["labels"], line_styles):
+        ax.plot(time, point_df[column], label=label, color='black', linestyle=line_style)
+    ax.set_title(f'{trial_number} {point_num} - {data_type} vs Time', fontproperties=font)
+    ax.set_xlabel('Time (s)', fontproperties=font)
+    ax.set_ylabel(plot_type["ylabel"], fontproperties=font)
+    ax.legend(prop=font)
+    # Setting font properties for the tick labels, including ticks added when the axes are rescaled
+    ax.tick_params(labelfontfamily=font.get_name(), labelsize=font.get_size())
+
+
+def generate_plots_for_trial(trial_number, trial_points, kinematics_folder, data_types, file_path, dpi = plot_dpi, file_format = plot_format, manifest = None, multi_panel = plot_multi_panel):
+    """
+    Generate the plots of each point of a trial from one load of the trial and store them in a folder.
+    ---------
+    Parameters
+    trial_number: string of the trial in the trial dictionary, e.g. "trial_01"
+    trial_points: dictionary of the points in the trial
+    kinematics_folder: Folder containing kinematics files.
+    data_types: string or list of strings of the data to plot - Position, Velocity, Acceleration or Energy
+    file_path: Folder to save the plots in.
+    dpi: Resolution of the plots (default is plot_dpi from the config file).
+    file_format: Format of the plots - png, svg or pdf (default is plot_format from the config file).
+    manifest: Dictionary of the signature of each plot already in the folder - plots whose inputs are unchanged are skipped (default is None - draw every plot).
+    multi_panel: Whether to draw every data type of a point as a panel of one figure instead of a figure each (default is plot_multi_panel from the config file).
+    --------
+    Returns
+    Dictionary of the signature of each plot saved for the trial.
+    """
+    if isinstance(data_types, str):
+        data_types = [data_types]
+    if not data_types or any(data_type not in plot_types for data_type in data_types):
+        print("Make sure you have entered a suitable data type into the config file. Options are: 'Position', 'Velocity', 'Acceleration' or 'Energy'")
+        return {}
+    trial_num = trial_number_of(trial_number)
+    trial_files = find_trial_files(kinematics_folder, trial_num)
+    manifest = manifest or {}
+    # a multi-panel figure is one plot of every data type
+    figures = [list(data_types)] if multi_panel else [[data_type] for data_type in data_types]
+
+    # only the plots that are missing or out of date are drawn
+    plots_to_draw = {}
+    for point_num, point_frames in trial_points.items():
+        for figure_types in figures:
+            file_name = f"{trial_number}_{point_num}_{'_'.join(figure_types)}.{file_format}"
+            signature = plot_signature(trial_files, point_frames, figure_types if multi_panel else figure_types[0], dpi, file_format)
+            if manifest.get(file_name) == signature and os.path.exists(os.path.join(file_path, file_name)):
+                continue
+            plots_to_draw.setdefault(point_num, []).append((figure_types, file_name, signature))
+    if not plots_to_draw:
+        return {}
+
+    # the trial is loaded once for every plot of every point
+    df = calculate_mech_energies(kinematics_folder, trial_num)
+    if df is None:
+        print(f"No data for Trial Number {trial_number}. Skipping...")
+        return {}
+
+    from matplotlib.figure import Figure
+    saved = {}
+    for point_num, point_plots in plots_to_draw.items():
+        point_start = trial_points[point_num][0]
+        point_end = trial_points[point_num][1]
+        # slice the point once and draw each of its plots from the slice
+        point_df = df.iloc[point_start:point_end]
+        for figure_types, file_name, signature in point_plots:
+            with stage("plot render"):
+                # a Figure that is not managed by pyplot is freed as soon as it is no longer used
+                fig = Figure(figsize=(6.4, 4.8 * len(figure_types)))
+                for ax, data_type in zip(fig.subplots(len(figure_types), 1, squeeze=False)[:, 0], figure_types):
+                    draw_point_plot(ax, point_df, trial_number, point_num, point_end - point_start, data_type)
+                if len(figure_types) > 1:
+                    fig.tight_layout()
+
+                #save fig to file path location
+                fig.savefig(os.path.join(file_path, file_name), dpi = dpi, format = file_format)
+            print("Plot saved as: ", file_name)
+            saved[file_name] = signature
+    return saved
+
+
+def load_plot_manifest(file_path):
+    """ Returns the signature of each plot saved in a folder, or an empty dictionary if there is none. """
+    try:
+        with open(os.path.join(file_path, plot_manifest_name), "r") as file:
+            return json.load(file)
+    except (OSError, ValueError):
+        return {}
+
+
+def write_plot_manifest(file_path, manifest):
+    """ Writes the signature of each plot saved in a folder. """
+    temp_file = os.path.join(file_path, plot_manifest_name + ".tmp")
+    with open(temp_file, "w") as file:
+        json.dump(manifest, file, indent=1)
+    os.replace(temp_file, os.path.join(file_path, plot_manifest_name))
+
+
+def generate_plots_in_loop(kinematics_folder, trial_dict, data_types, file_path, workers = n_workers, dpi = plot_dpi, file_format = plot_format, resume = True, multi_panel = plot_multi_panel):
     """
     Generate plots for each trial number and store them in a folder.
     ---------
     Parameters
     kinematics_folder: Folder containing kinematics files.
     trial_numbers: List of trial numbers - strings
+    data_types: string or list of strings of the data to plot - every type is drawn from one load of each trial
+    workers: Number of processes used to plot the trials in parallel (default is n_workers from the config file).
+    dpi: Resolution of the plots (default is plot_dpi from the config file).
+    file_format: Format of the plots - png, svg or pdf (default is plot_format from the config file).
+    resume: Whether to skip plots that already exist and whose data and settings are unchanged (default is True).
+    multi_panel: Whether to draw every data type of a point as a panel of one figure (default is plot_multi_panel from the config file).
     --------
     Returns
     Folder of plots generated for each point.
     """
-    plots = []  # List to store the plots
-    rows_of_data_to_skip = rows_to_skip
-
-    #iterate through the trial dict and plot the graphs for the specified metric
-    for trial_number in trial_dict:
-        trial_num = trial_number[-2:]
-        df = calculate_mech_energies(kinematics_folder, trial_num)
-        if df is None:
-            print(f"No data for Trial Number {trial_number}. Skipping...")
-            continue        
-        trial_points = trial_dict[trial_number]
-        for point_num in trial_points:
-            point_start = trial_points[point_num][0]
-            point_end = trial_points[point_num][1]
-            if data_type == "Position":
-                time = df['time'].iloc[point_start:point_end]
-                # Calculate the offset to adjust the time values
-                time_offset = time.iloc[0]
-                # Subtract the offset from all the time values
-                time -= time_offset
-                x_position = df[f'{keypoint}_X (m)'].iloc[point_start:point_end]
-                y_position = df[f'{keypoint}_Y (m)'].iloc[point_start:point_end]
-                z_position = df[f'{keypoint}_Z (m)'].iloc[point_start:point_end]
-                plt.figure()
-                plt.plot(time, x_position, label='X Position', color='black', linestyle='dashed')
-                plt.plot(time, y_position, label='Y Position', color='black', linestyle='dotted')
-                plt.plot(time, z_position, label='Z Position', color='black', linestyle='solid')
-                plt.title(f'{trial_number} {point_num} - Position vs Time', fontsize=12, font = 'Times New Roman')
-                plt.xlabel('Time (s)', fontsize=12, font = 'Times New Roman')
-                plt.ylabel("Position (m)", fontsize=12, font = 'Times New Roman')
-                plt.legend()
-            elif data_type == "Velocity":
-                time = df['time'].iloc[point_start:point_end]
-                # Calculate the offset to adjust the time values
-                time_offset = time.iloc[0]
-                # Subtract the offset from all the time values
-                time -= time_offset
-                x_velocity = df[f'{keypoint}_X (m/s)'].iloc[point_start:point_end]
-                y_velocity = df[f'{keypoint}_Y (m/s)'].iloc[point_start:point_end]
-                z_velocity = df[f'{keypoint}_Z (m/s)'].iloc[point_start:point_end]
-                plt.figure()
-                plt.plot(time, x_velocity, label='X Velocity', color='black', linestyle='dashed')
-                plt.plot(time, y_velocity, label='Y Velocity', color='black', linestyle='dotted')
-                plt.plot(time, z_velocity, label='Z Velocity', color='black', linestyle='solid')
-                plt.title(f'{trial_number} {point_num} - Velocity vs Time', fontsize=12, font = 'Times New Roman')
-                plt.xlabel('Time (s)', fontsize=12, font = 'Times New Roman')
-                plt.ylabel("Velocity (m/s)", fontsize=12, font = 'Times New Roman')
-                plt.legend(prop={'family' : 'Times New Roman', 'size'   : 12})
-            elif data_type == "Acceleration":
-                time = df['time'].iloc[point_start:point_end-1]
-                # Calculate the offset to adjust the time values
-                time_offset = time.iloc[0]
-                # Subtract the offset from all the time values
-                time -= time_offset
-                x_acceleration = df[f'{keypoint}_X (m/s^2)'].iloc[point_start:point_end-1]
-                y_acceleration = df[f'{keypoint}_Y (m/s^2)'].iloc[point_start:point_end-1]
-                z_acceleration = df[f'{keypoint}_Z (m/s^2)'].iloc[point_start:point_end-1]
-                plt.figure()
-                plt.plot(time, x_acceleration, label='X Acceleration', color='black', linestyle='dashed')
-                plt.plot(time, y_acceleration, label='Y Acceleration', color='black', linestyle='dotted')
-                plt.plot(time, z_acceleration, label='Z Acceleration', color='black', linestyle='solid')
-                plt.title(f'{trial_number} {point_num} - Acceleration vs Time', fontsize=12, font = 'Times New Roman')
-                plt.xlabel('Time (s)', fontsize=12, font = 'Times New Roman')
-                plt.ylabel("Acceleration (m/s^2)", fontsize=12, font = 'Times New Roman')
-                plt.legend(prop={'family' : 'Times New Roman', 'size'   : 12})
-            elif data_type == "Energy":
-                time = df['time'].iloc[point_start:point_end]
-                # Calculate the offset to adjust the time values
-                time_offset = time.iloc[0]
-                # Subtract the offset from all the time values
-                time -= time_offset
-                pe = df['Potential Energy (J)'].iloc[point_start:point_end]
-                ke = df['Kinetic Energy (J)'].iloc[point_start:point_end]
-                te = df['Total Energy (J)'].iloc[point_start:point_end]
-                plt.figure()
-                plt.plot(time, pe, label='Potential Energy',color='black', linestyle='dashed')
-                plt.plot(time, ke, label='Kinetic Energy', color='black', linestyle='dotted')
-                plt.plot(time, te, label='Total Energy', color='black', linestyle='solid')
-                plt.title(f'{trial_number} {point_num} - Energy vs Time', fontsize=12, font = 'Times New Roman')
-                plt.xlabel('Time (s)', fontsize=12, font = 'Times New Roman')
-                plt.ylabel('Energy (J)', fontsize=12, font = 'Times New Roman')
-                plt.legend(prop={'family' : 'Times New Roman', 'size' : 12})
-                ax = plt.gca()
-                    # Setting font properties for the tick labels
-                ax.tick_params(axis='both', which='major', labelsize=12, labelcolor='black', labelfontfamily='Times New Roman')
-    
-            else:
-                print("Make sure you have entered a suitable data type into the config file. Options are: 'Position', 'Velocity', 'Acceleration' or 'Energy'")
-
-            #save fig to file path location
-            file_name = f"{trial_number}_{point_num}_{data_type}.png"
-            plt.savefig(os.path.join(file_path, file_name), dpi = 1200)
-            print("Plot saved as: ", file_name)
-            plt.close()
-            
-    
-    print(f"All plots of {data_type} saved in {file_path}.")
+    os.makedirs(file_path, exist_ok=True)
+    manifest = load_plot_manifest(file_path)
+
+    def save_trial(trial, saved):
+        # the workers return the plots they saved, so only this process writes the manifest -
+        # it is written after each trial, so a run that stops partway keeps the plots it finished
+        manifest.update(saved)
+        write_plot_manifest(file_path, manifest)
+
+    #plot the graphs of each trial for the specified metric
+    results, errors = run_for_each_trial(generate_plots_for_trial, trial_dict, (kinematics_folder, data_types, file_path, dpi, file_format, manifest if resume else None, multi_panel), workers, on_result=save_trial)
+    saved_plots = sum(len(saved) for saved in results.values())
+
+    data_names = data_types if isinstance(data_types, str) else ", ".join(data_types)
+    print(f"All plots of {data_names} saved in {file_path} ({saved_plots} drawn, the rest were unchanged).")
 
-# Get the point directory using the csv file and sheetname from the directory
-trial_dict = create_point_dict(csv_file, sheet_name)
+# the plots are only generated when this file is run, so the worker processes can import it
+if __name__ == "__main__":
+    # Get the point directory using the csv file and sheetname from the directory
+    trial_dict = create_point_dict(csv_file, sheet_name)
 
-# Create a folder to store the plots - plot_path and plot_data are accessed in config file
-plot_data_path = os.path.join(plot_path, plot_data)
-os.makedirs(plot_data_path, exist_ok=True)
+    # Create a folder to store the plots - plot_path and plot_data are accessed in config file
+    # a single data type has a folder of its own, several share the plot folder
+    plot_data_path = os.path.join(plot_path, plot_data) if isinstance(plot_data, str) else plot_path
+    os.makedirs(plot_data_path, exist_ok=True)
 
-# run plot function
-all_plots = generate_plots_in_loop(kinematics_folder, trial_dict, plot_data, plot_data_path)
+    # run plot function
+    all_plots = generate_plots_in_loop(kinematics_folder, trial_dict, plot_data, plot_data_path)
+    if instrumentation_is_enabled():
+        print_instrumentation_summary()
@@ -1,13 +1,39 @@
 import os
-import pandas as pd
-import numpy as np
-import matplotlib.pyplot as plt
 import csv
 import point_dict_creator
-from external_mechanical_work import calculate_external_mechanical_work
-from distance_covered import calculate_distance_covered
-from player_load import calculate_player_load
-from config import kinematics_folder, keypoint, rows_to_skip, participant_mass, csv_file, sheet_name, data_path
+from streaming import stream_trial_metrics, select_trial_metrics_function
+from results_manifest import extract_metrics_incrementally, extract_peak_metrics_incrementally
+from instrumentation import stage, print_instrumentation_summary, instrumentation_is_enabled
+from peak_metrics import extract_peak_metrics_for_each_point, peak_metrics
+from parallel import run_for_each_trial
+from prefetch import kinematics_files
+from results_store import append_metrics
+from config import kinematics_folder, keypoint, rows_to_skip, participant, participant_mass, csv_file, sheet_name, data_path, n_workers, use_streaming, peak_window_lengths, results_store_dir, results_store_format, export_metric_csvs
+
+
+def extract_metrics_for_each_point(kinematics_folder, trial_dict, workers = n_workers, keypoint = keypoint, participant_mass = participant_mass, rows_of_data_to_skip = rows_to_skip, streaming = use_streaming):
+    """ Extracts every metric for each point in a dictionary, loading each trial only once.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points to extract the metrics from
+    workers: int of the number of processes used to process the trials in parallel (default is n_workers from the config file)
+    keypoint: string of the keypoint (default is keypoint from the config file)
+    participant_mass: mass of the participant in kg (default is participant_mass from the config file)
+    rows_of_data_to_skip: int of the number of rows to skip in the data (default is rows_to_skip from the config file)
+    streaming: bool of whether to read the .sto files in chunks instead of all at once (default is use_streaming from the config file)
+    ----------
+    Returns
+    A dictionary of the distance covered, player load, negative and positive work for each point.
+    Trials that fail are reported and left out.
+    """
+    trial_metrics_function = select_trial_metrics_function(streaming)
+    # streaming keeps memory constant, so the whole files of the next trials are not read ahead
+    prefetch = None if trial_metrics_function is stream_trial_metrics else kinematics_files(kinematics_folder, keypoint, rows_of_data_to_skip)
+    metrics_dict, errors = run_for_each_trial(trial_metrics_function, trial_dict, (kinematics_folder, keypoint, participant_mass, rows_of_data_to_skip), workers, prefetch=prefetch)
+    if errors:
+        print(f"{len(errors)} trials could not be processed and are left out of the results: {', '.join(errors)}")
+    return metrics_dict
 
 
 def extract_metric_for_each_point(kinematics_folder, trial_dict, metric = "Work Done"):
@@ -21,36 +47,43 @@ def extract_metric_for_each_point(kinematics_folder, trial_dict, metric = "Work
     Returns
     A dictionary of the desired metric for each point
     """
+    if metric not in ["Work Done", "Distance Covered", "Player Load"]:
+        print("Error: Maybe you didn't type the metric correctly. Options are: 'Work Done', 'Distance Covered' or 'Player Load'.")
+        return {trial: {} for trial in trial_dict}
+    metrics_dict = extract_metrics_for_each_point(kinematics_folder, trial_dict)
+    return select_metric(metrics_dict, metric)
+
+
+def select_metric(metrics_dict, metric):
+    """ Selects a single metric from the dictionary created by extract_metrics_for_each_point.
+    ----------
+    Parameters
+    metrics_dict: dictionary of every metric for each point
+    metric: string of the metric to select - Work Done, Distance Covered or Player Load
+    ----------
+    Returns
+    A dictionary of the desired metric for each point
+    """
     metric_dict = {}
-    #iterate through the trial dictionary and assign the trials and points to the work dictionary 
-    for trial, point_dict in trial_dict.items():
+    for trial, point_dict in metrics_dict.items():
         metric_dict[trial] = {}
-        for point, frames in point_dict.items():
-            #calculate the work for each point and add it to the value of that trial key
+        for point, metrics in point_dict.items():
             if metric == "Work Done":
-                neg_work, pos_work = calculate_external_mechanical_work(kinematics_folder, trial[-2:], start=frames[0], end=frames[1])
-                if neg_work is not None and pos_work is not None:
-                    metric_dict[trial][point] = {"Negative Work": neg_work, "Positive Work": pos_work}
-            elif metric == "Distance Covered":
-                distance =  calculate_distance_covered(kinematics_folder, trial[-2:], start=frames[0], end=frames[1])
-                if distance is not None:
-                    metric_dict[trial][point] = distance
-            elif metric == "Player Load":
-                player_load = calculate_player_load(kinematics_folder, trial[-2:], start=frames[0], end=frames[1])
-                if player_load is not None:
-                    metric_dict[trial][point] = player_load
+                metric_dict[trial][point] = {"Negative Work": metrics["Negative Work"], "Positive Work": metrics["Positive Work"]}
             else:
-                print("Error: Maybe you didn't type the metric correctly. Options are: 'Work Done', 'Distance Covered' or 'Player Load'.")
+                metric_dict[trial][point] = metrics[metric]
     return metric_dict
 
 
-def write_metric_to_csv(kinematics_folder, trial_dict, metric, rows_to_skip = 50):
+def write_metric_to_csv(kinematics_folder, trial_dict, metric, rows_to_skip = 50, metric_dict = None, data_path = data_path):
     """ Writes the metric of choice for each point to a CSV file.
     ----------
     Parameters
     kinematics_folder: string of the folder containing the kinematics files
     Dictionary of the points to extract the metric from
     Metric of choice - Work Done, Distance Covered or Player Load (Boyd et al., 2011)
+    metric_dict: dictionary of the metric for each point if it has already been extracted (default is None)
+    data_path: folder to write the CSV file to (default is data_path from the config file)
     ----------
     Returns
     A CSV file of the desired metric for each point
@@ -58,42 +91,103 @@ def write_metric_to_csv(kinematics_folder, trial_dict, metric, rows_to_skip = 50
     if not os.path.exists(data_path):
         # If not, create it
         os.makedirs(data_path)
+    if metric_dict is None:
+        metric_dict = extract_metric_for_each_point(kinematics_folder, trial_dict, metric)
+    with stage("csv write"):
+        _write_metric_rows(metric, metric_dict, data_path)
+
+
+def _write_metric_rows(metric, metric_dict, data_path):
+    """ Writes the rows of the CSV file of a metric. """
     if metric == "Work Done":
-        work_dict = extract_metric_for_each_point(kinematics_folder, trial_dict, "Work Done")
         filename = os.path.join(data_path + "/point_works.csv")
         with open(filename, 'w', newline='') as file:
             writer = csv.writer(file)
             writer.writerow(["Trial", "Point", "Negative Work (J)", "Positive Work (J)"])
-            for trial, point_dict in work_dict.items():
+            for trial, point_dict in metric_dict.items():
                 for point, works in point_dict.items():
-                    writer.writerow([trial[-2:], point[-1], works["Negative Work"], works["Positive Work"]])
+                    writer.writerow([trial[len("trial_"):], point[len("point"):], works["Negative Work"], works["Positive Work"]])
 
     elif metric == "Distance Covered":
-        distance_dict = extract_metric_for_each_point(kinematics_folder, trial_dict, "Distance Covered")
         filename = os.path.join(data_path + "/distance_covered.csv")
         with open(filename, "w", newline = '') as file:
             writer = csv.writer(file)
             writer.writerow(["Trial", "Point", "Distance Covered (m)"])
-            for trial, point_dict in distance_dict.items():
+            for trial, point_dict in metric_dict.items():
                 for point, distance in point_dict.items():
-                    writer.writerow([trial[-2:], point[-1], distance])
+                    writer.writerow([trial[len("trial_"):], point[len("point"):], distance])
     
     elif metric == "Player Load":
-        player_load_dict = extract_metric_for_each_point(kinematics_folder, trial_dict, "Player Load")
         filename = os.path.join(data_path + "/player_load.csv")
         with open(filename, "w", newline = '') as file:
             writer = csv.writer(file)
             writer.writerow(["Trial", "Point", "Player Load (AU)"])
-            for trial, point_dict in player_load_dict.items():
+            for trial, point_dict in metric_dict.items():
                 for point, player_load in point_dict.items():
-                    writer.writerow([trial[-2:], point[-1], player_load])
+                    writer.writerow([trial[len("trial_"):], point[len("point"):], player_load])
+
+
+def write_metrics_to_csv(kinematics_folder, trial_dict, metrics = ["Distance Covered", "Player Load", "Work Done"], metrics_dict = None, data_path = data_path):
+    """ Writes a CSV file for each metric, calculating every metric of a trial in one pass.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points to extract the metrics from
+    metrics: list of the metrics to write - Work Done, Distance Covered and/or Player Load
+    metrics_dict: dictionary of every metric for each point if they have already been extracted (default is None)
+    data_path: folder to write the CSV files to (default is data_path from the config file)
+    ----------
+    Returns
+    A CSV file of each metric for each point
+    """
+    if metrics_dict is None:
+        metrics_dict = extract_metrics_for_each_point(kinematics_folder, trial_dict)
+    for metric in metrics:
+        write_metric_to_csv(kinematics_folder, trial_dict, metric, metric_dict=select_metric(metrics_dict, metric), data_path=data_path)
+
 
+def write_peak_metrics_to_csv(kinematics_folder, trial_dict, window_lengths = peak_window_lengths, peak_metrics_dict = None, data_path = data_path):
+    """ Writes the peak distance covered, player load and positive work over each window length for each point, and each whole trial, to peak_metrics.csv.
+    ----------
+    Parameters
+    kinematics_folder: string of the folder containing the kinematics files
+    trial_dict: dictionary of the points to extract the peak metrics from
+    window_lengths: list of the window lengths in seconds (default is peak_window_lengths from the config file)
+    peak_metrics_dict: dictionary of the peak metrics of each point if they have already been extracted (default is None)
+    data_path: folder to write the CSV file to (default is data_path from the config file)
+    ----------
+    Returns
+    A CSV file with a row for each point - the whole trial is the point "All"
+    """
+    os.makedirs(data_path, exist_ok=True)
+    if peak_metrics_dict is None:
+        peak_metrics_dict = extract_peak_metrics_for_each_point(kinematics_folder, trial_dict, window_lengths)
+    units = {"Distance Covered": "m", "Player Load": "AU", "Positive Work": "J"}
+    filename = os.path.join(data_path, "peak_metrics.csv")
+    with stage("csv write"), open(filename, "w", newline = '') as file:
+        writer = csv.writer(file)
+        writer.writerow(["Trial", "Point"] + [f"Peak {seconds} s {metric} ({units[metric]})" for metric in peak_metrics for seconds in window_lengths])
+        for trial, point_dict in peak_metrics_dict.items():
+            for point, peaks in point_dict.items():
+                point_name = "All" if point == "trial" else point[len("point"):]
+                writer.writerow([trial[len("trial_"):], point_name] + [peaks[metric][seconds] for metric in peak_metrics for seconds in window_lengths])
 
 
-#create dict of points for each trial - needed to crop data to points
-trial_dict = point_dict_creator.create_point_dict(csv_file, sheet_name) 
+# the trials are only processed when this file is run, so the worker processes can import it
+if __name__ == "__main__":
+    #create dict of points for each trial - needed to crop data to points
+    trial_dict = point_dict_creator.create_point_dict(csv_file, sheet_name) 
 
-#Example use of extracting EMW, Distance Covered and Player Load from all points from one participant 
-for metric in ["Distance Covered", "Player Load", "Work Done"]:
-    write_metric_to_csv(kinematics_folder, trial_dict, metric)
+    #Example use of extracting EMW, Distance Covered and Player Load from all points from one participant 
+    #only the points whose .sto files or frames changed since the last run are calculated again
+    metrics_dict = extract_metrics_incrementally(kinematics_folder, trial_dict, data_path)
+    #every metric of every point is added to the results table shared by all participants
+    append_metrics(metrics_dict, participant, keypoint, results_store_dir, results_store_format)
+    if export_metric_csvs:
+        write_metrics_to_csv(kinematics_folder, trial_dict, ["Distance Covered", "Player Load", "Work Done"], metrics_dict=metrics_dict)
+    #the peaks are kept in the same manifest, so they are also only calculated again for the points that changed
+    peak_metrics_dict = extract_peak_metrics_incrementally(kinematics_folder, trial_dict, data_path)
+    write_peak_metrics_to_csv(kinematics_folder, trial_dict, peak_metrics_dict=peak_metrics_dict)
+    if instrumentation_is_enabled():
+        print_instrumentation_summary()
 